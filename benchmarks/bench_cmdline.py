@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+#
+#   PTSG - cmdline interpreter benchmark
+#
+'''Compare commands/sec of the old per-token cmdline interpreter against the
+compiled and cached one.
+
+ Both interpreters drive a NullTurtle with the same method signatures as a
+RawTurtle, so only parsing and dispatch are measured, not drawing.
+'''
+from contextlib import redirect_stdout
+from inspect import signature
+import io
+import os
+import sys
+import time
+import turtle
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ptsg
+
+
+class NullTurtle():
+    '''A turtle that accepts the benchmark commands and does nothing.'''
+    def forward(self, distance): pass
+    def back(self, distance): pass
+    def left(self, angle): pass
+    def right(self, angle): pass
+    def penup(self): pass
+    def pendown(self): pass
+    def goto(self, x, y=None): pass
+
+
+def legacyCmdline(t, cmd):
+    '''The cmdline interpreter as it was before compilation was added.'''
+    tokens = cmd.strip().split(' ')
+    print(f'Running command list:\n{tokens}')
+
+    while len(tokens):
+        token = tokens.pop(0)
+        print(f'Processing token: {token}')
+
+        if token in turtle.__all__:
+            turtleCmd = getattr(t, token)
+            takesArgs = len(signature(turtleCmd).parameters)
+
+            if not takesArgs:
+                print(f'Calling turtle.{token}()')
+                turtleCmd()
+
+            else:
+                args = []
+                for arg in range(takesArgs):
+                    arg = tokens.pop(0)
+                    if ',' in arg:
+                        arg = tuple(ptsg.checkInt(a) for a in arg.split(','))
+                    else:
+                        arg = ptsg.checkInt(arg)
+                    args.append(arg)
+
+                print(f'Calling turtle.{token}() and passing {args}')
+                turtleCmd(*args)
+
+        else:
+            break
+
+
+def bench(label, func, cmd, ops, repeat):
+    start = time.perf_counter()
+
+    with redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            func(cmd)
+
+    elapsed = time.perf_counter() - start
+    rate = ops * repeat / elapsed
+    print(f'{label:<24}{rate:>14,.0f} commands/sec')
+    return rate
+
+
+def main(repeat=200):
+    t = NullTurtle()
+    cmd = ' '.join(
+        ['pendown'] +
+        ['forward 10 left 45 forward 5 right 30 goto 10 20'] * 100 +
+        ['penup'],
+    )
+    ops = len(ptsg.compileCmdline(cmd))
+    cache = ptsg.lru_cache(maxsize=256)(ptsg.compileCmdline)
+
+    before = bench('legacy', lambda c: legacyCmdline(t, c), cmd, ops, repeat)
+    bench(
+        'compiled (no cache)',
+        lambda c: ptsg.runCompiled(t, ptsg.compileCmdline(c)),
+        cmd, ops, repeat,
+    )
+    bench(
+        'compiled (verbose)',
+        lambda c: ptsg.runCompiled(t, cache(c), True),
+        cmd, ops, repeat,
+    )
+    after = bench(
+        'compiled (cached)',
+        lambda c: ptsg.runCompiled(t, cache(c)),
+        cmd, ops, repeat,
+    )
+    print(f'Speedup: {after / before:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+#
+#   PTSG - control server benchmark
+#
+'''Drive a headless ptsg control server from a local client.
+
+ A SimpleTurtle is served on a Unix socket (or TCP with --tcp) in this
+process while a client thread pipelines cmdlines at it as fast as the
+acks allow, then the commands/sec and ack latency are printed as JSON.
+
+    python benchmarks/bench_server.py --commands 100000
+'''
+import argparse
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ptsg
+
+
+def client(address, commands, window, results):
+    '''Pipeline commands, keeping at most window unacked ones in flight.'''
+    if isinstance(address, str):
+        connection = socket.socket(socket.AF_UNIX)
+
+    else:
+        connection = socket.socket()
+
+    connection.connect(address)
+    acks = connection.makefile('rb')
+    lines = [f'forward 1 left {i % 360}\n'.encode() for i in range(commands)]
+    sent = acked = 0
+    latencies = []
+    started = time.perf_counter()
+
+    while acked < commands:
+        chunk = lines[sent:min(sent + window - (sent - acked), commands)]
+
+        if chunk:
+            connection.sendall(b''.join(chunk))
+            sentAt = time.perf_counter()
+            sent += len(chunk)
+
+        ack = json.loads(acks.readline())
+        latencies.append(time.perf_counter() - sentAt)
+        acked += ack['lines']
+
+    results['seconds'] = time.perf_counter() - started
+    results['acks'] = len(latencies)
+    latencies.sort()
+    results['ack_p50_ms'] = latencies[len(latencies) // 2] * 1000
+    results['ack_p99_ms'] = latencies[len(latencies) * 99 // 100] * 1000
+    connection.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--commands', type=int, default=50000)
+    parser.add_argument(
+        '--window',
+        type=int,
+        default=2000,
+        help='most unacknowledged commands in flight (default 2000)',
+    )
+    parser.add_argument('--tcp', action='store_true', help='use localhost TCP')
+    options = parser.parse_args(argv)
+
+    st = ptsg.SimpleTurtle(headless=True, logLevel='error')
+    path = None
+
+    if not options.tcp:
+        path = os.path.join(tempfile.mkdtemp(), 'ptsg.sock')
+
+    address = st.serve(path)
+    results = {}
+    thread = threading.Thread(
+        target=client,
+        args=(address, options.commands, options.window, results),
+    )
+    thread.start()
+
+    while thread.is_alive():
+        st.pollServer(0.01)
+        st.step(20)
+
+    st.step()
+    st.server.close()
+    results['commands_per_sec'] = options.commands / results['seconds']
+    results['turtle_ops'] = st.status.ops
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,577 @@
+#!/usr/bin/env python3
+#
+#   PTSG - benchmark suite
+#
+'''Benchmark the ptsg hot paths and compare the results against a baseline.
+
+ Every benchmark runs headless by default. Pass --windowed to run them on a
+real window as well (under Xvfb on machines without a display), which adds
+the benchmarks that need one, like the event loop round trip.
+
+ Results are printed as JSON. Save them with --save and compare a later run
+against them with --baseline, which reports every metric that got worse by
+more than --threshold percent and exits with status 1 if any did.
+
+    python benchmarks/bench_suite.py --save baseline.json
+    python benchmarks/bench_suite.py --baseline baseline.json
+'''
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ptsg
+
+
+# Metric name suffixes and whether a bigger value is better.
+HIGHER_IS_BETTER = {
+    'per_sec': True,
+    '_ms': False,
+    '_kb': False,
+}
+
+
+def higherIsBetter(metric):
+    for suffix, better in HIGHER_IS_BETTER.items():
+
+        if metric.endswith(suffix):
+            return better
+
+    return True
+
+
+def timed(func, repeat=3):
+    '''Return the best wall time of func() over repeat runs, in seconds.'''
+    best = None
+
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return best
+
+
+def newSimpleTurtle(windowed, **kwargs):
+    kwargs.setdefault('logLevel', 'error')
+
+    if windowed:
+        return ptsg.SimpleTurtle(**kwargs)
+
+    return ptsg.SimpleTurtle(headless=True, **kwargs)
+
+
+def closeSimpleTurtle(st):
+    if st.window is not None:
+        st.window.close()
+
+
+def benchCmdline(windowed, ops=20000):
+    '''Parse and dispatch throughput of cmdline, compiled and cached.'''
+    st = newSimpleTurtle(windowed)
+    cmd = ' '.join(['pendown'] + ['forward 1 left 1'] * (ops // 2))
+    results = {
+        'compile_ops_per_sec': ops / timed(lambda: ptsg.compileCmdline(cmd)),
+    }
+    st.cmdline(cmd)
+    results['cached_ops_per_sec'] = ops / timed(lambda: st.cmdline(cmd))
+    closeSimpleTurtle(st)
+    return results
+
+
+def benchDraw(windowed, ops=2000):
+    '''Draw ops/sec through move and cmdline with tracing on and off.'''
+    results = {}
+
+    for turbo in (False, True):
+        mode = 'turbo' if turbo else 'traced'
+        st = newSimpleTurtle(windowed, turbo=turbo)
+        st.turtle.speed(0)
+        st.turtle.pendown()
+        st.distance = 1
+        st.rotation = 1
+
+        def move():
+            for i in range(ops // 2):
+                st.move('f')
+                st.move('l')
+            st.flush()
+
+        def cmdline():
+            st.cmdline('forward 1 left 1 ' * (ops // 2))
+            st.flush()
+
+        results[f'move_{mode}_ops_per_sec'] = ops / timed(move, 1)
+        results[f'cmdline_{mode}_ops_per_sec'] = ops / timed(cmdline, 1)
+        closeSimpleTurtle(st)
+
+    return results
+
+
+def benchNewTurtle(windowed, counts=(1, 100, 1000)):
+    '''Cost of creating turtles with newTurtle.'''
+    results = {}
+
+    for count in counts:
+        st = newSimpleTurtle(windowed)
+
+        def create():
+            for i in range(count):
+                st.newTurtle(f'bench{i}')
+
+        results[f'new_turtle_{count}_ms'] = timed(create, 1) * 1000
+        closeSimpleTurtle(st)
+
+    return results
+
+
+def benchStartup(windowed):
+    '''SimpleTurtle.__init__ time.'''
+    return {
+        'startup_ms': timed(
+            lambda: closeSimpleTurtle(newSimpleTurtle(windowed)),
+        ) * 1000,
+    }
+
+
+def benchEventLoop(windowed, rounds=200):
+    '''Round trip latency of an event through window.read.'''
+    if not windowed:
+        return {}
+
+    st = newSimpleTurtle(windowed)
+
+    def roundTrips():
+        for i in range(rounds):
+            st.window.write_event_value('_bench_', i)
+            event = None
+
+            while event != '_bench_':
+                event, values = st.window.read(timeout=100)
+
+    results = {'event_round_trip_ms': timed(roundTrips, 1) * 1000 / rounds}
+    closeSimpleTurtle(st)
+    return results
+
+
+def benchMemory(windowed, segments=20000):
+    '''Peak memory while drawing segments.'''
+    gc.collect()
+    tracemalloc.start()
+    st = newSimpleTurtle(windowed)
+    st.cmdline('pendown ' + 'forward 1 left 1 ' * segments)
+    st.flush()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    closeSimpleTurtle(st)
+    return {
+        f'segments_{segments}_current_kb': current / 1024,
+        f'segments_{segments}_peak_kb': peak / 1024,
+    }
+
+
+def benchSwarm(windowed, agents=10000, steps=50):
+    '''Frames/sec of a swarm moving, turning and being drawn each step.'''
+    if ptsg.np is None:
+        return {}
+
+    st = newSimpleTurtle(windowed)
+    swarm = st.newSwarm('bench', agents, spread=200, seed=1)
+    swarm.pendown()
+    turns = ptsg.np.random.default_rng(1).uniform(-10, 10, (steps, agents))
+
+    def run():
+        for turn in turns:
+            swarm.forward(2)
+            swarm.left(turn)
+            swarm.wrap()
+            st.flush()
+
+    results = {f'swarm_{agents}_frames_per_sec': steps / timed(run, 1)}
+    closeSimpleTurtle(st)
+    return results
+
+
+def benchHitTest(windowed, segments=100000, lookups=1000):
+    '''Click hit-testing time with segments drawn by a random walk.'''
+    import random
+
+    random.seed(1)
+    index = ptsg.SegmentIndex()
+    x = y = 0.0
+
+    for i in range(segments):
+        nx = min(max(x + random.uniform(-5, 5), -320), 320)
+        ny = min(max(y + random.uniform(-5, 5), -240), 240)
+        index.add((x, y), (nx, ny), 'bench')
+        x, y = nx, ny
+
+    points = [
+        (random.uniform(-320, 320), random.uniform(-240, 240))
+        for i in range(lookups)
+    ]
+
+    def lookup():
+        for px, py in points:
+            index.nearest(px, py, 5)
+
+    return {f'hit_test_{segments}_ms': timed(lookup) * 1000 / lookups}
+
+
+def benchViewport(windowed, segments=100000, steps=20):
+    '''Time to zoom and pan the view over a random walk of segments.'''
+    import random
+
+    random.seed(1)
+    st = newSimpleTurtle(windowed, turbo=True, journal=False)
+    st.turtle.pendown()
+    cmd = ' '.join(
+        f'left {random.randint(-90, 90)} forward 3'
+        for i in range(segments)
+    )
+    st.cmdline(cmd)
+    st.flush()
+
+    def zoom():
+        for i in range(steps):
+            st.zoom(1.1 if i < steps // 2 else 1 / 1.1, 0, 0)
+            st.screen.update()
+
+    def pan():
+        for i in range(steps):
+            st.pan(5, -5)
+            st.screen.update()
+
+    results = {
+        f'zoom_{segments}_ms': timed(zoom, 1) * 1000 / steps,
+        f'pan_{segments}_ms': timed(pan, 1) * 1000 / steps,
+    }
+    closeSimpleTurtle(st)
+    return results
+
+
+def benchExport(windowed, segments=100000, every=1000):
+    '''Time to export a random walk of segments, and to draw it while
+    recording frames.
+    '''
+    import random
+    import tempfile
+
+    random.seed(1)
+    cmd = 'pendown ' + ' '.join(
+        f'left {random.randint(-90, 90)} forward 3'
+        for i in range(segments)
+    )
+    results = {}
+
+    with tempfile.TemporaryDirectory() as directory:
+        st = newSimpleTurtle(windowed, turbo=True, journal=False)
+
+        def draw():
+            st.cmdline(cmd)
+            st.flush()
+
+        results[f'draw_{segments}_ms'] = timed(draw, 1) * 1000
+
+        for extension in ('svg', 'ps'):
+            path = os.path.join(directory, f'bench.{extension}')
+            results[f'export_{extension}_{segments}_ms'] = timed(
+                lambda: st.save(path), 1,
+            ) * 1000
+
+        closeSimpleTurtle(st)
+        st = newSimpleTurtle(windowed, turbo=True, journal=False)
+        st.startRecording(directory, every)
+        results[f'draw_recording_{segments}_ms'] = timed(draw, 1) * 1000
+        results[f'frames_written_{segments}_ms'] = timed(st.stopRecording, 1) * 1000
+        closeSimpleTurtle(st)
+
+    return results
+
+
+def benchBoundedMemory(windowed, rounds=1000, budget=5000):
+    '''Memory growth over a long session with the memory caps set, and the
+    longest a round took. The random walk turns back towards the origin
+    whenever it leaves the canvas, as what's drawn off it is kept.
+    '''
+    import random
+
+    random.seed(1)
+    st = newSimpleTurtle(
+        windowed,
+        turbo=True,
+        canvasBudget=budget,
+        journal=True,
+        journalSize=500,
+        undoBufferSize=100,
+        logSize=100,
+        historySize=100,
+    )
+    st.turtle.pendown()
+    worst = [0]
+
+    def session():
+        for i in range(rounds):
+            started = time.perf_counter()
+            st.cmdline(' '.join(
+                f'left {random.randint(-90, 90)} forward 4' for j in range(20)
+            ))
+            st.flush()
+            x, y = st.turtle.pos()
+
+            if abs(x) > 280 or abs(y) > 200:
+                st.cmdline(f'setheading {int(st.turtle.towards(0, 0))}')
+
+            worst[0] = max(worst[0], time.perf_counter() - started)
+
+    session()
+    session()
+    # tracemalloc slows every round down, only time the ones before it.
+    slowest = worst[0]
+    gc.collect()
+    tracemalloc.start()
+    session()
+    gc.collect()
+    middle = tracemalloc.get_traced_memory()[0]
+    session()
+    gc.collect()
+    end = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    closeSimpleTurtle(st)
+    growth = max(end - middle, 0) / 1024
+    assert growth < 1024, f'memory still grows {growth:.0f} KB a session'
+    return {
+        f'session_{rounds}_rounds_growth_kb': growth,
+        'session_worst_round_ms': slowest * 1000,
+    }
+
+
+def benchBatch(windowed, scripts=32, ops=5000):
+    '''Scripts/sec rendering a directory of scripts with one worker and
+    with one per core.
+    '''
+    if windowed:
+        return {}
+
+    import random
+    import tempfile
+
+    random.seed(1)
+    results = {}
+
+    with tempfile.TemporaryDirectory() as directory:
+
+        for i in range(scripts):
+
+            with open(os.path.join(directory, f'bench{i}.txt'), 'w') as f:
+                f.write('pendown\n')
+
+                for j in range(ops // 20):
+                    f.write(' '.join(
+                        f'left {random.randint(-90, 90)} forward 3'
+                        for k in range(10)
+                    ) + '\n')
+
+        output = os.path.join(directory, 'out')
+        os.mkdir(output)
+        cores = os.cpu_count() or 1
+
+        for workers in sorted({1, cores}):
+            batch = ptsg.BatchRenderer(workers)
+            jobs = batch.jobs(directory, output, pattern='*.txt')
+            results[f'batch_{workers}_workers_scripts_per_sec'] = (
+                scripts / timed(lambda: batch.run(jobs), 1)
+            )
+
+    return results
+
+
+def benchStamps(windowed, stamps=50000):
+    '''Time to draw a scene of stamps of a compound shape, one at a time
+    with and without the shape registry, and in bulk.
+    '''
+    import random
+
+    random.seed(1)
+    points = [
+        (random.randint(-300, 300), random.randint(-220, 220))
+        for i in range(stamps)
+    ]
+    headings = [random.randint(0, 359) for i in range(stamps)]
+    colors = ['red', 'green', 'blue', 'orange', 'purple']
+    results = {}
+
+    def newScene():
+        st = newSimpleTurtle(windowed, turbo=True, journal=False)
+        st.registerShape('bench', [
+            (((0, 0), (-4, -8), (4, -8)), 'green', 'black'),
+            (((-1, -8), (1, -8), (1, -11), (-1, -11)), 'brown', 'brown'),
+        ])
+        st.turtle.shape('bench')
+        st.turtle.penup()
+        return st
+
+    def single(st):
+        t = st.turtle
+
+        def draw():
+            for (x, y), heading in zip(points, headings):
+                t.goto(x, y)
+                t.setheading(heading)
+                t.stamp()
+            st.flush()
+
+        return draw
+
+    for mode in ('unregistered', 'registered'):
+        st = newScene()
+
+        if mode == 'unregistered':
+            st.turtle.shapes = None
+
+        results[f'stamp_{mode}_{stamps}_ms'] = timed(single(st), 1) * 1000
+        closeSimpleTurtle(st)
+
+    st = newScene()
+
+    def bulk():
+        st.stamps(points, headings)
+        st.flush()
+
+    results[f'stamps_bulk_{stamps}_ms'] = timed(bulk, 1) * 1000
+
+    def pencolor():
+        for i in range(stamps):
+            st.turtle.pencolor(colors[i % len(colors)])
+
+    results['pencolor_per_sec'] = stamps / timed(pencolor, 1)
+    closeSimpleTurtle(st)
+    return results
+
+
+BENCHMARKS = {
+    'cmdline': benchCmdline,
+    'draw': benchDraw,
+    'new_turtle': benchNewTurtle,
+    'startup': benchStartup,
+    'event_loop': benchEventLoop,
+    'memory': benchMemory,
+    'swarm': benchSwarm,
+    'hit_test': benchHitTest,
+    'viewport': benchViewport,
+    'export': benchExport,
+    'bounded_memory': benchBoundedMemory,
+    'batch': benchBatch,
+    'stamps': benchStamps,
+}
+
+
+def runBenchmarks(names, windowed):
+    '''Run benchmarks, returning {'headless.name.metric': value, ...}.'''
+    results = {}
+    modes = ['headless'] + (['windowed'] if windowed else [])
+
+    for mode in modes:
+
+        for name in names:
+            print(f'Running {mode} {name}...', file=sys.stderr)
+
+            for metric, value in BENCHMARKS[name](mode == 'windowed').items():
+                results[f'{mode}.{name}.{metric}'] = round(value, 3)
+
+    return results
+
+
+def compare(results, baseline, threshold):
+    '''Return the metrics that regressed by more than threshold percent.'''
+    regressions = {}
+
+    for metric, value in results.items():
+        old = baseline.get(metric)
+
+        if not old:
+            continue
+
+        change = (value - old) / old * 100
+
+        if not higherIsBetter(metric):
+            change = -change
+
+        if change < -threshold:
+            regressions[metric] = {
+                'baseline': old,
+                'result': value,
+                'change_percent': round(change, 1),
+            }
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument(
+        'benchmarks',
+        nargs='*',
+        help=f'benchmarks to run: {", ".join(BENCHMARKS)} (default: all)',
+    )
+    parser.add_argument(
+        '--windowed',
+        action='store_true',
+        help='also run the benchmarks on a real window',
+    )
+    parser.add_argument('--save', help='write the results to this file')
+    parser.add_argument('--baseline', help='compare against this results file')
+    parser.add_argument(
+        '--threshold',
+        type=float,
+        default=10,
+        help='percent change counted as a regression (default 10)',
+    )
+    options = parser.parse_args(argv)
+
+    for name in options.benchmarks:
+
+        if name not in BENCHMARKS:
+            parser.error(f'unknown benchmark {name}')
+
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': ptsg.np is not None,
+        'results': runBenchmarks(options.benchmarks or list(BENCHMARKS),
+                                 options.windowed),
+    }
+
+    if options.baseline:
+
+        with open(options.baseline) as f:
+            baseline = json.load(f)['results']
+
+        report['regressions'] = compare(
+            report['results'],
+            baseline,
+            options.threshold,
+        )
+
+    print(json.dumps(report, indent=2))
+
+    if options.save:
+
+        with open(options.save, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    return 1 if report.get('regressions') else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,580 +2,6357 @@
 #
 #   PTSG - Python Turtle SimpleGUI
 #
+import argparse
+from array import array
+import asyncio
+import base64
+from bisect import bisect_left, insort
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait
+import fnmatch
+from functools import lru_cache
+from heapq import heapify, heappop, heappush
 from inspect import signature
+from itertools import islice
+import json
+from math import atan2, ceil, cos, degrees, floor, log2, radians, sin
+import os
+import queue
+import struct
+import sys
+import threading
+from time import perf_counter
 import turtle
+import zlib
 
-import PySimpleGUI as sg
+# PySimpleGUI is only imported once a window is needed, see importGUI().
+sg = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def importGUI():
+    '''Import PySimpleGUI on first use and return it.'''
+    global sg
+
+    if sg is None:
+        import PySimpleGUI
+        sg = PySimpleGUI
+
+    return sg
+
+
+def rangeSpin(start, stop, initial_value, **kwargs):
+    '''Create a Spin element for the integers in range(start, stop).
+
+     Rather than building a list of every value, the Spin is given just its
+    initial value and turned into a from/to Tk Spinbox by configureSpins once
+    it is part of a window, so its values are read back as strings.
+    '''
+    spin = sg.Spin([initial_value], initial_value=initial_value, **kwargs)
+    spin.spinRange = (start, stop, initial_value)
+    return spin
+
+
+def configureSpins(elements):
+    '''Configure the Tk Spinbox of every rangeSpin in elements.'''
+    for element in elements:
+        spinRange = getattr(element, 'spinRange', None)
+
+        if spinRange and element.Widget is not None:
+            start, stop, initial = spinRange
+            element.Widget.configure(values='', from_=start, to=stop-1)
+            element.update(value=initial)
+            element.spinRange = None
+
+
+def _commandTable():
+    '''Build the table of cmdline commands and the arguments they take.
+
+     Every public turtle command that a RawTurtle can run is looked up once
+    here, so the interpreter never has to call inspect.signature at runtime.
+    Optional and *args parameters count towards the maximum only.
+    '''
+    commands = {}
+
+    for name in turtle.__all__:
+        method = getattr(turtle.RawTurtle, name, None)
+
+        if not callable(method) or isinstance(method, type):
+            continue
+
+        minArgs = maxArgs = 0
+
+        # Don't count self, bound methods don't take it.
+        for param in list(signature(method).parameters.values())[1:]:
+
+            if param.kind == param.VAR_KEYWORD:
+                continue
+
+            maxArgs += 1
+
+            if param.default is param.empty and param.kind != param.VAR_POSITIONAL:
+                minArgs += 1
+
+        commands[name] = (minArgs, maxArgs)
+
+    return commands
+
+
+# Command name -> (required, maximum) number of arguments.
+COMMANDS = _commandTable()
+
+# Words of the cmdline language that aren't turtle commands.
+KEYWORDS = frozenset(['repeat', 'to', 'end', '[', ']'])
+
+# Deepest procedure calls and loops can nest before a job is stopped.
+MAX_DEPTH = 1000
+
+
+def checkInt(arg):
+    '''Check if string is an integer and do conversion'''
+    if arg[:1] in ['+', '-'] and arg[1:].isdigit() or arg.isdigit():
+        return int(arg)
+
+    return arg
+
+
+@lru_cache(maxsize=4096)
+def convertArg(arg):
+    '''Convert a cmdline argument to an int, a tuple, or leave it a string.'''
+    if ',' in arg:
+        return tuple(checkInt(a) for a in arg.split(','))
+
+    return checkInt(arg)
+
+
+class CompiledCmdline():
+    '''A command string compiled into a sequence of turtle operations.
+
+     ops is a tuple of (command, args) pairs ready to be dispatched, names is
+    the set of commands used (so they can be bound once per run), error is a
+    message for the token the compiler stopped at (or None) and rest is the
+    unprocessed remainder of the command string. Procedure bodies keep the
+    "to ... end" they were compiled from as source.
+
+     Loops are kept as ('repeat', (count, body)) operations and procedure
+    calls as ('call', (name,)), with the bodies compiled once and looked up
+    in procedures, so len() (the number of turtle operations run) can be far
+    bigger than ops.
+    '''
+    __slots__ = ('ops', 'names', 'error', 'rest', 'procedures', 'size', 'source')
+
+    def __init__(self, ops, error=None, rest='', procedures=None, source=''):
+        self.ops = tuple(ops)
+        self.names = set()
+        self.error = error
+        self.rest = rest
+        self.source = source
+        self.procedures = {} if procedures is None else procedures
+        self.size = 0
+
+        for name, args in self.ops:
+
+            if name == 'repeat':
+                self.names |= args[1].names
+                self.size += args[0] * len(args[1])
+
+            elif name == 'call':
+                self.size += len(self.procedures[args[0]])
+
+            else:
+                self.names.add(name)
+                self.size += 1
+
+        self.names = frozenset(self.names)
+
+
+    def __len__(self):
+        return self.size
+
+
+@lru_cache(maxsize=4096)
+def _op(name, *args):
+    '''Return a (command, args) operation, shared between identical ones.'''
+    return name, tuple(convertArg(arg) for arg in args)
+
+
+def _compileBlock(tokens, i, procedures, closer=None):
+    '''Compile tokens from i up to closer (or the end) into a list of ops.
+
+     Returns (ops, i, error, start) where i is the index after closer and, on
+    error, start is the index of the top level statement that failed.
+    '''
+    commands = COMMANDS
+    ops = []
+    append = ops.append
+    count = len(tokens)
+
+    while i < count:
+        token = tokens[i]
+        start = i
+
+        if token == closer:
+            return ops, i + 1, None, None
+
+        arity = commands.get(token)
+
+        if arity is None:
+
+            if token in procedures:
+                append(('call', (token,)))
+                i += 1
+                continue
+
+            if token == 'repeat':
+                times = checkInt(tokens[i + 1]) if i + 1 < count else None
+
+                if not isinstance(times, int) or times < 0:
+                    return ops, i, 'repeat takes a count of 0 or more.', start
+
+                if i + 2 >= count or tokens[i + 2] != '[':
+                    return ops, i, 'repeat needs a [ after its count.', start
+
+                body, i, error, _ = _compileBlock(tokens, i + 3, procedures, ']')
+
+                if error:
+                    return ops, i, error, start
+
+                append(('repeat', (times, CompiledCmdline(body, None, '', procedures))))
+                continue
+
+            if token == 'to':
+
+                if closer is not None:
+                    return ops, i, 'to can\'t be used inside a block.', start
+
+                name = tokens[i + 1] if i + 1 < count else 'end'
+
+                if name in commands or name in KEYWORDS or not name.isidentifier():
+                    return ops, i, f'to can\'t define {name}.', start
+
+                body, i, error, _ = _compileBlock(tokens, i + 2, procedures, 'end')
+
+                if error:
+                    return ops, i, error, start
+
+                # Redefining moves it last, so definitions stay in the order
+                # they can be compiled again in.
+                procedures.pop(name, None)
+                procedures[name] = CompiledCmdline(
+                    body, None, '', procedures, ' '.join(tokens[start:i]),
+                )
+                continue
+
+            if token in KEYWORDS:
+                return ops, i, f'{token} is out of place, suspending.', start
+
+            return ops, i, f'{token} is not a valid turtle command, suspending.', start
+
+        takesArgs, maxArgs = arity
+        end = min(i + 1 + maxArgs, count)
+        j = i + 1
+
+        # Optional arguments stop at the next command.
+        while (j < end and tokens[j] not in commands and tokens[j] not in KEYWORDS
+               and tokens[j] not in procedures):
+            j += 1
+
+        if j - i - 1 < takesArgs:
+            return (
+                ops,
+                i,
+                f'turtle.{token} takes {takesArgs} '
+                f'arguments but {j - i - 1} were given.',
+                start,
+            )
+
+        append(_op(*tokens[i:j]))
+        i = j
+
+    if closer is not None:
+        return ops, i, f'{closer} is missing, suspending.', None
+
+    return ops, i, None, None
+
+
+def compileCmdline(cmd, procedures=None):
+    '''Compile a command string into a CompiledCmdline.
+
+     Tokens are validated against COMMANDS, arguments are consumed according
+    to each command's arity (optional ones only up to the next command) and
+    converted up front. Compilation stops at the first invalid token, in which
+    case everything before it still runs.
+
+     "repeat N [ ... ]" runs a block N times and "to name ... end" defines a
+    procedure, which is added to procedures (a dict shared between command
+    strings, or one just for this one) as soon as it compiles.
+    '''
+    if procedures is None:
+        procedures = {}
+
+    tokens = cmd.replace('[', ' [ ').replace(']', ' ] ').split()
+    ops, i, error, start = _compileBlock(tokens, 0, procedures)
+
+    if error:
+        return CompiledCmdline(ops, error, ' '.join(tokens[start or 0:]), procedures)
+
+    return CompiledCmdline(ops, None, '', procedures)
+
+
+def _bind(t, name):
+    '''Return t's command name, or one that raises if t doesn't have it.'''
+    command = getattr(t, name, None)
+
+    if command is None:
+
+        def command(*args):
+            raise AttributeError(f'{type(t).__name__} has no {name} command')
+
+    return command
+
+
+class CommandJob():
+    '''A CompiledCmdline being run on a turtle, possibly a slice at a time.
+
+     Commands are bound to the turtle once when the job is created, then
+    called in a tight loop by run(), which can be given a deadline to stop
+    at so long jobs can be interleaved with GUI event handling. Loops and
+    procedure calls are run from their compiled bodies with a stack of
+    [ops, position, times left] frames, so they never get unrolled.
+    '''
+    __slots__ = ('t', 'program', 'bound', 'stack', 'ran', 'verbose', 'log',
+                 'profile')
+
+    def __init__(self, t, program, verbose=False, log=None, profile=None):
+        self.t = t
+        self.program = program
+        self.bound = {name: _bind(t, name) for name in program.names}
+        self.stack = [[program.ops, 0, 1]]
+        self.ran = 0
+        self.verbose = verbose
+        self.log = log or _printLog
+        self.profile = profile
+
+
+    def __len__(self):
+        '''Number of operations left to run.
+
+         Procedures redefined after this job was compiled can make this an
+        estimate, but it is only 0 once the job is done.
+        '''
+        if not self.stack:
+            return 0
+
+        return max(len(self.program) - self.ran, 1)
+
+
+    def enter(self, name, args):
+        '''Push the body of a repeat or call operation onto the stack.'''
+        if name == 'repeat':
+            times, body = args
+
+        else:
+            times, body = 1, self.program.procedures.get(args[0])
+
+            if body is None:
+                self.log(f'{args[0]} is not a procedure.', 'error')
+                return
+
+        if not times or not body.ops:
+            return
+
+        if len(self.stack) >= MAX_DEPTH:
+            self.log(f'{args[0] if name == "call" else name} nested too deep, '
+                     'stopping.', 'error')
+            self.stack.clear()
+            return
+
+        bound = self.bound
+
+        for command in body.names:
+
+            if command not in bound:
+                bound[command] = _bind(self.t, command)
+
+        self.stack.append([body.ops, 0, times])
+
+
+    def run(self, deadline=None, tick=None, limit=None):
+        '''Run operations until done or perf_counter() passes deadline.
+
+         With verbose set every call is traced to the log, and tick (if given)
+        is called for each operation. If the job has a profile function, it is
+        called with ('turtle', command) and the duration of each call. At most
+        limit operations are run, if given. Returns the number of operations
+        run.
+        '''
+        stack = self.stack
+        bound = self.bound
+        verbose = self.verbose
+        log = self.log
+        profile = self.profile
+        ran = 0
+        running = bool(stack)
+        stopped = False
+
+        while stack and not stopped:
+            frame = stack[-1]
+            ops, position, times = frame
+            end = len(ops)
+            control = None
+
+            while position < end:
+                name, args = ops[position]
+                position += 1
+                function = bound.get(name)
+
+                if function is None:
+                    # Loops and procedure calls count as operations too, so
+                    # programs that rarely reach a turtle command still stop.
+                    control = name
+                    ran += 1
+                    stopped = (ran == limit or deadline is not None
+                               and perf_counter() >= deadline)
+                    break
+
+                if tick is not None:
+                    tick()
+
+                if verbose:
+                    log(f'Calling turtle.{name}() and passing {list(args)}', 'trace')
+
+                if profile is not None:
+                    called = perf_counter()
+
+                try:
+                    ret = function(*args)
+                except Exception as e:
+                    log(e, 'error')
+                    ret = None
+
+                if profile is not None:
+                    profile(('turtle', name), perf_counter() - called)
+
+                if ret is not None:
+                    log(f'{name}: {ret}')
+
+                ran += 1
+
+                if ran == limit or deadline is not None and perf_counter() >= deadline:
+                    stopped = True
+                    break
+
+            frame[1] = position
+
+            if control is not None:
+                self.enter(control, args)
+
+            elif position == end:
+
+                if times > 1:
+                    frame[1] = 0
+                    frame[2] = times - 1
+
+                else:
+                    stack.pop()
+
+        self.ran += ran
+
+        if running and not stack and self.program.error:
+            log(self.program.error, 'error')
+
+        return ran
+
+
+class Task():
+    '''A command program attached to a turtle, run by a Scheduler.
+
+     priority is the number of operations run per round and rate (if given)
+    the most operations run per second, enforced with a token bucket holding
+    up to a tenth of a second's worth. With loop set the program starts over
+    when it finishes.
+    '''
+    __slots__ = ('t', 'program', 'job', 'priority', 'rate', 'loop', 'tokens',
+                 'filled', 'ops', 'started', 'finished', 'options')
+
+    def __init__(self, t, program, priority=1, rate=None, loop=False, **options):
+        self.t = t
+        self.program = program
+        self.options = options
+        self.job = CommandJob(t, program, **options)
+        self.priority = max(int(priority), 1)
+        self.rate = rate
+        self.loop = loop
+        self.tokens = self.capacity()
+        self.filled = self.started = perf_counter()
+        self.finished = None
+        self.ops = 0
+
+
+    def allowance(self, now):
+        '''Return how many operations the task may run now.'''
+        if self.finished is not None:
+            return 0
+
+        if self.rate is None:
+            return self.priority
+
+        self.tokens = min(self.tokens + (now - self.filled) * self.rate,
+                          self.capacity())
+        self.filled = now
+        return min(self.priority, int(self.tokens))
+
+
+    def capacity(self):
+        return max(self.rate / 10, 1) if self.rate is not None else 0
+
+
+    def due(self, now):
+        '''Return the seconds until the task can run again, or None if done.'''
+        if self.finished is not None:
+            return None
+
+        if self.rate is None or self.allowance(now):
+            return 0
+
+        return (1 - self.tokens) / self.rate
+
+
+    def run(self, deadline=None, tick=None, limit=None):
+        ran = self.job.run(deadline, tick, limit)
+        self.ops += ran
+
+        if self.rate is not None:
+            self.tokens -= ran
+
+        if not len(self.job):
+
+            if self.loop and ran:
+                self.job = CommandJob(self.t, self.program, **self.options)
+
+            else:
+                self.finished = perf_counter()
+
+        return ran
+
+
+    def throughput(self):
+        '''Return the operations run per second since the task started.'''
+        elapsed = (self.finished or perf_counter()) - self.started
+        return self.ops / elapsed if elapsed > 0 else 0.0
+
+
+class Scheduler():
+    '''Cooperative round robin scheduler for command programs on turtles.
+
+     Each named Task runs up to its priority's worth of operations in turn,
+    skipping tasks that are over their rate, until every task is finished or
+    throttled or the deadline passes. Everything runs on the calling thread,
+    so it is safe to call from Tk timers and the event loop.
+    '''
+    def __init__(self):
+        self.tasks = {}
+
+
+    def __len__(self):
+        '''Number of tasks that haven't finished.'''
+        return sum(task.finished is None for task in self.tasks.values())
+
+
+    def attach(self, name, t, program, priority=1, rate=None, loop=False,
+               **options):
+        '''Attach a CompiledCmdline to turtle t as task name.
+
+         A task already attached under name is replaced. options are passed
+        on to CommandJob (verbose, log and profile).
+        '''
+        self.tasks[name] = Task(t, program, priority, rate, loop, **options)
+        return self.tasks[name]
+
+
+    def detach(self, name):
+        return self.tasks.pop(name, None)
+
+
+    def due(self):
+        '''Return the seconds until a task can run, or None if none can.'''
+        now = perf_counter()
+        waits = [
+            wait for wait in (task.due(now) for task in self.tasks.values())
+            if wait is not None
+        ]
+        return min(waits) if waits else None
+
+
+    def run(self, deadline=None, tick=None, rounds=None):
+        '''Run rounds of every task until deadline (or for at most rounds
+        rounds), returning operations run.
+        '''
+        ran = 0
+        progressed = True
+
+        while progressed and rounds != 0:
+            progressed = False
+
+            if rounds is not None:
+                rounds -= 1
+
+            for task in list(self.tasks.values()):
+                allowance = task.allowance(perf_counter())
+
+                if not allowance:
+                    continue
+
+                count = task.run(deadline, tick, allowance)
+                progressed = progressed or count > 0
+                ran += count
+
+                if deadline is not None and perf_counter() >= deadline:
+                    return ran
+
+        return ran
+
+
+    def stats(self):
+        '''Return {name: {ops, ops_per_sec, left, priority, rate, done}}.'''
+        return {
+            name: {
+                'ops': task.ops,
+                'ops_per_sec': task.throughput(),
+                'left': len(task.job),
+                'priority': task.priority,
+                'rate': task.rate,
+                'done': task.finished is not None,
+            }
+            for name, task in self.tasks.items()
+        }
+
+
+    def stop(self):
+        '''Finish every task where it is.'''
+        now = perf_counter()
+
+        for task in self.tasks.values():
+
+            if task.finished is None:
+                task.finished = now
+
+
+    def text(self):
+        '''Format the stats as a table.'''
+        lines = [f'{"task":<28}{"ops":>9}{"ops/sec":>12}{"priority":>10}{"rate":>10}']
+
+        for name, stats in self.stats().items():
+            rate = stats['rate']
+            lines.append(
+                f'{name[:27]:<28}{stats["ops"]:>9}{stats["ops_per_sec"]:>12.1f}'
+                f'{stats["priority"]:>10}{"-" if rate is None else rate:>10}'
+                f'{"  done" if stats["done"] else ""}'
+            )
+
+        return '\n'.join(lines)
+
+
+def scriptLines(fp):
+    '''Yield the commands in a script file object, a line at a time.
+
+     Blank lines and lines starting with # are skipped. The file is read
+    lazily, so scripts of any size can be streamed.
+    '''
+    for line in fp:
+        line = line.strip()
+
+        if line and not line.startswith('#'):
+            yield line
+
+
+def _printLog(msg, level='info'):
+    '''Log to stdout, for when there is no Console.'''
+    print(msg)
+
+
+def runCompiled(t, program, verbose=False, tick=None, log=None, profile=None,
+                limit=None):
+    '''Dispatch a whole CompiledCmdline (or its first limit operations) on
+    turtle t.
+    '''
+    return CommandJob(t, program, verbose, log, profile).run(tick=tick, limit=limit)
+
+
+# Colors the headless DisplayList knows the RGB value of. Other color names
+# are accepted as is (and resolve to black) since there is no Tk to ask.
+COLORS = {
+    'black': (0, 0, 0),
+    'blue': (0, 0, 255),
+    'brown': (165, 42, 42),
+    'cyan': (0, 255, 255),
+    'gray': (190, 190, 190),
+    'green': (0, 255, 0),
+    'grey': (190, 190, 190),
+    'magenta': (255, 0, 255),
+    'orange': (255, 165, 0),
+    'pink': (255, 192, 203),
+    'purple': (160, 32, 240),
+    'red': (255, 0, 0),
+    'white': (255, 255, 255),
+    'yellow': (255, 255, 0),
+}
+
+
+class DisplayList():
+    '''An in-memory stand in for a Tk canvas that records drawing primitives.
+
+     Only the part of the Tk canvas interface that the turtle module uses is
+    implemented. Every line, polygon (fills, stamps and turtle shapes), text
+    and image item is kept in stacking order as [type, coords, options], with
+    the coordinates stored in a compact array. The recorded items can be
+    replayed onto a real Tk canvas, or saved and loaded as JSON.
+    '''
+    def __init__(self, width=640, height=480, bg='white'):
+        self.options = {'width': width, 'height': height, 'bg': bg}
+        self.items = {}
+        self.timers = []
+        self._nextItem = 1
+        self._nextTimer = 1
+
+
+    def _create(self, kind, coords, options):
+        '''Add an item to the top of the display list and return its id.'''
+        if len(coords) == 1 and isinstance(coords[0], (list, tuple)):
+            coords = coords[0]
+
+        item = self._nextItem
+        self._nextItem += 1
+        self.items[item] = [kind, array('d', coords), options]
+        return item
+
+
+    def after(self, ms, func=None, *args):
+        '''Schedule func to run from update() after ms milliseconds.
+
+         Called without a function this is a delay, which headless is a no-op.
+        '''
+        if func is None:
+            return None
+
+        timer = f'after#{self._nextTimer}'
+        self._nextTimer += 1
+        heappush(self.timers, (perf_counter() + ms / 1000, timer, func, args))
+        return timer
+
+
+    def after_cancel(self, timer):
+        self.timers = [t for t in self.timers if t[1] != timer]
+        heapify(self.timers)
+
+
+    def after_idle(self, func, *args):
+        return self.after(0, func, *args)
+
+
+    def bbox(self, item):
+        '''Return an estimated bounding box for an item.'''
+        kind, coords, options = self.items[item]
+
+        if kind == 'text':
+            font = options.get('font') or ('Arial', 8, 'normal')
+            size = abs(int(font[1])) if len(font) > 1 else 8
+            width = len(str(options.get('text', ''))) * size * 0.6
+            x, y = coords[0], coords[1]
+            return int(x), int(y - size), int(x + width), int(y)
+
+        xs = coords[0::2] or [0]
+        ys = coords[1::2] or [0]
+        return int(min(xs)), int(min(ys)), int(max(xs)), int(max(ys))
+
+
+    def bind(self, *args, **kwargs):
+        pass
+
+
+    def canvasx(self, x):
+        return x
+
+
+    def canvasy(self, y):
+        return y
+
+
+    def cget(self, option):
+        return self.options.get(option, '')
+
+
+    def config(self, **kwargs):
+        self.options.update(kwargs)
+
+    configure = config
+
+
+    def coords(self, item, *coords):
+        '''Set or return the coordinates of an item.'''
+        if not coords:
+            return list(self.items[item][1])
+
+        if len(coords) == 1 and isinstance(coords[0], (list, tuple)):
+            coords = coords[0]
+
+        self.items[item][1] = array('d', coords)
+
+
+    def create_image(self, *coords, **options):
+        return self._create('image', coords, options)
+
+
+    def create_line(self, *coords, **options):
+        return self._create('line', coords, options)
+
+
+    def create_polygon(self, *coords, **options):
+        return self._create('polygon', coords, options)
+
+
+    def create_text(self, *coords, **options):
+        return self._create('text', coords, options)
+
+
+    def delete(self, item):
+        if item == 'all':
+            self.items.clear()
+
+        else:
+            self.items.pop(item, None)
+
+
+    def find_all(self):
+        return tuple(self.items)
+
+
+    def focus_force(self):
+        pass
+
+
+    def itemcget(self, item, option):
+        return self.items[item][2].get(option, '')
+
+
+    def itemconfigure(self, item, **options):
+        self.items[item][2].update(options)
+
+    itemconfig = itemconfigure
+
+
+    def replay(self, canvas):
+        '''Draw the visible items onto a Tk canvas (or another DisplayList).'''
+        create = {
+            'line': canvas.create_line,
+            'polygon': canvas.create_polygon,
+            'text': canvas.create_text,
+        }
+
+        for kind, coords, options in self.visible():
+            create[kind](*coords, **options)
+
+
+    def scale(self, tag, x, y, xscale, yscale):
+        '''Scale the coordinates of an item (or 'all') around x, y.'''
+        items = self.items.values() if tag == 'all' else [self.items[tag]]
+
+        for item in items:
+            coords = item[1]
+            coords[0::2] = array('d', [x + (c - x) * xscale for c in coords[0::2]])
+            coords[1::2] = array('d', [y + (c - y) * yscale for c in coords[1::2]])
+
+
+    def tag_bind(self, *args, **kwargs):
+        pass
+
+
+    def tag_lower(self, item):
+        self.items = {item: self.items[item], **self.items}
+
+
+    def tag_raise(self, item):
+        self.items[item] = self.items.pop(item)
+
+
+    def tag_unbind(self, *args, **kwargs):
+        pass
+
+
+    def toJSON(self):
+        '''Return the visible items as a JSON serializable dict.'''
+        return {
+            'width': self.options['width'],
+            'height': self.options['height'],
+            'bg': self.options['bg'],
+            'items': [
+                [kind, list(coords), options]
+                for kind, coords, options in self.visible()
+            ],
+        }
+
+
+    @classmethod
+    def fromJSON(cls, data):
+        '''Create a DisplayList from a dict made by toJSON.'''
+        displayList = cls(data['width'], data['height'], data['bg'])
+
+        for kind, coords, options in data['items']:
+            displayList._create(kind, coords, options)
+
+        return displayList
+
+
+    def dump(self, fp):
+        '''Serialize the visible items as JSON to a file object.'''
+        json.dump(self.toJSON(), fp, separators=(',', ':'))
+
+
+    @classmethod
+    def load(cls, fp):
+        '''Load a DisplayList from a file object written by dump.'''
+        return cls.fromJSON(json.load(fp))
+
+
+    def type(self, item):
+        if item in self.items:
+            return self.items[item][0]
+
+
+    def unbind(self, *args, **kwargs):
+        pass
+
+
+    def update(self):
+        '''Run any timers that are due.'''
+        now = perf_counter()
+
+        while self.timers and self.timers[0][0] <= now:
+            due, timer, func, args = heappop(self.timers)
+            func(*args)
+
+
+    def visible(self):
+        '''Yield (type, coords, options) for items that would show up.
+
+         Images and items without a fill or outline color (the turtle module
+        creates plenty of those as placeholders) are skipped.
+        '''
+        for kind, coords, options in self.items.values():
+
+            if kind == 'image':
+                continue
+
+            if not options.get('fill') and not options.get('outline'):
+                continue
+
+            yield kind, coords, options
+
+
+    def winfo_height(self):
+        return self.options['height']
+
+
+    def winfo_rgb(self, color):
+        '''Return a color as a 16 bit (r, g, b) tuple, like Tk does.'''
+        color = color.strip()
+
+        if color.startswith('#') and len(color) in (4, 7, 13):
+            digits = (len(color) - 1) // 3
+
+            try:
+                rgb = [
+                    int(color[1+i*digits:1+(i+1)*digits], 16)
+                    for i in range(3)
+                ]
+            except ValueError:
+                raise turtle.TK.TclError(f'unknown color name "{color}"')
+
+            scale = 0xffff // (16 ** digits - 1)
+            return tuple(c * scale for c in rgb)
+
+        if color.replace(' ', '').isalnum() and not color.isdigit():
+            return tuple(c * 257 for c in COLORS.get(color.casefold(), (0, 0, 0)))
+
+        raise turtle.TK.TclError(f'unknown color name "{color}"')
+
+
+    def winfo_toplevel(self):
+        return self
+
+
+    def winfo_width(self):
+        return self.options['width']
+
+
+class HeadlessScreen(turtle.TurtleScreen):
+    '''A TurtleScreen that draws into a DisplayList instead of a Tk canvas.'''
+    def _blankimage(self):
+        return ''
+
+
+    def _image(self, filename):
+        return filename
+
+
+# Options kept for each kind of canvas item by itemState().
+ITEM_OPTIONS = {
+    'line': ('fill', 'width', 'capstyle'),
+    'polygon': ('fill', 'outline', 'width'),
+    'text': ('text', 'fill', 'font', 'anchor'),
+}
+
+
+def itemState(cv, item):
+    '''Return (kind, coords, options) of a canvas item, or None.
+
+     Images, and items that draw nothing (the turtle module leaves plenty of
+    those behind as placeholders), are None too.
+    '''
+    kind = cv.type(item)
+
+    if kind not in ITEM_OPTIONS:
+        return None
+
+    coords = array('d', cv.coords(item))
+
+    if len(coords) < (2 if kind == 'text' else 4):
+        return None
+
+    options = {option: cv.itemcget(item, option) for option in ITEM_OPTIONS[kind]}
+
+    if kind != 'text' and not options['fill'] and not options.get('outline'):
+        return None
+
+    return kind, coords, options
+
+
+class CanvasExport():
+    '''Write canvas items out as SVG or PostScript, without Tk's help.
+
+     Items are (kind, coords, options) as itemState() returns them. Only
+    resolve() talks to the canvas, turning colors into #rrggbb (Tk color
+    names aren't all SVG or PostScript ones) and fonts into tuples, so the
+    rest can run on any thread. Documents cover box, the (x0, y0, width,
+    height) of the canvas in canvas coordinates.
+    '''
+    CAPSTYLES = {'butt': 'butt', 'round': 'round', 'projecting': 'square'}
+
+    def __init__(self, cv):
+        self.cv = cv
+        self.colors = {'': ''}
+
+
+    def color(self, color):
+        '''Return a color as #rrggbb, or '' for none.'''
+        color = str(color)
+        resolved = self.colors.get(color)
+
+        if resolved is None:
+
+            try:
+                r, g, b = self.cv.winfo_rgb(color)
+                resolved = f'#{r >> 8:02x}{g >> 8:02x}{b >> 8:02x}'
+
+            except turtle.TK.TclError:
+                resolved = '#000000'
+
+            self.colors[color] = resolved
+
+        return resolved
+
+
+    def items(self):
+        '''Return the state of every item on the canvas, bottom first.'''
+        states = (itemState(self.cv, item) for item in self.cv.find_all())
+        return [self.resolve(state) for state in states if state is not None]
+
+
+    def resolve(self, state):
+        '''Return an item state with its colors and font resolved.'''
+        kind, coords, options = state
+        options = dict(options)
+
+        for option in ('fill', 'outline'):
+
+            if option in options:
+                options[option] = self.color(options[option])
+
+        font = options.get('font')
+
+        if isinstance(font, str):
+            splitlist = getattr(getattr(self.cv, 'tk', None), 'splitlist', None)
+            options['font'] = splitlist(font) if splitlist else font.split()
+
+        return kind, coords, options
+
+
+    @staticmethod
+    def points(coords):
+        return ' '.join(map('{:.2f}'.format, coords))
+
+
+    @staticmethod
+    def font(options):
+        '''Return the family and pixel size of a text item's font.'''
+        font = options.get('font') or ('Arial', 8)
+        size = abs(float(font[1])) if len(font) > 1 else 8
+        return font[0], size
+
+
+    @classmethod
+    def element(cls, kind, coords, options, points=None):
+        '''Return an SVG element for a resolved item.
+
+         points, if given, are the coords already formatted by points().
+        '''
+        if points is None and kind != 'text':
+            points = cls.points(coords)
+
+        if kind == 'line':
+            return (
+                f'<polyline points="{points}" fill="none" '
+                f'stroke="{options["fill"]}" '
+                f'stroke-width="{float(options.get("width") or 1):g}" '
+                f'stroke-linecap="'
+                f'{cls.CAPSTYLES.get(options.get("capstyle"), "butt")}" '
+                f'stroke-linejoin="round"/>\n'
+            )
+
+        if kind == 'polygon':
+            return (
+                f'<polygon points="{points}" '
+                f'fill="{options["fill"] or "none"}" '
+                f'stroke="{options.get("outline") or "none"}" '
+                f'stroke-width="{float(options.get("width") or 1):g}"/>\n'
+            )
+
+        family, size = cls.font(options)
+        anchor = options.get('anchor') or 'center'
+        text = (
+            str(options.get('text', ''))
+            .replace('&', '&amp;')
+            .replace('<', '&lt;')
+            .replace('>', '&gt;')
+        )
+        return (
+            f'<text x="{coords[0]:.2f}" y="{coords[1]:.2f}" '
+            f'fill="{options["fill"] or "#000000"}" '
+            f'font-family="{family}" font-size="{size:g}" text-anchor="'
+            f'{"start" if "w" in anchor else "end" if "e" in anchor else "middle"}"'
+            f'>{text}</text>\n'
+        )
+
+
+    @staticmethod
+    def image(box, data):
+        '''Return an SVG element for a base64 PNG covering box.'''
+        x, y, width, height = box
+        return (
+            f'<image x="{x}" y="{y}" width="{width}" height="{height}" '
+            f'href="data:image/png;base64,{data}"/>\n'
+        )
+
+
+    @staticmethod
+    def svg(fp, elements, box, bg='white'):
+        '''Write an SVG document made of elements to a file object.'''
+        x, y, width, height = box
+        fp.write(
+            f'<?xml version="1.0" encoding="UTF-8"?>\n'
+            f'<svg xmlns="http://www.w3.org/2000/svg" '
+            f'width="{width:g}" height="{height:g}" '
+            f'viewBox="{x:g} {y:g} {width:g} {height:g}">\n'
+            f'<rect x="{x:g}" y="{y:g}" width="{width:g}" height="{height:g}" '
+            f'fill="{bg}"/>\n'
+        )
+        fp.writelines(elements)
+        fp.write('</svg>\n')
+
+
+    def writeSVG(self, fp, items, box, bg='white', layers=()):
+        '''Write resolved items to a file object as an SVG document.
+
+         layers are (box, data) images to put below the items, see FlatLayer.
+        '''
+        self.svg(
+            fp,
+            [self.image(*layer) for layer in layers]
+            + [self.element(*item) for item in items],
+            box,
+            self.color(bg) or 'white',
+        )
+
+
+    @staticmethod
+    def rgb(color):
+        return ' '.join(
+            f'{int(color[i:i + 2], 16) / 255:.3f}' for i in (1, 3, 5)
+        )
+
+
+    def writePostScript(self, fp, items, box, bg='white'):
+        '''Write resolved items to a file object as Encapsulated PostScript.'''
+        x, y, width, height = box
+        fp.write(
+            f'%!PS-Adobe-3.0 EPSF-3.0\n'
+            f'%%BoundingBox: 0 0 {int(width)} {int(height)}\n'
+            f'%%EndComments\n'
+            f'{self.rgb(self.color(bg) or "#ffffff")} setrgbcolor '
+            f'0 0 {width:g} {height:g} rectfill\n'
+            f'0 {height:g} translate 1 -1 scale {-x:g} {-y:g} translate\n'
+            f'1 setlinejoin\n'
+        )
+
+        for kind, coords, options in items:
+
+            if kind == 'text':
+                family, size = self.font(options)
+                text = (
+                    str(options.get('text', ''))
+                    .replace('\\', '\\\\')
+                    .replace('(', '\\(')
+                    .replace(')', '\\)')
+                )
+                fp.write(
+                    f'{self.rgb(options["fill"] or "#000000")} setrgbcolor '
+                    f'/Helvetica findfont {size:g} scalefont setfont '
+                    f'gsave {coords[0]:.2f} {coords[1]:.2f} moveto 1 -1 scale '
+                    f'({text}) show grestore\n'
+                )
+                continue
+
+            points = [
+                f'{coords[i]:.2f} {coords[i + 1]:.2f}'
+                for i in range(0, len(coords) - 1, 2)
+            ]
+            fp.write(
+                f'{float(options.get("width") or 1):g} setlinewidth '
+                f'newpath {points[0]} moveto '
+                f'{" ".join(point + " lineto" for point in points[1:])}'
+                f'{" closepath" if kind == "polygon" else ""}\n'
+            )
+            fill = options['fill']
+            outline = fill if kind == 'line' else options.get('outline')
+
+            if kind == 'polygon' and fill:
+                fp.write(f'{self.rgb(fill)} setrgbcolor '
+                         f'{"gsave fill grestore" if outline else "fill"}\n')
+
+            if outline:
+                cap = 1 if options.get('capstyle') == 'round' else 0
+                fp.write(f'{cap} setlinecap {self.rgb(outline)} setrgbcolor stroke\n')
+
+        fp.write('showpage\n')
+
+
+class FrameRecorder():
+    '''Save a frame of the drawing as it builds, every so many operations.
+
+     Frames are captured on the GUI thread as just the items that changed:
+    those each turtle drew since the last frame, and the ones it was still
+    drawing at the last (its line, a PathTurtle's run and any fill), found by
+    the index they were at. A run only sends the points added to it. Turtles
+    that were cleared or undone, and every turtle after a zoom, are sent
+    again in full. A background thread keeps the SVG element of every item
+    up to date from these, and writes each frame to directory as a whole SVG
+    document (frame000001.svg and so on), so capturing costs little more
+    than reading the changed coordinates.
+    '''
+    def __init__(self, cv, directory, every=100, prefix='frame'):
+        os.makedirs(directory, exist_ok=True)
+        self.export = CanvasExport(cv)
+        self.directory = directory
+        self.every = every
+        self.prefix = prefix
+        self.ops = 0
+        self.frames = 0
+        self.known = {}
+        self.scale = None
+        self.error = None
+        self.inbox = queue.SimpleQueue()
+        self.thread = threading.Thread(
+            target=self.writer,
+            name='ptsg-frames',
+            daemon=True,
+        )
+        self.thread.start()
+
+
+    def count(self, ops=1):
+        '''Count ops run, returning True when a frame is due.'''
+        self.ops += ops
+        return self.ops >= self.every
+
+
+    def capture(self, turtles, scale, box, bg='white'):
+        '''Queue a frame with what changed since the last one.
+
+         turtles is a dict of name: turtle (swarms are left out), scale the
+        screen's (xscale, yscale) and box the part of the canvas to save.
+        '''
+        self.ops = 0
+        reset = scale != self.scale
+        self.scale = scale
+        cv = self.export.cv
+        changes = {}
+
+        for name, t in turtles.items():
+
+            if isinstance(t, Swarm):
+                continue
+
+            stamps = [
+                item for stamp in t.stampItems
+                for item in (stamp if isinstance(stamp, tuple) else (stamp,))
+            ]
+            undone = getattr(t, 'undone', 0)
+            known = self.known.get(name)
+            full = reset or known is None or known[2] != undone
+            counts = known[:2] if known else ((0, None), (0, None))
+            starts = []
+
+            for items, (count, last) in zip((t.items, stamps), counts):
+
+                if count and (len(items) < count or items[count - 1] != last):
+                    full = True
+
+                starts.append(count)
+
+            if full:
+                starts = [0, 0]
+
+            run, runItem = getattr(t, '_run', None), getattr(t, '_runItem', None)
+            drawing = {
+                t.currentLineItem, runItem, t._fillitem if t.filling() else None,
+            }
+            drawing.discard(None)
+            growing = {}
+            states = []
+
+            if not full:
+
+                for item, (index, sent) in known[3].items():
+
+                    if (index >= starts[0] or index >= len(t.items)
+                            or t.items[index] != item):
+                        continue
+
+                    if item in drawing:
+                        growing[item] = (index, len(run) if item == runItem else None)
+
+                    if item == runItem and sent is not None and len(run) >= sent:
+                        growing[item] = (index, len(run))
+                        coords = run.canvasCoords(*scale, start=sent)
+
+                        if coords:
+                            options = {
+                                option: cv.itemcget(item, option)
+                                for option in ITEM_OPTIONS['line']
+                            }
+                            state = ('line', array('d', coords), options)
+                            states.append((item, self.export.resolve(state), 2 * sent))
+
+                        continue
+
+                    state = itemState(cv, item)
+                    states.append((item, state and self.export.resolve(state), 0))
+
+            for start, items in zip(starts, (t.items, stamps)):
+
+                for index, item in enumerate(items[start:], start):
+                    state = itemState(cv, item)
+                    states.append((item, state and self.export.resolve(state), 0))
+
+                    if item in drawing and items is t.items:
+                        growing[item] = (index, len(run) if item == runItem else None)
+
+            layer = getattr(t, 'layer', None)
+            changes[name] = (full, states, layer and layer.state())
+            self.known[name] = (
+                (len(t.items), t.items[-1] if t.items else None),
+                (len(stamps), stamps[-1] if stamps else None),
+                undone,
+                growing,
+            )
+
+        for name in list(self.known):
+
+            if name not in turtles:
+                del self.known[name]
+
+        self.frames += 1
+        self.inbox.put((self.frames, changes, box, self.export.color(bg)))
+
+
+    def stop(self):
+        '''Wait for the frames still queued to be written.'''
+        self.inbox.put(None)
+        self.thread.join()
+
+
+    def update(self, old, offset, kind, coords, options):
+        '''Return (element, kind, coords, options, points) for an item.
+
+         With an offset, coords are only the ones from there on and the rest
+        are old's. A line that only grew since old only has its new points
+        formatted.
+        '''
+        points = None
+
+        if offset and old is not None and len(old[2]) >= offset:
+            coords = old[2][:offset] + coords
+
+        if old is not None and old[1] == kind and old[3] == options:
+            length = len(old[2])
+
+            if len(coords) >= length and coords[:length] == old[2]:
+                points = old[4]
+
+                if len(coords) > length:
+                    points += ' ' + self.export.points(coords[length:])
+
+        if points is None:
+            points = self.export.points(coords)
+
+        element = self.export.element(kind, coords, options, points)
+        return (element, kind, coords, options, points)
+
+
+    def writer(self):
+        '''Keep the scene up to date and write out frames, on a thread.'''
+        scene = {}
+        owned = {}
+
+        while True:
+            message = self.inbox.get()
+
+            if message is None:
+                return
+
+            frame, changes, box, bg = message
+            layers = []
+
+            for name in list(owned):
+
+                if name not in changes:
+
+                    for item in owned.pop(name):
+                        scene.pop(item, None)
+
+            for name, (full, states, layer) in changes.items():
+                items = owned.setdefault(name, set())
+
+                if layer is not None:
+                    layers.append(self.export.image(*layer))
+
+                if full:
+
+                    for item in items:
+                        scene.pop(item, None)
+
+                    items.clear()
+
+                for item, state, offset in states:
+
+                    if state is None:
+                        scene.pop(item, None)
+                        items.discard(item)
+
+                    else:
+                        scene[item] = self.update(scene.get(item), offset, *state)
+                        items.add(item)
+
+            path = os.path.join(self.directory, f'{self.prefix}{frame:06d}.svg')
+
+            try:
+
+                with open(path, 'w') as f:
+                    # Item ids go up in the order items were created.
+                    self.export.svg(
+                        f,
+                        layers + [scene[item][0] for item in sorted(scene)],
+                        box,
+                        bg,
+                    )
+
+            except OSError as e:
+                self.error = e
+
+
+def pngData(width, height, pixels):
+    '''Return RGBA pixels (width * height * 4 bytes) as a base64 PNG.'''
+    stride = width * 4
+    rows = b''.join(
+        b'\0' + pixels[y * stride:(y + 1) * stride] for y in range(height)
+    )
+
+    def chunk(kind, data):
+        return (struct.pack('>I', len(data)) + kind + data
+                + struct.pack('>I', zlib.crc32(kind + data)))
+
+    return base64.b64encode(
+        b'\x89PNG\r\n\x1a\n'
+        + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0))
+        + chunk(b'IDAT', zlib.compress(rows, 6))
+        + chunk(b'IEND', b'')
+    ).decode('ascii')
+
+
+def pngPixels(data):
+    '''Return the RGBA pixels of a base64 PNG written by pngData().'''
+    png = base64.b64decode(data)
+    width, height = struct.unpack('>II', png[16:24])
+    length = struct.unpack('>I', png[33:37])[0]
+    rows = zlib.decompress(png[41:41 + length])
+    stride = width * 4 + 1
+    return bytearray(b''.join(
+        rows[y * stride + 1:(y + 1) * stride] for y in range(height)
+    ))
+
+
+class FlatLayer():
+    '''A turtle's finished drawing, flattened into an image.
+
+     Lines and polygons are drawn into RGBA pixels covering box, the (x, y,
+    width, height) of the canvas it was flattened from, and shown as a PNG
+    at the bottom of the canvas. Pixels nothing was drawn on stay clear, so
+    the layers of several turtles stack. Headless, the pixels are only kept.
+    Layers hold a fixed amount of memory however much is drawn into them,
+    but as images they don't scale when the view is zoomed.
+
+     bounds() gives the box items need and clip() the part of it inside a
+    region, so a layer can be made (or grown, pasting the old one on) to
+    cover them.
+    '''
+    def __init__(self, cv, box, data=None):
+        self.cv = cv
+        self.box = tuple(int(v) for v in box)
+        width, height = self.box[2:]
+        self.pixels = pngPixels(data) if data else bytearray(width * height * 4)
+        self.export = CanvasExport(cv)
+        self.image = None
+        self.item = None
+        self._data = data
+
+
+    def _brush(self, x, y, size, rgba):
+        '''Paint a size pixels wide square centred on x, y.'''
+        x0, y0, width, height = self.box
+        half = size // 2
+        left = max(int(x) - x0 - half, 0)
+        right = min(int(x) - x0 - half + size, width)
+
+        if left >= right:
+            return
+
+        span = rgba * (right - left)
+
+        for row in range(max(int(y) - y0 - half, 0),
+                         min(int(y) - y0 - half + size, height)):
+            start = (row * width + left) * 4
+            self.pixels[start:start + len(span)] = span
+
+
+    def _rgba(self, color):
+        return bytes.fromhex(self.export.color(color)[1:]) + b'\xff'
+
+
+    @staticmethod
+    def bounds(states, *boxes):
+        '''Return the (x, y, width, height) box covering the pixels states draw
+        on, and the boxes that aren't None.
+        '''
+        xs, ys = [], []
+
+        for box in boxes:
+
+            if box is not None:
+                xs += (box[0], box[0] + box[2])
+                ys += (box[1], box[1] + box[3])
+
+        for kind, coords, options in states:
+            pad = max(float(options.get('width') or 1), 1) / 2 + 1
+            xs += (min(coords[0::2]) - pad, max(coords[0::2]) + pad)
+            ys += (min(coords[1::2]) - pad, max(coords[1::2]) + pad)
+
+        x, y = floor(min(xs)), floor(min(ys))
+        return (x, y, ceil(max(xs)) - x, ceil(max(ys)) - y)
+
+
+    @staticmethod
+    def clip(box, region):
+        '''Return the part of box inside region, or None if there's none.'''
+        x0, y0 = max(box[0], region[0]), max(box[1], region[1])
+        x1 = min(box[0] + box[2], region[0] + region[2])
+        y1 = min(box[1] + box[3], region[1] + region[3])
+
+        if x0 >= x1 or y0 >= y1:
+            return None
+
+        x, y = floor(x0), floor(y0)
+        return (x, y, ceil(x1) - x, ceil(y1) - y)
+
+
+    def draw(self, states):
+        '''Draw (kind, coords, options) items, as itemState() returns them.'''
+        self._data = None
+
+        for kind, coords, options in states:
+            width = max(int(round(float(options.get('width') or 1))), 1)
+
+            if kind == 'polygon':
+
+                if options['fill']:
+                    self.fill(coords, self._rgba(options['fill']))
+
+                if options.get('outline'):
+                    self.line(list(coords) + list(coords[:2]),
+                              self._rgba(options['outline']), width)
+
+            elif kind == 'line':
+                self.line(coords, self._rgba(options['fill']), width)
+
+
+    def fill(self, coords, rgba):
+        '''Fill a polygon, even-odd, a row of pixels at a time.'''
+        x0, y0, width, height = self.box
+        points = list(zip(coords[0::2], coords[1::2]))
+        edges = list(zip(points, points[1:] + points[:1]))
+        ys = coords[1::2]
+
+        for row in range(max(int(min(ys)) - y0, 0),
+                         min(int(max(ys)) - y0 + 1, height)):
+            y = row + y0 + 0.5
+            crossings = sorted(
+                ax + (y - ay) * (bx - ax) / (by - ay)
+                for (ax, ay), (bx, by) in edges
+                if (ay <= y) != (by <= y)
+            )
+
+            for left, right in zip(crossings[0::2], crossings[1::2]):
+                left = max(int(left + 0.5) - x0, 0)
+                right = min(int(right + 0.5) - x0, width)
+
+                if left < right:
+                    start = (row * width + left) * 4
+                    self.pixels[start:start + (right - left) * 4] = rgba * (right - left)
+
+
+    def line(self, coords, rgba, width=1):
+        '''Draw a polyline, stepping a pixel at a time along each segment.'''
+        for i in range(0, len(coords) - 3, 2):
+            ax, ay, bx, by = coords[i:i + 4]
+            steps = int(max(abs(bx - ax), abs(by - ay))) + 1
+
+            for step in range(steps + 1):
+                self._brush(ax + (bx - ax) * step / steps + 0.5,
+                            ay + (by - ay) * step / steps + 0.5,
+                            width, rgba)
+
+
+    def data(self):
+        '''Return the layer as a base64 PNG, kept until it's drawn on.'''
+        if self._data is None:
+            self._data = pngData(self.box[2], self.box[3], bytes(self.pixels))
+
+        return self._data
+
+
+    def delete(self):
+        if self.item is not None:
+            self.cv.delete(self.item)
+            self.item = None
+
+
+    def show(self):
+        '''Put the layer on the canvas, below everything else.'''
+        if self.item is None:
+            x, y = self.box[:2]
+
+            if isinstance(self.cv, DisplayList):
+                self.item = self.cv.create_image(x, y, image='', anchor='nw')
+
+            else:
+                self.image = turtle.TK.PhotoImage(master=self.cv)
+                self.item = self.cv.create_image(
+                    x, y,
+                    image=self.image,
+                    anchor='nw',
+                )
+
+            self.cv.tag_lower(self.item)
+
+        if self.image is not None:
+            self.image.configure(data=self.data(), format='png')
+
+
+    def paste(self, layer):
+        '''Copy the pixels drawn on another layer onto this one.'''
+        self._data = None
+        x0, y0, width, height = self.box
+        x1, y1, width1, height1 = layer.box
+        left = max(x0, x1)
+        right = min(x0 + width, x1 + width1)
+        top = max(y0, y1)
+        bottom = min(y0 + height, y1 + height1)
+
+        if left >= right or top >= bottom:
+            return
+
+        if np is not None:
+            to = np.frombuffer(self.pixels, np.uint8).reshape(height, width, 4)[
+                top - y0:bottom - y0, left - x0:right - x0]
+            row = np.frombuffer(layer.pixels, np.uint8).reshape(height1, width1, 4)[
+                top - y1:bottom - y1, left - x1:right - x1]
+            drawn = row[..., 3] != 0
+            to[drawn] = row[drawn]
+            return
+
+        for y in range(top, bottom):
+            start = ((y - y1) * width1 + left - x1) * 4
+            row = layer.pixels[start:start + (right - left) * 4]
+
+            # Most rows of a layer are mostly clear.
+            if not row.strip(b'\0'):
+                continue
+
+            to = ((y - y0) * width + left - x0) * 4
+
+            # Copied whole onto a clear row, pixel by pixel onto a drawn one.
+            if not self.pixels[to:to + len(row)].strip(b'\0'):
+                self.pixels[to:to + len(row)] = row
+                continue
+
+            for i in range(3, len(row), 4):
+
+                if row[i]:
+                    self.pixels[to + i - 3:to + i + 1] = row[i - 3:i + 1]
+
+
+    def state(self):
+        '''Return the layer as (box, data), for FlatLayer(cv, *state).'''
+        return (self.box, self.data())
+
+
+class PathBuffer():
+    '''A growable buffer of (x, y) points in turtle coordinates.
+
+     Points are kept in a NumPy array that doubles in size as it fills up, or
+    in a flat array of doubles if NumPy is not installed.
+    '''
+    __slots__ = ('points', 'length')
+
+    def __init__(self, points=()):
+        self.length = 0
+
+        if np is not None:
+            self.points = np.empty((64, 2))
+
+        else:
+            self.points = array('d')
+
+        self.extend(points)
+
+
+    def __len__(self):
+        return self.length
+
+
+    def canvasCoords(self, xscale=1.0, yscale=1.0, start=0):
+        '''Return the points from start on as a flat list of canvas coordinates.'''
+        if np is not None:
+            return (
+                self.points[start:self.length] * (xscale, -yscale)
+            ).ravel().tolist()
+
+        coords = self.points[2 * start:].tolist()
+        coords[0::2] = [x * xscale for x in coords[0::2]]
+        coords[1::2] = [-y * yscale for y in coords[1::2]]
+        return coords
+
+
+    def extend(self, points):
+        '''Append a sequence of (x, y) points.'''
+        points = list(points)
+        length = self.length + len(points)
+
+        if np is not None:
+
+            if length > len(self.points):
+                grown = np.empty((max(length, 2 * len(self.points)), 2))
+                grown[:self.length] = self.points[:self.length]
+                self.points = grown
+
+            if points:
+                self.points[self.length:length] = points
+
+        else:
+
+            for x, y in points:
+                self.points.append(x)
+                self.points.append(y)
+
+        self.length = length
+
+
+    def truncate(self, length):
+        '''Drop all but the first length points.'''
+        self.length = min(length, self.length)
+
+        if np is None:
+            del self.points[2 * self.length:]
+
+
+class SegmentIndex():
+    '''A uniform grid index of drawn line segments, in turtle coordinates.
+
+     Segments are stored in flat arrays under increasing ids, tagged with the
+    name of the turtle that drew them, and listed in every grid cell within a
+    quarter cell of them. nearest() only looks at the cells around a point,
+    so lookups cost the same however many segments there are. Removed
+    segments are marked dead and the grid is rebuilt once most are.
+    '''
+    def __init__(self, cell=5):
+        self.cell = cell
+        self.grid = {}
+        self.coords = array('d')
+        self.owners = array('i')
+        self.alive = bytearray()
+        self.names = []
+        self.ids = {}
+        self.drawn = {}
+        self.dead = 0
+
+
+    def __len__(self):
+        return len(self.alive) - self.dead
+
+
+    def _cells(self, x0, y0, x1, y1):
+        '''Return the cells a segment passes through, sampled every half cell.'''
+        cell = self.cell
+        first = (int(x0 // cell), int(y0 // cell))
+
+        # Most segments are short, and a cell holds all of a segment whose
+        # ends are both in it.
+        if first == (int(x1 // cell), int(y1 // cell)):
+            return (first,)
+
+        steps = int(max(abs(x1 - x0), abs(y1 - y0)) * 2 / cell) + 1
+        return {
+            (int((x0 + (x1 - x0) * i / steps) // cell),
+             int((y0 + (y1 - y0) * i / steps) // cell))
+            for i in range(steps + 1)
+        }
+
+
+    def add(self, start, end, owner):
+        '''Add the segment from start to end drawn by owner, returning its id.'''
+        if owner not in self.ids:
+            self.ids[owner] = len(self.names)
+            self.names.append(owner)
+
+        if owner not in self.drawn:
+            self.drawn[owner] = []
+
+        segment = len(self.alive)
+        x0, y0 = start
+        x1, y1 = end
+        self.coords.extend((x0, y0, x1, y1))
+        self.owners.append(self.ids[owner])
+        self.alive.append(1)
+        self.drawn[owner].append(segment)
+        grid = self.grid
+
+        for key in self._cells(x0, y0, x1, y1):
+            cell = grid.get(key)
+
+            if cell is None:
+                grid[key] = [segment]
+
+            else:
+                cell.append(segment)
+
+        return segment
+
+
+    def addPath(self, points, owner):
+        '''Add a segment between each pair of consecutive (x, y) points.'''
+        points = iter(points)
+        start = next(points, None)
+
+        for end in points:
+            self.add(start, end, owner)
+            start = end
+
+
+    def clear(self, owner=None):
+        '''Remove every segment drawn by owner, or all of them.'''
+        if owner is None:
+            self.__init__(self.cell)
+            return
+
+        for segment in self.drawn.pop(owner, []):
+            self._kill(segment)
+
+        self._compact()
+
+
+    def _kill(self, segment):
+        if self.alive[segment]:
+            self.alive[segment] = 0
+            self.dead += 1
+
+
+    def _compact(self):
+        '''Rebuild the grid without dead segments once most of them are.'''
+        if self.dead * 2 <= len(self.alive):
+            return
+
+        coords, owners, alive = self.coords, self.owners, self.alive
+        names = self.names
+        self.__init__(self.cell)
+
+        for segment, live in enumerate(alive):
+
+            if live:
+                i = 4 * segment
+                self.add(coords[i:i + 2], coords[i + 2:i + 4], names[owners[segment]])
+
+
+    def nbytes(self):
+        '''Return about how many bytes the index takes.'''
+        return (
+            self.coords.itemsize * len(self.coords)
+            + self.owners.itemsize * len(self.owners)
+            + len(self.alive)
+            + sum(sys.getsizeof(cell) for cell in self.grid.values())
+            + sum(sys.getsizeof(segments) for segments in self.drawn.values())
+        )
+
+
+    def nearest(self, x, y, radius):
+        '''Return (distance, segment, owner) of the closest segment to x, y.
+
+         Only segments within radius are considered, None is returned if
+        there are none.
+        '''
+        cell = self.cell
+        reach = radius + cell / 4
+        grid = self.grid
+        coords = self.coords
+        alive = self.alive
+        best = None
+        bestDistance = radius * radius
+        seen = set()
+
+        for cx in range(int((x - reach) // cell), int((x + reach) // cell) + 1):
+
+            for cy in range(int((y - reach) // cell), int((y + reach) // cell) + 1):
+
+                for segment in grid.get((cx, cy), ()):
+
+                    if segment in seen or not alive[segment]:
+                        continue
+
+                    seen.add(segment)
+                    i = 4 * segment
+                    x0, y0, x1, y1 = coords[i], coords[i + 1], coords[i + 2], coords[i + 3]
+                    dx, dy = x1 - x0, y1 - y0
+                    length = dx * dx + dy * dy
+                    t = 0.0
+
+                    if length:
+                        t = min(max(((x - x0) * dx + (y - y0) * dy) / length, 0.0), 1.0)
+
+                    px, py = x0 + t * dx - x, y0 + t * dy - y
+                    distance = px * px + py * py
+
+                    if distance <= bestDistance:
+                        best, bestDistance = segment, distance
+
+        if best is None:
+            return None
+
+        return bestDistance ** 0.5, best, self.names[self.owners[best]]
+
+
+    def pop(self, owner):
+        '''Remove the last segment drawn by owner, for undo.'''
+        drawn = self.drawn.get(owner)
+
+        if drawn:
+            self._kill(drawn.pop())
+            self._compact()
+
+
+    def segment(self, segment):
+        '''Return the ((x0, y0), (x1, y1)) ends of a segment.'''
+        i = 4 * segment
+        coords = self.coords
+        return (coords[i], coords[i + 1]), (coords[i + 2], coords[i + 3])
+
+
+class ShapeRegistry():
+    '''Turtle shapes, kept turned to every heading bucket, and colors.
+
+     Shapes are registered with the screen once, by register(), and from
+    then on can be set with shape() like the builtin ones. parts() returns
+    a turtle's polygon or compound shape as the polygons stamp() draws,
+    already transformed (resized, sheared) and turned to the nearest of
+    buckets headings, as canvas offsets from the turtle. They are worked
+    out the first time a shape is used at a heading, and kept.
+
+     color() turns Tk color names into #rrggbb, once per name, so turtles
+    don't ask Tk to check the same name again every time it's set.
+    '''
+    def __init__(self, screen, buckets=360):
+        self.screen = screen
+        self.buckets = buckets
+        self.shapes = {}
+        self.colors = {'': ''}
+
+
+    def color(self, color):
+        '''Return a color string as #rrggbb, or '' for none.'''
+        resolved = self.colors.get(color)
+
+        if resolved is None:
+
+            try:
+                r, g, b = self.screen.cv.winfo_rgb(color)
+
+            except turtle.TK.TclError:
+                raise turtle.TurtleGraphicsError(f'bad color string: {color}')
+
+            resolved = f'#{r >> 8:02x}{g >> 8:02x}{b >> 8:02x}'
+            self.colors[color] = resolved
+
+        return resolved
+
+
+    def parts(self, t):
+        '''Return t's shape as [(offsets, fill, outline), ...], or None.
+
+         offsets are the canvas x, y offsets of the polygon's points from
+        the turtle, flattened. Polygon shapes have one part, with fill and
+        outline None for the turtle's own colors. Image shapes are None.
+        '''
+        name = t.turtle.shapeIndex
+        shape = self.screen._shapes[name]
+
+        if shape._type not in ('polygon', 'compound'):
+            return None
+
+        # Shapes replaced with the screen's register_shape() start over.
+        cached = self.shapes.get(name)
+
+        if cached is None or cached[0] is not shape:
+            cached = self.shapes[name] = (shape, {})
+
+        if shape._type == 'compound' or t._resizemode == 'user':
+            trafo = t._shapetrafo
+
+        elif t._resizemode == 'auto':
+            size = max(1, t._pensize / 5.0)
+            trafo = (size, 0, 0, size)
+
+        else:
+            trafo = (1, 0, 0, 1)
+
+        x, y = t._orient
+        bucket = round(degrees(atan2(y, x)) * self.buckets / 360) % self.buckets
+        key = (bucket, trafo, self.screen.yscale / self.screen.xscale)
+        parts = cached[1].get(key)
+
+        if parts is None:
+            parts = cached[1][key] = self._turn(t, shape, *key)
+
+        return parts
+
+
+    def _turn(self, t, shape, bucket, trafo, aspect):
+        '''Work out the parts of a shape at a heading bucket, like
+        RawTurtle._polytrafo() does for every stamp.
+        '''
+        angle = radians(bucket * 360 / self.buckets)
+        e0, e1 = cos(angle), sin(angle) * aspect
+        length = (e0 * e0 + e1 * e1) ** 0.5
+        e0, e1 = e0 / length, e1 / length
+        t11, t12, t21, t22 = trafo
+
+        if shape._type == 'polygon':
+            components = [(shape._data, None, None)]
+
+        else:
+            components = [
+                (polygon, self._partColor(t, fill), self._partColor(t, outline))
+                for polygon, fill, outline in shape._data
+            ]
+
+        parts = []
+
+        for polygon, fill, outline in components:
+            offsets = []
+
+            for x, y in polygon:
+                x, y = t11 * x + t12 * y, t21 * x + t22 * y
+                offsets.append(e1 * x + e0 * y)
+                offsets.append(e0 * x - e1 * y)
+
+            parts.append((offsets, fill, outline))
+
+        return parts
+
+
+    def _partColor(self, t, color):
+        if isinstance(color, str):
+            return self.color(color)
+
+        return t._cc(color)
+
+
+    def register(self, name, parts):
+        '''Register a shape with the screen, replacing any of that name.
+
+         parts is a list of (polygon, fill, outline) for a compound shape
+        (outline defaults to fill), or a polygon of (x, y) points for one
+        drawn in the turtle's colors.
+        '''
+        if parts and isinstance(parts[0][0], (int, float)):
+            shape = turtle.Shape('polygon', tuple(tuple(p) for p in parts))
+
+        else:
+            shape = turtle.Shape('compound')
+
+            for polygon, fill, *outline in parts:
+                shape.addcomponent(
+                    tuple(tuple(p) for p in polygon),
+                    fill,
+                    outline[0] if outline else None,
+                )
+
+        self.screen.register_shape(name, shape)
+        self.shapes.pop(name, None)
+
+
+class PathTurtle(turtle.RawTurtle):
+    '''A RawTurtle that coalesces pen down segments into polyline items.
+
+     RawTurtle starts a new canvas line item every 42 points. A PathTurtle
+    instead folds each full line into a run kept in a PathBuffer, drawn as a
+    single canvas item, so a contiguous same color, same width path costs two
+    canvas items (the run and the line being drawn) per runPoints points. The
+    run is closed whenever the pen goes up or changes color or width, a fill
+    begins or ends, or anything else makes the turtle start a new line, and
+    once it holds runPoints points, since every redraw sends all of them.
+
+     If segments is set to a SegmentIndex, every segment drawn is added to it
+    tagged with owner (and removed again by undo and clear).
+
+     undone counts the steps undone, which can change items drawn long ago.
+
+     flatten() moves everything drawn so far into a FlatLayer image (layer),
+    so a turtle that keeps drawing can do so in a fixed amount of memory.
+    weight() estimates the points its canvas items hold, to tell when.
+
+     If shapes is set to a ShapeRegistry, color strings are checked by it
+    (once per name) and stamps are drawn from its polygons, each with a single canvas call.
+    stamps() stamps many points at once.
+    '''
+    runPoints = 4096
+
+    def __init__(self, *args, undobuffersize=1000, **kwargs):
+        self._run = None
+        self._runItem = None
+        self._runDirty = False
+        self.segments = None
+        self.shapes = None
+        self.owner = None
+        self.undone = 0
+        self.layer = None
+        self.drawn = 0
+        super().__init__(*args, undobuffersize=undobuffersize or 1, **kwargs)
+
+        if not undobuffersize:
+            # RawTurtle always starts with an undo buffer.
+            self._undobuffersize = None
+            self.setundobuffer(None)
+
+
+    def _clear(self):
+        self._run = None
+        self._runItem = None
+        self._runDirty = False
+        self.drawn = 0
+
+        if self.segments is not None:
+            self.segments.clear(self.owner)
+
+        if self.layer is not None:
+            self.layer.delete()
+            self.layer = None
+
+        super()._clear()
+
+
+    def _colorstr(self, args):
+        color = args[0] if len(args) == 1 else args
+
+        if self.shapes is not None and isinstance(color, str):
+            # Only the check is cached, pencolor() gives back what was set.
+            self.shapes.color(color)
+            return color
+
+        return super()._colorstr(args)
+
+
+    def _closeRun(self):
+        '''Fold the current line into the run and draw it for the last time.'''
+        if self._run is None:
+            return
+
+        if len(self.currentLine) > 1:
+            self._run.extend(self.currentLine[1:])
+            # The run now shows these points, reuse the line item.
+            self.screen._drawline(
+                self.currentLineItem,
+                ((0, 0), (0, 0)),
+                fill='',
+            )
+            self.currentLine = self.currentLine[-1:]
+
+        self._syncRun()
+        self._run = None
+        self._runItem = None
+
+
+    def _goto(self, end):
+        run = self._run
+        mark = (self._runItem, len(run) if run is not None else 0)
+        start = self._position
+        super()._goto(end)
+
+        if self._drawing:
+            self.drawn += 1
+
+            if self.segments is not None:
+                self.segments.add(start, end, self.owner)
+
+        # Remember how long the run was, so undo can shorten it again.
+        if self.undobuffer:
+            buffer = self.undobuffer
+
+            if buffer.cumulate:
+                entry = buffer.buffer[buffer.ptr][-1]
+
+                if entry[0] == 'go' and len(entry) == 5:
+                    buffer.buffer[buffer.ptr][-1] = entry + (mark,)
+
+            else:
+                entry = buffer.buffer[buffer.ptr]
+
+                if entry[0] == 'go' and len(entry) == 5:
+                    buffer.buffer[buffer.ptr] = entry + (mark,)
+
+
+    def _newLine(self, usePos=True):
+        if (self._drawing and len(self.currentLine) > 42
+                and (self._run is None or len(self._run) < self.runPoints)):
+            # Line is full, add it to the run instead of starting a new item.
+            if self._run is None:
+                self._run = PathBuffer(self.currentLine)
+                self._runItem = self.currentLineItem
+                self.currentLineItem = self.screen._createline()
+                self.items.append(self.currentLineItem)
+
+            else:
+                self._run.extend(self.currentLine[1:])
+
+            self._runDirty = True
+            self.currentLine = [self._position]
+            return
+
+        self._closeRun()
+        super()._newLine(usePos)
+
+
+    def _syncRun(self):
+        '''Push the run's points to its canvas item.'''
+        if self._run is None or self._runItem not in self.items:
+            return
+
+        screen = self.screen
+        screen.cv.coords(
+            self._runItem,
+            self._run.canvasCoords(screen.xscale, screen.yscale),
+        )
+        screen._drawline(
+            self._runItem,
+            fill=self._pencolor,
+            width=self._pensize,
+        )
+        self._runDirty = False
+
+
+    def _deleteStamps(self, stamps):
+        '''Delete stamps and their undo entries, however many, in one go.
+
+         The undo buffer is compacted, keeping its order, so undo doesn't
+        stop at empty steps where the entries were.
+        '''
+        dead = set(stamps)
+
+        for stamp in dead:
+
+            for item in stamp if isinstance(stamp, tuple) else (stamp,):
+                self.screen._delete(item)
+
+        self.stampItems = [stamp for stamp in self.stampItems if stamp not in dead]
+
+        if self.undobuffer is not None:
+            buffer = self.undobuffer
+            entries = []
+
+            # Oldest first, a ring buffer ends at ptr.
+            for entry in buffer.buffer[buffer.ptr + 1:] + buffer.buffer[:buffer.ptr + 1]:
+
+                if entry[0] == 'stamp' and entry[1] in dead:
+                    continue
+
+                if entry[0] == 'stamps':
+                    entry = ('stamps', tuple(
+                        stamp for stamp in entry[1] if stamp not in dead
+                    ))
+
+                    if not entry[1]:
+                        continue
+
+                elif entry[0] == 'seq':
+                    entry[1:] = [
+                        item for item in entry[1:]
+                        if not (item[0] == 'stamp' and item[1] in dead)
+                    ]
+
+                entries.append(entry)
+
+            buffer.buffer = [[None]] * (buffer.bufsize - len(entries)) + entries
+            buffer.ptr = buffer.bufsize - 1
+
+
+    def _stampAt(self, parts, x, y, width):
+        '''Draw parts (see ShapeRegistry.parts()) at turtle coordinates x,
+        y, returning the stamp id.
+        '''
+        screen = self.screen
+        create = screen.cv.create_polygon
+        point = (x * screen.xscale, -y * screen.yscale)
+        items = []
+
+        for offsets, fill, outline in parts:
+            items.append(create(
+                [a + b for a, b in zip(offsets, point * (len(offsets) // 2))],
+                fill=self._fillcolor if fill is None else fill,
+                outline=self._pencolor if outline is None else outline,
+                width=width,
+            ))
+
+        # Only compound shapes have colors of their own.
+        return items[0] if parts and parts[0][1] is None else tuple(items)
+
+
+    def _stampWidth(self):
+        shape = self.screen._shapes[self.turtle.shapeIndex]
+
+        if self._resizemode == 'user' or shape._type == 'compound':
+            return self._outlinewidth
+
+        return 1 if self._resizemode == 'noresize' else self._pensize
+
+
+    def _undo(self, action, data):
+        self.undone += 1
+
+        if action == 'stamps':
+            self._deleteStamps(data[0])
+            return
+
+        super()._undo(action, data)
+
+
+    def clearstamps(self, n=None):
+        '''Delete all or the first n (or last -n) stamps, in one go.'''
+        if n is None:
+            stamps = self.stampItems
+
+        elif n >= 0:
+            stamps = self.stampItems[:n]
+
+        else:
+            stamps = self.stampItems[n:]
+
+        self._deleteStamps(stamps)
+        self._update()
+
+
+    def flatten(self, box, region=None, maxPixels=None):
+        '''Draw the finished lines, fills and stamps into the layer.
+
+         The layer is made, or grown, to cover them, as far as region (an x,
+        y, width, height box of the canvas) goes. If that would take more
+        than maxPixels pixels, it stays as it is (or covers box, the part of
+        the canvas in view, if there's no layer yet). Items partly outside
+        the layer lose the part outside, and items wholly outside it are
+        kept. The flattened items are deleted, along with
+        the undo buffer and the turtle's segments, and can't be clicked on or
+        undone any more. Text, the line being drawn and an unfinished fill
+        are left as they are. Returns how many items were flattened.
+        '''
+        self._closeRun()
+        cv = self.screen.cv
+        keep = {self.currentLineItem, self._fillitem if self.filling() else None}
+        stamps = [
+            item for stamp in self.stampItems
+            for item in (stamp if isinstance(stamp, tuple) else (stamp,))
+        ]
+        layer = self.layer
+        drawn = []
+        states = []
+        items = []
+
+        # Item ids go up in stacking order.
+        for item in sorted(self.items + stamps):
+            state = itemState(cv, item)
+
+            if item in keep or (state is not None and state[0] == 'text'):
+                items.append(item)
+
+            else:
+                drawn.append((item, state))
+
+        covered = [state for _, state in drawn if state is not None]
+
+        if covered:
+            if region is None:
+                needed = FlatLayer.bounds(covered)
+
+            else:
+                inside = [
+                    box for box in (
+                        FlatLayer.clip(FlatLayer.bounds([state]), region)
+                        for state in covered
+                    )
+                    if box is not None
+                ]
+                needed = FlatLayer.bounds([], *inside) if inside else None
+
+            if needed is not None and layer is not None:
+                needed = FlatLayer.bounds([], needed, layer.box)
+
+            if (needed is not None and maxPixels is not None
+                    and needed[2] * needed[3] > maxPixels):
+                # Too big to grow to, make do with the layer (or the view).
+                needed = layer.box if layer is not None else FlatLayer.clip(
+                    box, box if region is None else region,
+                )
+
+                if needed is not None and needed[2] * needed[3] > maxPixels:
+                    needed = None
+
+            if needed is not None and (layer is None or needed != layer.box):
+                self.layer = FlatLayer(cv, needed)
+
+                if layer is not None:
+                    self.layer.paste(layer)
+                    layer.delete()
+
+        x, y, width, height = self.layer.box if self.layer is not None else (0, 0, 0, 0)
+
+        for item, state in drawn:
+
+            if state is not None:
+                x0, y0, w, h = FlatLayer.bounds([state])
+
+                if x0 >= x + width or y0 >= y + height or x0 + w <= x or y0 + h <= y:
+                    items.append(item)
+                    continue
+
+                states.append(state)
+
+            cv.delete(item)
+
+        flattened = len(self.items) + len(stamps) - len(items)
+        items.sort()
+        self.items = items
+        self.stampItems = []
+        self.drawn = 0
+
+        if states:
+            self.layer.draw(states)
+            self.layer.show()
+
+        if self.segments is not None:
+            self.segments.clear(self.owner)
+
+        self.setundobuffer(self._undobuffersize)
+
+        return flattened
+
+
+    def shape(self, name=None):
+        '''Set the shape (unless it already is that one), or return it.'''
+        if name is not None and name == self.turtle.shapeIndex:
+            return
+
+        return super().shape(name)
+
+
+    def stamp(self):
+        '''Stamp the shape, from the ShapeRegistry's polygons if set.'''
+        parts = self.parts()
+
+        if parts is None:
+            return super().stamp()
+
+        stamp = self._stampAt(parts, *self._position, self._stampWidth())
+        self.stampItems.append(stamp)
+
+        if self.undobuffer is not None:
+            self.undobuffer.push(('stamp', stamp))
+
+        return stamp
+
+
+    def stamps(self, points, headings=None):
+        '''Stamp the shape at every (x, y) of points, returning the ids.
+
+         headings turn each stamp (as setheading() would), by default they
+        all face the turtle's way. The turtle stays where it is, and the
+        stamps are undone together.
+        '''
+        parts = self.parts()
+
+        if parts is None:
+            raise turtle.TurtleGraphicsError('stamps() needs a ShapeRegistry '
+                                             'and a polygon or compound shape')
+
+        width = self._stampWidth()
+        orient = self._orient
+        turned = {}
+        stamps = []
+
+        try:
+
+            for i, (x, y) in enumerate(points):
+
+                if headings is not None:
+                    heading = headings[i]
+                    parts = turned.get(heading)
+
+                    if parts is None:
+                        angle = radians((heading - self._angleOffset)
+                                        * self._angleOrient * self._degreesPerAU)
+                        self._orient = turtle.Vec2D(cos(angle), sin(angle))
+                        parts = turned[heading] = self.shapes.parts(self)
+
+                stamps.append(self._stampAt(parts, x, y, width))
+
+        finally:
+            self._orient = orient
+
+        self.stampItems.extend(stamps)
+
+        if self.undobuffer is not None:
+            self.undobuffer.push(('stamps', tuple(stamps)))
+
+        return stamps
+
+
+    def parts(self):
+        '''Return the shape's parts from the ShapeRegistry, or None.'''
+        if self.shapes is None:
+            return None
+
+        return self.shapes.parts(self)
+
+
+    def weight(self):
+        '''Return about how many points the turtle's canvas items hold.'''
+        return self.drawn + len(self.items) + 4 * len(self.stampItems)
+
+
+    def _undogoto(self, entry):
+        runItem, length = (None, 0)
+
+        if len(entry) > 4:
+            runItem, length = entry[4]
+
+        super()._undogoto(entry[:4])
+
+        if entry[2][0] and self.segments is not None:
+            self.segments.pop(self.owner)
+
+        if runItem is None or runItem not in self.items:
+            # No run yet when the move was made.
+            self._run = None
+            self._runItem = None
+            return
+
+        if self._runItem != runItem:
+            # The run was closed since, read it back from the canvas.
+            screen = self.screen
+            coords = screen.cv.coords(runItem)
+            self._run = PathBuffer(
+                (coords[i] / screen.xscale, -coords[i+1] / screen.yscale)
+                for i in range(0, len(coords), 2)
+            )
+            self._runItem = runItem
+
+        self._run.truncate(length)
+        self._syncRun()
+
+
+    def _update_data(self):
+        super()._update_data()
+
+        if self._runDirty:
+            self._syncRun()
+
+
+    def clone(self):
+        q = super().clone()
+        q._run = None
+        q._runItem = None
+        q._runDirty = False
+        q.segments = None
+        q.owner = None
+        return q
+
+
+def _lsystemPaths(symbols, rules, depth, angle, step, start, scale, draw, move):
+    '''Expand an L-system chunk and walk it into canvas polylines.
+
+     Run in a worker process by LSystem.submit(). start is the turtle's
+    (x, y, heading x, heading y) at the start of the chunk and scale the
+    screen's (xscale, yscale). Returns a list of flat array('d') polylines.
+    '''
+    table = str.maketrans(rules)
+
+    for _ in range(depth):
+        symbols = symbols.translate(table)
+
+    x, y, hx, hy = start
+    xscale, yscale = scale
+    c, s = cos(radians(angle)), sin(radians(angle))
+    paths = []
+    path = None
+    stack = []
+
+    for symbol in symbols:
+
+        if symbol in draw:
+
+            if path is None:
+                path = array('d', (x * xscale, -y * yscale))
+                paths.append(path)
+
+            x += hx * step
+            y += hy * step
+            path.append(x * xscale)
+            path.append(-y * yscale)
+
+        elif symbol in move:
+            x += hx * step
+            y += hy * step
+            path = None
+
+        elif symbol == '+':
+            hx, hy = hx * c - hy * s, hx * s + hy * c
+
+        elif symbol == '-':
+            hx, hy = hx * c + hy * s, hy * c - hx * s
+
+        elif symbol == '|':
+            hx, hy = -hx, -hy
+
+        elif symbol == '[':
+            stack.append((x, y, hx, hy))
+
+        elif symbol == ']' and stack:
+            x, y, hx, hy = stack.pop()
+            path = None
+
+    return paths
+
+
+class LSystem():
+    '''An L-system, expanded and walked into turtle paths in a process pool.
+
+     rules maps symbols to their replacements and the axiom is expanded depth
+    times. Symbols in draw move the turtle a step forward drawing a line, ones
+    in move without drawing, + and - turn left and right by angle degrees, |
+    turns around and [ and ] save and restore the turtle's position and
+    heading. Other symbols only take part in the expansion.
+
+     The axiom is partly expanded and cut into chunks that are expanded the
+    rest of the way and walked in parallel. Where each chunk starts is worked
+    out up front by composing the net move of every symbol's expansion, so
+    the chunks don't depend on each other.
+    '''
+    def __init__(self, axiom, rules, angle, depth, step=5, draw='FG', move='f'):
+        self.axiom = axiom
+        self.rules = dict(rules)
+        self.angle = angle
+        self.depth = depth
+        self.step = step
+        self.draw = draw
+        self.move = move
+        self.symbols = set(axiom).union(*self.rules.values(), self.rules)
+
+
+    def __len__(self):
+        '''Number of line segments drawn at full depth.'''
+        return sum(self._counts(self.depth)[symbol] for symbol in self.axiom)
+
+
+    def _counts(self, depth):
+        '''Return {symbol: segments drawn by its expansion to depth}.'''
+        counts = {symbol: int(symbol in self.draw) for symbol in self.symbols}
+
+        for _ in range(depth):
+            counts = {
+                symbol: sum(counts[s] for s in self.rules[symbol])
+                if symbol in self.rules else counts[symbol]
+                for symbol in self.symbols
+            }
+
+        return counts
+
+
+    def _sizes(self, depth):
+        '''Return {symbol: length of its expansion to depth}.'''
+        sizes = dict.fromkeys(self.symbols, 1)
+
+        for _ in range(depth):
+            sizes = {
+                symbol: sum(sizes[s] for s in self.rules[symbol])
+                if symbol in self.rules else 1
+                for symbol in self.symbols
+            }
+
+        return sizes
+
+
+    def _moves(self, depth):
+        '''Return {symbol: (offset, turn)} for its expansion to depth.
+
+         Both are complex numbers relative to a turtle at the origin heading
+        along the x axis, so a turtle at p with heading h ends up at
+        p + h * offset heading h * turn.
+        '''
+        turn = complex(cos(radians(self.angle)), sin(radians(self.angle)))
+        moves = dict.fromkeys(self.symbols, (0j, 1 + 0j))
+        moves.update(dict.fromkeys(self.draw + self.move, (complex(self.step), 1 + 0j)))
+        moves.update({'+': (0j, turn), '-': (0j, turn.conjugate()), '|': (0j, -1 + 0j)})
+
+        for _ in range(depth):
+            moves = {
+                symbol: self._compose(self.rules[symbol], moves)
+                if symbol in self.rules else moves[symbol]
+                for symbol in self.symbols
+            }
+
+        return moves
+
+
+    @staticmethod
+    def _compose(symbols, moves, position=0j, heading=1 + 0j):
+        '''Follow the moves of symbols, returning where the turtle ends up.'''
+        stack = []
+
+        for symbol in symbols:
+
+            if symbol == '[':
+                stack.append((position, heading))
+
+            elif symbol == ']':
+
+                if stack:
+                    position, heading = stack.pop()
+
+            else:
+                offset, turn = moves[symbol]
+                position += heading * offset
+                heading *= turn
+
+        return position, heading
+
+
+    def chunks(self, count):
+        '''Cut the partly expanded axiom into about count chunks.
+
+         Returns the depth still to expand and a list of (symbols, position,
+        heading) chunks, each starting where the one before ends (relative to
+        a turtle at the origin heading along the x axis). Chunks are only cut
+        outside of brackets and are roughly the same size fully expanded.
+        '''
+        table = str.maketrans(self.rules)
+        symbols = self.axiom
+        depth = self.depth
+
+        while depth and len(symbols) < count * 16:
+            symbols = symbols.translate(table)
+            depth -= 1
+
+        sizes = self._sizes(depth)
+        moves = self._moves(depth)
+        total = sum(sizes[symbol] for symbol in symbols)
+        chunks = []
+        position, heading = 0j, 1 + 0j
+        cut = done = nesting = 0
+
+        for i, symbol in enumerate(symbols):
+            done += sizes[symbol]
+            nesting += (symbol == '[') - (symbol == ']')
+
+            if nesting <= 0 and done * count >= total * (len(chunks) + 1):
+                chunks.append((symbols[cut:i + 1], position, heading))
+                position, heading = self._compose(symbols[cut:i + 1], moves,
+                                                  position, heading)
+                cut = i + 1
+
+        if cut < len(symbols):
+            chunks.append((symbols[cut:], position, heading))
+
+        return depth, chunks
+
+
+    def submit(self, executor, position=(0, 0), heading=0, scale=(1.0, 1.0),
+               count=None):
+        '''Submit the chunks to executor, returning their futures in order.
+
+         The turtle starts at position with heading in degrees and scale is
+        the screen's (xscale, yscale). Each future's result is a list of flat
+        array('d') canvas polylines. count defaults to 4 chunks per worker.
+        '''
+        if count is None:
+            count = 4 * (getattr(executor, '_max_workers', None) or os.cpu_count() or 1)
+
+        depth, chunks = self.chunks(count)
+        origin = complex(*position)
+        direction = complex(cos(radians(heading)), sin(radians(heading)))
+        futures = []
+
+        for symbols, offset, turn in chunks:
+            at = origin + direction * offset
+            facing = direction * turn
+            futures.append(executor.submit(
+                _lsystemPaths,
+                symbols,
+                self.rules,
+                depth,
+                self.angle,
+                self.step,
+                (at.real, at.imag, facing.real, facing.imag),
+                scale,
+                self.draw,
+                self.move,
+            ))
+
+        return futures
+
+
+    def batches(self, executor=None, position=(0, 0), heading=0,
+                scale=(1.0, 1.0)):
+        '''Generate lists of canvas polylines, in order, as they are computed.
+
+         A process pool is started (and shut down after) if no executor is
+        given.
+        '''
+        pool = executor or ProcessPoolExecutor()
+
+        try:
+
+            for future in self.submit(pool, position, heading, scale):
+                yield future.result()
+
+        finally:
+
+            if executor is None:
+                pool.shutdown(cancel_futures=True)
+
+
+class LSystemJob():
+    '''An LSystem being drawn by a turtle as its chunks arrive.
+
+     Queued by SimpleTurtle.lsystem() and run by step() like a CommandJob.
+    Polylines are drawn straight onto the canvas in the turtle's pen color
+    and size, as items of the turtle so clear() removes them, but they can't
+    be undone and the turtle itself doesn't move.
+    '''
+    __slots__ = ('t', 'futures', 'segments', 'log', 'profile')
+
+    def __init__(self, t, lsystem, executor, log=None, profile=None):
+        screen = t.screen
+        self.t = t
+        self.futures = deque(lsystem.submit(
+            executor,
+            t.position(),
+            degrees(atan2(t._orient[1], t._orient[0])),
+            (screen.xscale, screen.yscale),
+        ))
+        self.segments = len(lsystem)
+        self.log = log or _printLog
+        self.profile = profile
+
+
+    def __len__(self):
+        '''Number of segments left to draw, 1 until the last chunk is in.'''
+        if not self.futures:
+            return 0
+
+        return max(self.segments, 1)
+
+
+    def cancel(self):
+        for future in self.futures:
+            future.cancel()
+
+        self.futures.clear()
+
+
+    def run(self, deadline=None, tick=None):
+        '''Draw the chunks that have arrived, waiting until deadline for more.
+
+         Without a deadline this waits for and draws every chunk. Returns the
+        number of segments drawn.
+        '''
+        futures = self.futures
+        t = self.t
+        screen = t.screen
+        ran = 0
+
+        while futures:
+            future = futures[0]
+
+            if not future.done():
+                timeout = None
+
+                if deadline is not None:
+                    timeout = max(deadline - perf_counter(), 0)
+
+                wait([future], timeout)
+
+                if not future.done():
+                    break
+
+            futures.popleft()
+
+            try:
+                paths = future.result()
+            except Exception as e:
+                self.log(e, 'error')
+                self.cancel()
+                break
+
+            started = perf_counter()
+            drawn = 0
+
+            for path in paths:
+                item = screen._createline()
+                coords = path.tolist()
+                screen.cv.coords(item, coords)
+                screen._drawline(item, fill=t._pencolor, width=t._pensize)
+                t.items.append(item)
+                drawn += len(path) // 2 - 1
+
+                if getattr(t, 'segments', None) is not None:
+                    t.segments.addPath(
+                        zip(
+                            [x / screen.xscale for x in coords[0::2]],
+                            [-y / screen.yscale for y in coords[1::2]],
+                        ),
+                        t.owner,
+                    )
+
+            if self.profile is not None:
+                self.profile(('turtle', 'lsystem'), perf_counter() - started)
+
+            if tick is not None:
+                tick(drawn)
+
+            self.segments -= drawn
+            ran += drawn
+
+            if deadline is not None and perf_counter() >= deadline:
+                break
+
+        return ran
+
+
+class Swarm():
+    '''Thousands of lightweight turtles kept in NumPy arrays.
+
+     Positions, headings (in degrees), pen state and colors are arrays with
+    one entry per agent, and commands apply to every agent at once, or to the
+    ones selected by mask (a boolean array or array of indexes). Distances
+    and angles can be scalars or arrays.
+
+     The swarm is drawn as a single image at the bottom of the canvas, below
+    any other turtles' drawings: agents are dots of size pixels and pen down
+    agents leave one pixel trails. render() redraws the image, which costs a
+    single canvas call however many agents there are.
+
+     Commands share their names with RawTurtle ones so a Swarm can be selected
+    and driven by the cmdline like any other turtle.
+
+     The image is pixels, sized to the canvas when the swarm is made: trails
+    are not rescaled when the view is zoomed or the canvas resized, and
+    swarms are left out of saved drawings (save(), frames) and of the
+    session journal, so undo, redo and replay don't bring them back.
+    '''
+    tracePoints = 1 << 20
+
+    def __init__(self, screen, count, color='black', size=2, spread=0, seed=None):
+        if np is None:
+            raise ImportError('Swarm needs NumPy, pip install numpy')
+
+        random = np.random.default_rng(seed)
+        self.screen = screen
+        self.x = random.uniform(-spread, spread, count)
+        self.y = random.uniform(-spread, spread, count)
+        self.angle = random.uniform(0, 360, count)
+        self.down = np.zeros(count, bool)
+        self.colors = np.zeros(count, np.intp)
+        self.palette = []
+        self.rgb = np.zeros((0, 3), np.uint8)
+        self.size = size
+        self.hidden = False
+        self.dirty = True
+        self._pencolor = self._color(color)
+        self.colors[:] = self._pencolor
+
+        width, height = screen.canvwidth, screen.canvheight
+        self.background = np.array(self._rgb(screen.bgcolor()), np.uint8)
+        self.trails = np.empty((height, width, 3), np.uint8)
+        self.trails[:] = self.background
+        self.frame = self.trails.copy()
+
+        if isinstance(screen.cv, DisplayList):
+            self.image = None
+            item = screen.cv.create_image(0, 0, image='')
+
+        else:
+            self.image = turtle.TK.PhotoImage(
+                master=screen.cv,
+                width=width,
+                height=height,
+            )
+            item = screen._createimage(self.image)
+
+        screen.cv.tag_lower(item)
+        self.items = [item]
+        self.stampItems = []
+
+
+    def __len__(self):
+        return len(self.x)
+
+
+    def _color(self, color):
+        '''Return the palette index of color, adding it if it's new.'''
+        if color not in self.palette:
+            self.palette.append(color)
+            self.rgb = np.vstack([self.rgb, [self._rgb(color)]]).astype(np.uint8)
+
+        return self.palette.index(color)
+
+
+    def _rgb(self, color):
+        return [c >> 8 for c in self.screen.cv.winfo_rgb(color)]
+
+
+    def _pixels(self, x, y, rounded=True):
+        '''Return the (rows, columns) of turtle coordinates in the image.'''
+        screen = self.screen
+        height, width = self.trails.shape[:2]
+        columns = x * screen.xscale + width // 2
+        rows = -y * screen.yscale + height // 2
+
+        if not rounded:
+            return rows, columns
+
+        return np.rint(rows).astype(np.intp), np.rint(columns).astype(np.intp)
+
+
+    def _plot(self, image, rows, columns, rgb):
+        '''Set the pixels that are inside the image.'''
+        height, width = image.shape[:2]
+        inside = (rows >= 0) & (rows < height) & (columns >= 0) & (columns < width)
+        image[rows[inside], columns[inside]] = rgb[inside]
+
+
+    def _trace(self, selected, x, y):
+        '''Draw the trails of selected pen down agents moving to x, y.
+
+         Moves are clipped to the image first, so however far the agents go
+        only the pixels in view are stepped through, and agents are traced a
+        chunk at a time so no more than tracePoints pixels are worked out at
+        once.
+        '''
+        down = self.down[selected]
+
+        if not down.any():
+            return
+
+        rows0, columns0 = self._pixels(
+            self.x[selected][down],
+            self.y[selected][down],
+            False,
+        )
+        rows1, columns1 = self._pixels(x[down], y[down], False)
+        rows, columns = rows1 - rows0, columns1 - columns0
+        rgb = self.rgb[self.colors[selected][down]]
+
+        # Clip each move to the image (Liang-Barsky), as a part of it from
+        # start to end.
+        height, width = self.trails.shape[:2]
+        start = np.zeros(len(rows))
+        end = np.ones(len(rows))
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+
+            for p, q in ((-columns, columns0 + 0.5),
+                         (columns, width - 0.5 - columns0),
+                         (-rows, rows0 + 0.5),
+                         (rows, height - 0.5 - rows0)):
+                ratio = q / p
+                start = np.where(p < 0, np.maximum(start, ratio), start)
+                end = np.where(p > 0, np.minimum(end, ratio), end)
+                end = np.where((p == 0) & (q < 0), -1.0, end)
+
+        visible = start <= end
+
+        if not visible.any():
+            return
+
+        rows0, columns0, rows, columns, rgb, start, end = (
+            a[visible] for a in (rows0, columns0, rows, columns, rgb, start, end)
+        )
+        length = np.maximum(np.abs(rows), np.abs(columns)) * (end - start)
+        steps = np.linspace(0, 1, int(length.max()) + 2)
+        chunk = max(self.tracePoints // len(steps), 1)
+
+        for i in range(0, len(rows), chunk):
+            part = slice(i, i + chunk)
+            along = start[part, None] + (end - start)[part, None] * steps
+            self._plot(
+                self.trails,
+                np.rint(rows0[part, None] + rows[part, None] * along).astype(np.intp).ravel(),
+                np.rint(columns0[part, None] + columns[part, None] * along).astype(np.intp).ravel(),
+                np.repeat(rgb[part], len(steps), 0),
+            )
+
+
+    def _select(self, mask):
+        return slice(None) if mask is None else np.asarray(mask)
+
+
+    def backward(self, distance, mask=None):
+        self.forward(-np.asarray(distance), mask)
+
+    back = bk = backward
+
+
+    def clear(self):
+        '''Erase the trails.'''
+        self.trails[:] = self.background
+        self.dirty = True
+
+
+    def color(self, color, mask=None):
+        '''Set the color of the selected agents.'''
+        self._pencolor = self._color(color)
+        self.colors[self._select(mask)] = self._pencolor
+        self.dirty = True
+
+    pencolor = color
+
+
+    def fillcolor(self, *args):
+        pass
+
+
+    def forward(self, distance, mask=None):
+        '''Move the selected agents distance along their headings.'''
+        selected = self._select(mask)
+        angle = np.radians(self.angle[selected])
+        x = self.x[selected] + distance * np.cos(angle)
+        y = self.y[selected] + distance * np.sin(angle)
+        self._trace(selected, x, y)
+        self.x[selected] = x
+        self.y[selected] = y
+        self.dirty = True
+
+    fd = forward
+
+
+    def goto(self, x, y=None, mask=None):
+        '''Move the selected agents to x, y, drawing if their pens are down.'''
+        if y is None:
+            x, y = x
+
+        selected = self._select(mask)
+        x = np.broadcast_to(x, self.x[selected].shape).astype(float)
+        y = np.broadcast_to(y, self.y[selected].shape).astype(float)
+        self._trace(selected, x, y)
+        self.x[selected] = x
+        self.y[selected] = y
+        self.dirty = True
+
+    setpos = setposition = goto
+
+
+    def heading(self):
+        '''Return the average heading of the agents.'''
+        angle = np.radians(self.angle)
+        return float(np.degrees(np.arctan2(np.sin(angle).mean(),
+                                           np.cos(angle).mean())) % 360)
+
+
+    def hideturtle(self):
+        self.hidden = True
+        self.dirty = True
+
+    ht = hideturtle
+
+
+    def home(self, mask=None):
+        self.goto(0, 0, mask)
+        self.setheading(0, mask)
+
+
+    def isdown(self):
+        return bool(self.down.any())
+
+
+    def left(self, angle, mask=None):
+        '''Turn the selected agents left by angle degrees.'''
+        selected = self._select(mask)
+        self.angle[selected] = (self.angle[selected] + angle) % 360
+
+    lt = left
+
+
+    def pendown(self, mask=None):
+        self.down[self._select(mask)] = True
+
+    pd = down = pendown
+
+
+    def pensize(self, size=None):
+        '''Set or return the size of the agents' dots.'''
+        if size is None:
+            return self.size
+
+        self.size = max(int(size), 1)
+        self.dirty = True
+
+    width = pensize
+
+
+    def penup(self, mask=None):
+        self.down[self._select(mask)] = False
+
+    pu = up = penup
+
+
+    def pos(self):
+        '''Return the average position of the agents.'''
+        return turtle.Vec2D(float(self.x.mean()), float(self.y.mean()))
+
+    position = pos
+
+
+    def render(self):
+        '''Draw the trails and the agents to the image, if anything changed.'''
+        if not self.dirty:
+            return
+
+        frame = self.frame
+        frame[:] = self.trails
+
+        if not self.hidden:
+            rows, columns = self._pixels(self.x, self.y)
+            rgb = self.rgb[self.colors]
+
+            for dy in range(self.size):
+
+                for dx in range(self.size):
+                    self._plot(frame, rows + dy - self.size // 2,
+                               columns + dx - self.size // 2, rgb)
+
+        if self.image is not None:
+            height, width = frame.shape[:2]
+            self.image.configure(
+                data=b'P6 %d %d 255\n' % (width, height) + frame.tobytes(),
+                format='PPM',
+            )
+
+        self.dirty = False
+
+
+    def right(self, angle, mask=None):
+        '''Turn the selected agents right by angle degrees.'''
+        self.left(-np.asarray(angle), mask)
+
+    rt = right
+
+
+    def setheading(self, angle, mask=None):
+        selected = self._select(mask)
+        self.angle[selected] = np.asarray(angle) % 360
+
+    seth = setheading
+
+
+    def shape(self, name=None):
+        return 'dot'
+
+
+    def showturtle(self):
+        self.hidden = False
+        self.dirty = True
+
+    st = showturtle
+
+
+    def speed(self, speed=None):
+        return 0
+
+
+    def wrap(self):
+        '''Move agents that left the canvas back in from the other side.'''
+        screen = self.screen
+        height, width = self.trails.shape[:2]
+        halfWidth = width / 2 / screen.xscale
+        halfHeight = height / 2 / screen.yscale
+        self.x = (self.x + halfWidth) % (2 * halfWidth) - halfWidth
+        self.y = (self.y + halfHeight) % (2 * halfHeight) - halfHeight
+        self.dirty = True
+
+
+    def xcor(self):
+        return self.pos()[0]
+
+
+    def ycor(self):
+        return self.pos()[1]
+
+
+class Console():
+    '''A leveled log kept in a fixed size ring buffer.
+
+     Messages below the console's level are dropped. The rest are kept in the
+    ring buffer, optionally appended to a log file, echoed to a stream (the
+    terminal by default) and queued to be shown in a Multiline by show(),
+    which is meant to be called once per frame. The Multiline is trimmed back
+    to the ring buffer once it has grown past size lines by a quarter.
+    '''
+    LEVELS = {'trace': 0, 'info': 1, 'error': 2}
+
+    def __init__(self, size=1000, level='info', path=None, echo=sys.__stdout__):
+        self.size = size
+        self.level = self.LEVELS[level]
+        self.lines = deque(maxlen=size)
+        self.pending = deque(maxlen=size)
+        self.shown = 0
+        self.echo = echo
+        self.file = None
+
+        if path:
+            self.file = open(path, 'a', buffering=1)
+
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+
+    def error(self, msg):
+        self.log(msg, 'error')
+
+
+    def info(self, msg):
+        self.log(msg, 'info')
+
+
+    def log(self, msg, level='info'):
+        '''Log a message at a level.'''
+        if self.LEVELS[level] < self.level:
+            return
+
+        for line in str(msg).split('\n'):
+            self.lines.append(line)
+            self.pending.append(line)
+
+        if self.file:
+            self.file.write(f'{level.upper()}: {msg}\n')
+
+        if self.echo:
+            self.echo.write(f'{msg}\n')
+
+
+    def show(self, element):
+        '''Write the pending lines to a Multiline element in one go.'''
+        if not self.pending:
+            return
+
+        if (self.shown + len(self.pending) > self.size * 1.25
+                or len(self.pending) == self.size):
+            # Start over from what is left in the ring buffer.
+            element.update('\n'.join(self.lines) + '\n')
+            self.shown = len(self.lines)
+
+        else:
+            element.update('\n'.join(self.pending) + '\n', append=True)
+            self.shown += len(self.pending)
+
+        self.pending.clear()
+
+
+    def trace(self, msg):
+        self.log(msg, 'trace')
+
+
+class ConsoleStream():
+    '''A file like object logging each line written to it to a Console.'''
+    def __init__(self, console, level='info'):
+        self.console = console
+        self.level = level
+        self.buffer = ''
+
+
+    def flush(self):
+        pass
+
+
+    def write(self, text):
+        self.buffer += text
+
+        if '\n' in self.buffer:
+            *lines, self.buffer = self.buffer.split('\n')
+
+            for line in lines:
+                self.console.log(line, self.level)
+
+        return len(text)
+
+
+class Journal():
+    '''A compact, session wide record of actions for undo, redo and replay.
+
+     Every entry is an opcode (see OPCODES) and its arguments. Opcodes are
+    kept one byte per entry, and arguments flattened into an array of values
+    and a parallel bytearray of their kinds: numbers are stored as is,
+    strings as indexes into a shared table and tuples as their length
+    followed by their items. position is the number of entries in effect,
+    recording after an undo drops the entries that were undone.
+
+     Checkpoints of the session state are kept every checkpointEvery entries
+    (at most maxCheckpoints of them, the first is never dropped), so an undo
+    only replays from the nearest one. last is the index of the latest.
+
+     With a size, once there are more entries than that the oldest are
+    dropped, down to about half, and the journal starts over from the
+    checkpoint they led up to. trimmed counts the entries dropped. There's
+    always one to start over from, as checkpointEvery is kept to half the
+    size at most.
+    '''
+    OPCODES = ('call', 'cmdline', 'newTurtle', 'select', 'resize', 'shape')
+    NUMBER, STRING, TUPLE = range(3)
+
+    def __init__(self, checkpointEvery=50, maxCheckpoints=64, size=None):
+        self.ops = array('B')
+        self.offsets = array('I', [0])
+        self.values = array('d')
+        self.kinds = bytearray()
+        self.strings = []
+        self.stringIds = {}
+        self.position = 0
+        self.checkpoints = {}
+        self.last = -1
+        self.checkpointEvery = (
+            checkpointEvery if size is None else max(min(checkpointEvery, size // 2), 1)
+        )
+        self.maxCheckpoints = maxCheckpoints
+        self.size = size
+        self.trimmed = 0
+        self.paused = False
+
+
+    def __len__(self):
+        return len(self.ops)
+
+
+    def _encode(self, value):
+        if isinstance(value, str):
+
+            if value not in self.stringIds:
+                self.stringIds[value] = len(self.strings)
+                self.strings.append(value)
+
+            self.kinds.append(self.STRING)
+            self.values.append(self.stringIds[value])
+
+        elif isinstance(value, (list, tuple)):
+            self.kinds.append(self.TUPLE)
+            self.values.append(len(value))
+
+            for item in value:
+                self._encode(item)
+
+        else:
+            self.kinds.append(self.NUMBER)
+            self.values.append(value)
+
+
+    def _decode(self, i):
+        '''Return the value starting at i and the index after it.'''
+        kind, value = self.kinds[i], self.values[i]
+
+        if kind == self.STRING:
+            return self.strings[int(value)], i + 1
+
+        if kind == self.TUPLE:
+            items = []
+            i += 1
+
+            for _ in range(int(value)):
+                item, i = self._decode(i)
+                items.append(item)
+
+            return tuple(items), i
+
+        return int(value) if value.is_integer() else value, i + 1
+
+
+    def amend(self, index, value):
+        '''Replace the number an entry ends with.'''
+        self.values[self.offsets[index + 1] - 1] = value
+
+
+    def addCheckpoint(self, state):
+        '''Keep state as the checkpoint for the current position.'''
+        self.checkpoints[self.position] = state
+
+        if len(self.checkpoints) > self.maxCheckpoints:
+            del self.checkpoints[sorted(self.checkpoints)[1]]
+
+        self.last = max(self.checkpoints)
+
+
+    def checkpointDue(self):
+        '''Return whether the last checkpoint is checkpointEvery entries old.'''
+        last = self.last
+
+        # Only after an undo can the latest be past the position.
+        if last > self.position:
+            last = max((i for i in self.checkpoints if i <= self.position), default=-1)
+
+        return last < 0 or self.position - last >= self.checkpointEvery
+
+
+    def entry(self, index):
+        '''Return the (opcode, args) of an entry.'''
+        i, end = self.offsets[index], self.offsets[index + 1]
+        args = []
+
+        while i < end:
+            value, i = self._decode(i)
+            args.append(value)
+
+        return self.OPCODES[self.ops[index]], tuple(args)
+
+
+    def nearest(self, position):
+        '''Return (index, state) of the last checkpoint at or before position.'''
+        index = max(i for i in self.checkpoints if i <= position)
+        return index, self.checkpoints[index]
+
+
+    def record(self, opcode, *args):
+        '''Add an entry at the current position, unless paused.'''
+        if self.paused:
+            return False
+
+        self.truncate(self.position)
+        self.ops.append(self.OPCODES.index(opcode))
+
+        for arg in args:
+            self._encode(arg)
+
+        self.offsets.append(len(self.kinds))
+        self.position += 1
+
+        if self.size is not None and len(self.ops) > self.size:
+            self.trim(len(self.ops) - self.size // 2)
+
+        return True
+
+
+    def nbytes(self):
+        '''Return about how many bytes the entries take, without checkpoints.'''
+        return (
+            len(self.ops) + len(self.kinds)
+            + self.offsets.itemsize * len(self.offsets)
+            + self.values.itemsize * len(self.values)
+            + sum(sys.getsizeof(s) for s in self.strings)
+        )
+
+
+    def trim(self, count):
+        '''Drop about the oldest count entries, starting over from the first
+        checkpoint after them (that isn't past the position).
+        '''
+        later = [i for i in self.checkpoints if count <= i <= self.position]
+
+        if not later:
+            return
+
+        first = min(later)
+        start = self.offsets[first]
+        del self.ops[:first]
+        self.offsets = array('I', [offset - start for offset in self.offsets[first:]])
+        del self.values[:start]
+        del self.kinds[:start]
+        self.position -= first
+        self.trimmed += first
+        self.checkpoints = {
+            i - first: state for i, state in self.checkpoints.items() if i >= first
+        }
+        self.last -= first
+
+        # Keep only the strings still used.
+        strings = []
+        self.stringIds = {}
+
+        for i, kind in enumerate(self.kinds):
+
+            if kind == self.STRING:
+                string = self.strings[int(self.values[i])]
+
+                if string not in self.stringIds:
+                    self.stringIds[string] = len(strings)
+                    strings.append(string)
+
+                self.values[i] = self.stringIds[string]
+
+        self.strings = strings
+
+
+    def truncate(self, length):
+        '''Drop the entries (and checkpoints) after the first length.'''
+        if length >= len(self.ops):
+            return
+
+        end = self.offsets[length]
+        del self.ops[length:]
+        del self.offsets[length + 1:]
+        del self.values[end:]
+        del self.kinds[end:]
+
+        for index in [i for i in self.checkpoints if i > length]:
+            del self.checkpoints[index]
+
+        self.last = max(self.checkpoints, default=-1)
+
+
+    def toJSON(self):
+        '''Return the entries as a JSON serializable dict.
+
+         Checkpoints are left out, except the first once the journal has been
+        trimmed (as base), since the entries start from there.
+        '''
+        return {
+            'opcodes': self.OPCODES,
+            'ops': self.ops.tolist(),
+            'offsets': self.offsets.tolist(),
+            'values': self.values.tolist(),
+            'kinds': list(self.kinds),
+            'strings': self.strings,
+            'base': self.checkpoints.get(0) if self.trimmed else None,
+        }
+
+
+    @classmethod
+    def fromJSON(cls, data, **kwargs):
+        '''Create a Journal from a dict made by toJSON, positioned at 0.'''
+        journal = cls(**kwargs)
+        opcodes = [cls.OPCODES.index(opcode) for opcode in data['opcodes']]
+        journal.ops = array('B', [opcodes[op] for op in data['ops']])
+        journal.offsets = array('I', data['offsets'])
+        journal.values = array('d', data['values'])
+        journal.kinds = bytearray(data['kinds'])
+        journal.strings = data['strings']
+        journal.stringIds = {s: i for i, s in enumerate(journal.strings)}
+
+        if data.get('base'):
+            journal.checkpoints[0] = data['base']
+            journal.last = 0
+
+        return journal
+
+
+    def dump(self, fp):
+        # Checkpoints keep item coordinates in arrays.
+        json.dump(self.toJSON(), fp, separators=(',', ':'), default=list)
+
+
+    @classmethod
+    def load(cls, fp, **kwargs):
+        return cls.fromJSON(json.load(fp), **kwargs)
+
+
+class CommandHistory():
+    '''A deduplicated, size limited and optionally persistent command history.
+
+     Commands are kept oldest to newest, running a command again moves it to
+    the newest position. A sorted copy of the commands serves as a prefix
+    index for autocomplete. With a path, the history is loaded from that file
+    and each command appended to it; the file is rewritten without duplicates
+    once it has grown to twice the history size.
+
+     Commands containing the text searched for (rather than starting with
+    it) are looked for among the newest scanLimit only. The ones found are
+    kept until the history changes, so typing more of the same search only
+    filters them.
+    '''
+    scanLimit = 2000
+
+    def __init__(self, size=10000, path=None):
+        self.size = size
+        self.path = path
+        self.entries = {}
+        self.index = []
+        self._fileLines = 0
+        self._found = (None, [])
+
+        if path:
+            self.load()
+
+
+    def __contains__(self, cmd):
+        return cmd in self.entries
+
+
+    def __iter__(self):
+        return iter(self.entries)
+
+
+    def __len__(self):
+        return len(self.entries)
+
+
+    def _add(self, cmd):
+        '''Add a command to the history without saving it.'''
+        self._found = (None, [])
+
+        if cmd in self.entries:
+            del self.entries[cmd]
+
+        else:
+            insort(self.index, cmd)
+
+        self.entries[cmd] = None
+
+        while len(self.entries) > self.size:
+            oldest = next(iter(self.entries))
+            del self.entries[oldest]
+            del self.index[bisect_left(self.index, oldest)]
+
+
+    def append(self, cmd):
+        '''Add a command as the newest history entry.'''
+        cmd = cmd.strip()
+
+        if not cmd:
+            return
+
+        self._add(cmd)
+
+        if self.path:
+
+            if self._fileLines >= 2 * self.size:
+                self.save()
+
+            else:
+                with open(self.path, 'a') as f:
+                    f.write(f'{cmd}\n')
+
+                self._fileLines += 1
+
+
+    def load(self):
+        '''Load the history file, if there is one.'''
+        try:
+            with open(self.path) as f:
+                lines = deque(f, maxlen=2 * self.size)
+        except FileNotFoundError:
+            return
+
+        for line in lines:
+            line = line.strip()
+
+            if line:
+                self._add(line)
+
+        self._fileLines = len(lines)
+
+
+    def recent(self, limit=25):
+        '''Return up to limit commands, newest first.'''
+        return list(islice(reversed(self.entries), limit))
+
+
+    def save(self):
+        '''Rewrite the history file without duplicates.'''
+        with open(self.path, 'w') as f:
+            f.writelines(f'{cmd}\n' for cmd in self.entries)
+
+        self._fileLines = len(self.entries)
+
+
+    def search(self, text, limit=25):
+        '''Return up to limit commands matching text.
+
+         Commands starting with text come first (in sorted order, from the
+        prefix index), then the newest commands containing it.
+        '''
+        if not text:
+            return self.recent(limit)
+
+        matches = []
+        i = bisect_left(self.index, text)
+
+        while (i < len(self.index) and len(matches) < limit
+                and self.index[i].startswith(text)):
+            matches.append(self.index[i])
+            i += 1
+
+        if len(matches) < limit:
+            searched, found = self._found
+
+            if searched is None or searched not in text:
+                found = islice(reversed(self.entries), self.scanLimit)
+
+            found = [cmd for cmd in found if text in cmd]
+            self._found = (text, found)
+            matches += [cmd for cmd in found if not cmd.startswith(text)][:limit - len(matches)]
+
+        return matches
+
+
+class Histogram():
+    '''Count, total and distribution of durations.
+
+     Durations are counted in logarithmic buckets, four per power of two from
+    about a nanosecond to about twenty minutes, so adding one is cheap and
+    percentiles are accurate to within about 10%.
+    '''
+    __slots__ = ('count', 'total', 'buckets')
+
+    SIZE = 160
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.buckets = [0] * self.SIZE
+
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        bucket = int((log2(seconds) + 30) * 4) if seconds > 0 else 0
+        self.buckets[min(max(bucket, 0), self.SIZE - 1)] += 1
+
+
+    def percentile(self, percent):
+        '''Return the approximate duration below which percent fall.'''
+        target = self.count * percent / 100
+        seen = 0
+
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+
+            if count and seen >= target:
+                # Geometric middle of the bucket.
+                return 2 ** ((bucket + 0.5) / 4 - 30)
+
+        return 0.0
+
+
+class Profiler():
+    '''Timing histograms for events and turtle commands.
+
+     Keys are (category, name) tuples, such as ('event', 'Run') or
+    ('turtle', 'forward'). Nothing is recorded unless the profiler is enabled.
+    '''
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.stats = {}
+
+
+    def dump(self, fp):
+        '''Write the report as JSON to a file object.'''
+        json.dump(self.report(), fp, indent=2)
+
+
+    def record(self, key, seconds):
+        '''Add a duration to the histogram for key.'''
+        histogram = self.stats.get(key)
+
+        if histogram is None:
+            histogram = self.stats[key] = Histogram()
+
+        histogram.add(seconds)
+
+
+    def report(self):
+        '''Return {'category:name': {count, total_ms, ...}}, biggest first.'''
+        report = {}
+
+        for key, h in sorted(
+                self.stats.items(),
+                key=lambda item: -item[1].total):
+            report[':'.join(map(str, key))] = {
+                'count': h.count,
+                'total_ms': round(h.total * 1000, 3),
+                'mean_ms': round(h.total * 1000 / h.count, 4),
+                'p50_ms': round(h.percentile(50) * 1000, 4),
+                'p95_ms': round(h.percentile(95) * 1000, 4),
+                'p99_ms': round(h.percentile(99) * 1000, 4),
+            }
+
+        return report
+
+
+    def reset(self):
+        self.stats.clear()
+
+
+    def text(self, limit=20):
+        '''Format the top of the report as a table.'''
+        lines = [
+            f'{"":<28}{"count":>9}{"total ms":>12}'
+            f'{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}'
+        ]
+
+        for key, stats in islice(self.report().items(), limit):
+            lines.append(
+                f'{key[:27]:<28}{stats["count"]:>9}{stats["total_ms"]:>12.1f}'
+                f'{stats["p50_ms"]:>10.3f}{stats["p95_ms"]:>10.3f}'
+                f'{stats["p99_ms"]:>10.3f}'
+            )
+
+        return '\n'.join(lines)
+
+
+class StatusModel():
+    '''The fields shown in the status bar, and when they need to be shown.
+
+     Fields are only marked dirty when their value really changes, and a
+    dirty status is due to be pushed to the widget at most rate times per
+    second. Operations run are counted to report ops/sec.
+    '''
+    def __init__(self, rate=10):
+        self.interval = 1 / rate if rate else 0
+        self.fields = {}
+        self.dirty = True
+        self.pushed = 0.0
+        self.ops = 0
+        self.opsPerSec = 0
+        self._rateOps = 0
+        self._rateTime = perf_counter()
+
+
+    def count(self, ops=1):
+        '''Count operations run.'''
+        self.ops += ops
+
+
+    def due(self):
+        '''Check if the status should be pushed, updating ops/sec first.'''
+        now = perf_counter()
+
+        if now - self._rateTime >= 1:
+            self.set(
+                opsPerSec=round(
+                    (self.ops - self._rateOps) / (now - self._rateTime)
+                ),
+            )
+            self._rateOps = self.ops
+            self._rateTime = now
+
+        return self.dirty and now - self.pushed >= self.interval
+
+
+    def set(self, **fields):
+        '''Update fields, marking the status dirty if any of them changed.'''
+        for field, value in fields.items():
+
+            if self.fields.get(field) != value:
+                self.fields[field] = value
+                self.dirty = True
+
+
+    def text(self):
+        '''Format the status bar text and mark the status clean.'''
+        self.dirty = False
+        self.pushed = perf_counter()
+        f = self.fields
+        return (
+            f'[{f.get("turtle")}] [Pen {f.get("pen")}] '
+            f'@{f.get("pos")}:{f.get("heading")} '
+            f'| {f.get("opsPerSec", 0)} ops/s | Queue: {f.get("queue", 0)}'
+            f'{" | " + f["selected"] if f.get("selected") else ""}'
+            f'{" | Zoom %d%%" % f["zoom"] if f.get("zoom", 100) != 100 else ""}'
+        )
+
+
+class ControlServer():
+    '''Take newline separated cmdlines over a Unix socket or localhost TCP.
+
+     The server runs an asyncio loop on its own thread, so nothing it does
+    touches Tk. Lines can be pipelined: whatever has arrived on a connection
+    is passed on as one batch (of up to batchSize lines) through inbox, a
+    thread safe queue the GUI thread drains with get(). Each batch comes with
+    a reply function, and the result given to it is sent back to the client
+    as a line of JSON, one per batch and in order. At most pending batches
+    per connection wait for a reply before the server stops reading from it.
+    notify (if given) is called from the server thread when the inbox goes
+    from empty to not, to wake up the GUI thread.
+    '''
+    def __init__(self, path=None, host='127.0.0.1', port=0, batchSize=1000,
+                 pending=64, notify=None):
+        self.path = path
+        self.host = host
+        self.port = port
+        self.batchSize = batchSize
+        self.pending = pending
+        self.notify = notify
+        self.inbox = queue.SimpleQueue()
+        self.address = None
+        self.loop = None
+        self._stopped = None
+        self._ready = threading.Event()
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+
+    def _run(self):
+        try:
+            asyncio.run(self._serve())
+        except Exception as e:
+            self._error = e
+            self._ready.set()
+
+
+    async def _serve(self):
+        self.loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+
+        if self.path:
+            server = await asyncio.start_unix_server(self._client, self.path)
+
+        else:
+            server = await asyncio.start_server(self._client, self.host, self.port)
+
+        self.address = server.sockets[0].getsockname()
+        self._ready.set()
+
+        async with server:
+            await self._stopped.wait()
+
+
+    async def _client(self, reader, writer):
+        '''Read batches of lines from a connection, sending back replies.'''
+        replies = asyncio.Queue(self.pending)
+        sender = asyncio.create_task(self._send(replies, writer))
+        partial = b''
+
+        try:
+
+            while True:
+                data = await reader.read(65536)
+
+                if not data:
+                    break
+
+                *lines, partial = (partial + data).split(b'\n')
+
+                for start in range(0, len(lines), self.batchSize):
+                    batch = [
+                        line.decode(errors='replace')
+                        for line in lines[start:start + self.batchSize]
+                    ]
+                    reply = self.loop.create_future()
+                    await replies.put(reply)
+                    self._put(batch, reply)
+
+            # The last line doesn't need a newline.
+            if partial.strip():
+                reply = self.loop.create_future()
+                await replies.put(reply)
+                self._put([partial.decode(errors='replace')], reply)
+
+        except ConnectionError:
+            pass
+
+        finally:
+            await replies.put(None)
+            await sender
+            writer.close()
+
+
+    def _put(self, batch, reply):
+        def respond(result):
+            self.loop.call_soon_threadsafe(self._resolve, reply, result)
+
+        empty = self.inbox.empty()
+        self.inbox.put((batch, respond))
+
+        if empty and self.notify is not None:
+            self.notify()
+
+
+    @staticmethod
+    def _resolve(reply, result):
+        if not reply.done():
+            reply.set_result(result)
+
+
+    async def _send(self, replies, writer):
+        '''Write the replies to a connection in the order batches came in.'''
+        while True:
+            reply = await replies.get()
+
+            if reply is None:
+                return
+
+            result = await reply
+
+            try:
+                writer.write(json.dumps(result).encode() + b'\n')
+                await writer.drain()
+            except ConnectionError:
+                pass
+
+
+    def close(self):
+        '''Stop the server and remove its socket file.'''
+        if self.loop is not None and self._thread.is_alive():
+            self.loop.call_soon_threadsafe(self._stopped.set)
+            self._thread.join(1)
+
+        if self.path and os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+    def get(self, timeout=0):
+        '''Return the next (batch, reply) from the inbox, or None.
+
+         Waits up to timeout seconds for one to arrive.
+        '''
+        try:
+            return self.inbox.get(timeout=timeout) if timeout else self.inbox.get_nowait()
+        except queue.Empty:
+            return None
+
+
+    def start(self):
+        '''Start serving, returning once the socket is listening.'''
+        self._thread.start()
+        self._ready.wait()
+
+        if self._error is not None:
+            raise self._error
+
+        return self.address
+
+
+# What SimpleTurtle.save() can write, by extension. json only headless.
+SAVE_FORMATS = ('svg', 'png', 'ps', 'eps', 'json')
 
 
 class SimpleTurtle():
     '''The SimpleTurtle class implements an easy to use graphical interface to
     the turtle module.
 
-     This class aims to be highly flexible, allowing you to easily tweak the
-    settings used to create a turtle GUI to suit your testing needs.
-    '''
-    def __init__(self, **kwargs):
-        '''Initialize a SimpleTurtle instance.
+     This class aims to be highly flexible, allowing you to easily tweak the
+    settings used to create a turtle GUI to suit your testing needs.
+    '''
+    def __init__(self, **kwargs):
+        '''Initialize a SimpleTurtle instance.
+
+         If you pass a layout parameter, that will be the layout for the GUI of
+        the main window, and all the default UI elements will be ignored.
+
+         If you merely want to configure various individual elements of the GUI
+        try passing "elementArgs" which will be passed as additional arguments 
+        to the individual UI elements. For example to configure the canvas in 
+        the default UI layout, just pass a dict containing arguments as 
+        canvasArgs.
+
+         If however you want to remove or re-arrange rows of the default GUI
+        layout while still using others, pass a rows argument as a list of the
+        default layout rows you want to use in the order you want them shown.
+
+         Furthermore if you want to customize the layout of individual rows,
+        the following arguments are customizable portions of the default GUI:
+
+            menubar     the pulldown menu bar at the top of the window.
+            toolbar     the toolbar which is a customizable column.
+            controls    the turtle controls which is a second such column.
+            windowmenu  the right-click context menu shown on right click.
+
+        You may also pass title and icon arguments to customize the titlebar.
+
+         Pass turbo=True to start in turbo mode, where turtle animation is off
+        and the canvas is only refreshed once every frameOps operations or
+        frameInterval milliseconds (defaults 1000 and 16), whichever is first.
+
+         Pass headless=True to run without a window at all. Turtles then draw
+        into a DisplayList (self.canvas) sized by canvasArgs['size'], which
+        can be replayed onto a Tk canvas or serialized. Headless instances
+        start in turbo mode, and the window methods are not available.
+        '''
+        self.headless = kwargs.get('headless', False)
+
+        # Turbo rendering settings.
+        self.turbo = kwargs.get('turbo', self.headless)
+        self.frameOps = kwargs.get('frameOps', 1000)
+        self.frameInterval = kwargs.get('frameInterval', 16)
+        self._frameCount = 0
+        self._frameTime = perf_counter()
+
+        # Commands queued from the GUI, run a slice at a time by eventLoop,
+        # and scripts feeding the queue a line at a time.
+        self.queue = deque()
+        self.scripts = deque()
+
+        # Journal entries of the queued cmdlines, by job, see stop().
+        self.queuedEntries = {}
+
+        # Control server, started by serve().
+        self.server = None
+
+        # Command programs attached to turtles, run alongside the queue.
+        self.scheduler = Scheduler()
+
+        # Process pool for computing L-systems, started on first use.
+        self.pool = None
+        self.workers = kwargs.get('workers')
+        self.queueDepth = 0
+        self._queueText = 'Queue: 0'
+        self.sliceTime = kwargs.get('sliceTime', 20)
+        self.pollInterval = kwargs.get('pollInterval', 100)
+
+        # Log, shown in the console once a frame and optionally saved to file.
+        self.console = Console(
+            kwargs.get('logSize', 1000),
+            kwargs.get('logLevel', 'trace'),
+            kwargs.get('logFile'),
+        )
+
+        # Status bar, pushed at most statusRate times a second.
+        self.status = StatusModel(kwargs.get('statusRate', 10))
+
+        # Opt-in timing of events and turtle commands.
+        self.profiler = Profiler(kwargs.get('profile', False))
+
+        # Time spent in each phase of startup, see startupProfile().
+        self.startupTimes = {}
+        started = perf_counter()
+
+        if not self.headless:
+            importGUI()
+            self.startupTimes['import'] = perf_counter() - started
+            started = perf_counter()
+
+        # Tabs that are only built once they are first selected.
+        self.lazyTabs = {}
+
+        if not 'layout' in kwargs and not self.headless:
+            # Control tabs:
+            ctrlTabs = {
+                'Movement': {
+                    'element_justification': 'center',
+                    'k': '_Movement_',
+                    'layout': [
+                        [
+                            sg.Button('Left'),
+                            sg.Button('Forward'),
+                            sg.Button('Right'),
+                            sg.Button('Back'),
+                        ],
+                        [
+                            sg.Text('Distance:'),
+                            rangeSpin(
+                                1,
+                                1001,
+                                10,
+                                auto_size_text=True,
+                                enable_events = True,
+                                k='_distance_',
+                            ),
+                            sg.Text('Rotation:'),
+                            rangeSpin(
+                                1,
+                                91,
+                                45,
+                                auto_size_text=True,
+                                enable_events = True,
+                                k='_rotation_',
+                            ),
+                            sg.Text('Speed:'),
+                            rangeSpin(
+                                1,
+                                101,
+                                10,
+                                auto_size_text=True,
+                                enable_events = True,
+                                k='_speed_',
+                            ),
+                        ],
+                    ],
+                },                
+                'Pen': {
+                    'element_justification': 'center',
+                    'k': '_Pen_',
+                    'layout': [
+                        [
+                            sg.Button('Pen Up'),
+                            sg.Button('Pen Down'),
+                            sg.Text('Color:'),
+                            sg.Combo(
+                                ['Black', 'Blue', 'Red', 'Green', 'Pink', 
+                                'Yellow', 'Purple', 'Orange', 'Brown', 'Gray',
+                                'Brown', 'White'],
+                                auto_size_text=True,
+                                default_value='Black',
+                                enable_events=True,
+                                k='_pencolor_',
+                            ),
+                            sg.Text('Fill:'),
+                            sg.Combo(
+                                ['Black', 'Blue', 'Red', 'Green', 'Pink', 
+                                'Yellow', 'Purple', 'Orange', 'Brown', 'Gray',
+                                'Brown', 'White'],
+                                auto_size_text=True,
+                                default_value='Gray',
+                                enable_events=True,
+                                k='_fillcolor_',
+                            ),
+                           sg.Text('Size:'),
+                            rangeSpin(
+                                1,
+                                11,
+                                1,
+                                auto_size_text=True,
+                                enable_events = True,
+                                k='_pensize_',
+                            ),
+                        ],
+                    ],
+                },
+                'Turtle': {
+                    'element_justification': 'center',
+                    'k': '_Turtle_',
+                    'layout': [
+                        [
+                            sg.Button('Hide'),
+                            sg.Button('Show'),
+                            sg.Text('Shape:'),
+                            sg.Combo(
+                                ['arrow', 'circle', 'classic', 
+                                'square', 'triangle', 'turtle'],
+                                auto_size_text=True,
+                                default_value='classic',
+                                enable_events=True,
+                                k='_shape_',
+                            ),
+                            sg.Text('Turtle:'),
+                            sg.Combo(
+                                ['default'],
+                                auto_size_text=True,
+                                default_value='default',
+                                enable_events=True,
+                                k='_turtle_',
+                            ),
+                            sg.Checkbox(
+                                'Turbo',
+                                default=self.turbo,
+                                enable_events=True,
+                                k='_turbo_',
+                            ),
+                        ],
+                    ],
+                },
+                'Perf': {
+                    'element_justification': 'center',
+                    'k': '_Perf_',
+                    'layout': [
+                        [
+                            sg.Checkbox(
+                                'Profile',
+                                default=self.profiler.enabled,
+                                enable_events=True,
+                                k='_profile_',
+                            ),
+                            sg.Button('Refresh', k='_perfRefresh_'),
+                            sg.Button('Reset', k='_perfReset_'),
+                            sg.Button('Save', k='_perfSave_'),
+                        ],
+                        [
+                            sg.Multiline(
+                                '',
+                                disabled=True,
+                                font=('Courier', 9),
+                                k='_perf_',
+                                size=(90, 6),
+                            ),
+                        ],
+                    ],
+                },
+            }
+
+            # Deafult arguments.
+            args = {
+                'window': {
+                    'element_justification': 'center',
+                    'finalize': True,
+                    'resizable': True,
+                    'title': 'Python Turtle SimpleGUI',
+                },
+                'banner': {
+                    'auto_size_text': True,
+                    'border_width': 1,
+                    'justification': 'center',
+                    'k': '_banner_',
+                    'size': (90,1),
+                    'text': 'Python Turtle SimpleGUI Demonstration',
+                },
+                'toolbar': {
+                    'element_justification': 'center',
+                    'expand_x': True,
+                    'k': '_toolbar_',
+                    'layout': [
+                        [
+                            sg.Text('Canvas'),
+                            rangeSpin(
+                                640,
+                                1360,
+                                640,
+                                auto_size_text=True,
+                                enable_events = True,
+                                k='_canvasWidth_',
+                            ),
+                            sg.Text('x'),
+                            rangeSpin(
+                                480,
+                                1024,
+                                480,
+                                auto_size_text=True,
+                                enable_events = True,
+                                k='_canvasHeight_',
+                            ),
+                            sg.Button('Clear'),
+                            sg.Button('Home'),
+                            sg.Button('Export', k='_export_'),
+                        ],
+                   ],
+                },
+                'header': {
+                    'auto_size_text': True,
+                    'border_width': 2,
+                    'justification': 'center',
+                    'size': (90,1),
+                    'k': '_header_',
+                    'text': 'Turtle screen',
+                },
+                'canvas': {
+                    'k': '_canvas_',
+                    'size': (640, 480),    
+                },
+                'footer': {
+                    'auto_size_text': True,
+                    'border_width': 2,
+                    'justification': 'center',
+                    'k': '_footer_',
+                    'size': (90,1),
+                    'text': '',
+                },
+                'controls': {
+                    'element_justification': 'center',
+                    'expand_x': True,
+                    'k': '_controls_',
+                    'layout': [
+                        [
+                            sg.TabGroup(
+                                [
+                                    [
+                                    sg.Tab(
+                                        tab,
+                                        layout=self.tabLayout(
+                                            ctrlTabs[tab],
+                                            kwargs.get('lazyTabs', True)
+                                            and tab != 'Movement',
+                                        ),
+                                        element_justification='center',
+                                        k=ctrlTabs[tab]['k'],
+                                    )
+                                    for tab in ctrlTabs
+                                    ]
+                                ],
+                                enable_events=True,
+                                k='_ctrlTabs_',
+                                tab_location='top',
+                            ),
+                        ],
+                    ],
+                },
+                'cmdline': {
+                    'default_value': '',
+                    'enable_events': True,
+                    'k': '_cmdline_',
+                    'size': (80,1),
+                },
+                'console': {
+                    'autoscroll': True,
+                    'disabled': True,
+                    'k': '_console_',
+                    'size': (90, 6),
+                },
+                'status': {
+                    'auto_size_text': True,
+                    'border_width': 2,
+                    'justification': 'center',
+                    'k': '_status_',
+                    'relief': sg.RELIEF_SUNKEN,
+                    'size': (90, 1)
+                },
+            }
+
+            # Check for "elementArgs" and override default arguments.
+            for row in args:
+
+                if f'{row}Args' in kwargs:
+
+                    for arg in kwargs[f'{row}Args']:
+                        args[row][arg] = kwargs[f'{row}Args'][arg]
+    
+            # Default row layouts.
+            banner =    [sg.Text(**args['banner'])]
+
+            if not 'toolbar' in kwargs:
+                toolbar = [sg.Column(**args['toolbar'])]
+
+            header = [sg.Text(**args['header'])]
+            canvas = [sg.Canvas(**args['canvas'])]
+            footer = [sg.Text(**args['footer'])]
+
+            if not 'controls' in kwargs:
+                controls = [sg.Column(**args['controls'])]
+
+            cmdline = [
+                #sg.Input(**args['cmdline']),
+                sg.Combo(
+                    [],
+                    **args['cmdline'],
+                ),
+                sg.Button('Run', bind_return_key=True),
+                sg.Button('Stop'),
+                sg.Button('Undo'),
+                sg.Button('Redo'),
+                sg.Text('Queue: 0', k='_queue_', size=(14, 1)),
+            ]
+
+            console = [sg.Multiline(**args['console'])]
+            status = [sg.Text(**args['status'])]
+
+            if not 'rows' in kwargs:
+                # Default layout.
+                layout = [
+                    banner,
+                    toolbar,
+                    header,
+                    canvas,
+                    footer,
+                    controls,
+                    cmdline,
+                    console,
+                    status,
+                ]
+
+            else: # Load custom layout from rows argument.
+                layout = []
+                # Get local vars (for the default rows).
+                local = locals()
+
+                for row in rows:
+
+                    # Load builtin default rows by name from strings.
+                    if type(row) == str:
+                        layout.append(local[row])
+
+                    # Load custom row from a list into the layout.
+                    elif type(row) == list:
+                        layout.append(row)
+
+        self.startupTimes['layout'] = perf_counter() - started
+        started = perf_counter()
+
+        if self.headless:
+            # Record drawings in memory instead of creating a window.
+            width, height = kwargs.get('canvasArgs', {}).get('size', (640, 480))
+            self.window = None
+            self.canvas = DisplayList(width, height)
+            self.screen = HeadlessScreen(self.canvas)
+
+        else:
+            # Create the main window.
+            self.window = sg.Window(layout=layout, **args['window'])
+            configureSpins(self.window.AllKeysDict.values())
+            # Create pointer to the actual canvas.
+            self.canvas = self.window['_canvas_'].TKCanvas
+            # The TurtleScreen all turtles are drawn on.
+            self.screen = turtle.TurtleScreen(self.canvas)
+
+        # The canvas size reset() goes back to.
+        self._startSize = (self.canvas.cget('width'), self.canvas.cget('height'))
+
+        self.startupTimes['window'] = perf_counter() - started
+        started = perf_counter()
+
+        # Turtles and settings.
+        self.turtles = {}
+
+        # Compiled command strings, most recently used are kept, and the
+        # procedures they define.
+        self.verbose = kwargs.get('verbose', False)
+        self.procedures = {}
+        self._itemStates = {}
+        self._compile = lru_cache(
+            maxsize=kwargs.get('cmdlineCacheSize', 256),
+        )(self._compileCmdline)
+        self.cmdlineHistory = CommandHistory(
+            kwargs.get('historySize', 10000),
+            kwargs.get('historyFile'),
+        )
+        self.historyVisible = kwargs.get('historyVisible', 25)
+        self._completing = ''
+
+        # Segments drawn by the turtles, for selecting them with the mouse.
+        self.segments = None
+
+        if kwargs.get('segmentIndex', True):
+            self.segments = SegmentIndex(kwargs.get('indexCell', 5))
+
+        self.clickRadius = kwargs.get('clickRadius', 5)
+
+        # Shapes registered with registerShape(), turned to shapeBuckets
+        # headings, and colors resolved once, for every turtle.
+        self.shapes = ShapeRegistry(self.screen, kwargs.get('shapeBuckets', 360))
+        self.screen.onscreenclick(self.click, add=True)
+
+        # The part of the drawing in view, moved with pan() and zoom(), or
+        # by turning the mouse wheel and dragging with the right (or middle)
+        # button. Canvas resizes wait for resizeDelay ms of quiet.
+        self.view = (0, 0)
+        self.zoomLevel = 1.0
+        self.zoomLimits = kwargs.get('zoomLimits', (0.01, 100))
+        self.zoomStep = kwargs.get('zoomStep', 1.1)
+        self.resizeDelay = kwargs.get('resizeDelay', 150)
+        self._resizing = None
+        self._zooming = None
+        self._dragFrom = None
+        self.setView()
+
+        # Frames saved while drawing, see startRecording().
+        self.recorder = None
+
+        for sequence, func in (
+                ('<MouseWheel>', self._wheel),
+                ('<Button-4>', self._wheel),
+                ('<Button-5>', self._wheel),
+                ('<ButtonPress-2>', self._dragStart),
+                ('<ButtonPress-3>', self._dragStart),
+                ('<B2-Motion>', self._dragMove),
+                ('<B3-Motion>', self._dragMove),
+            ):
+            self.canvas.bind(sequence, func, add='+')
+
+        # Journal of actions for undo, redo and replay, started once the
+        # default turtle is set up. It's off by default headless, where
+        # nobody is there to undo, and keeps journalSize entries at most.
+        self.journal = Journal(
+            kwargs.get('checkpointEvery', 50),
+            kwargs.get('maxCheckpoints', 64),
+            kwargs.get('journalSize', 10000),
+        )
+        self.journal.paused = True
+
+        # Memory caps for long running sessions, see checkBudget(). The log
+        # and command history are capped by logSize and historySize.
+        self.undoBufferSize = kwargs.get('undoBufferSize', 1000)
+        self.canvasBudget = kwargs.get('canvasBudget')
+        self.layerPixels = kwargs.get('layerPixels', 1 << 22)
+
+        # Create the default turtle.
+        self.newTurtle('default')
+        self.setTurbo(self.turbo)
+        self.startupTimes['first turtle'] = perf_counter() - started
+    
+        # Set default distance, rotation.
+        if self.headless:
+            self.distance = kwargs.get('distance', 10)
+            self.rotation = kwargs.get('rotation', 45)
+
+        else:
+            self.distance = checkInt(str(self.window.Element('_distance_').Get()))
+            self.rotation = checkInt(str(self.window.Element('_rotation_').Get()))
+
+        self.journal.paused = not kwargs.get('journal', not self.headless)
+        self.journal.addCheckpoint(self.checkpoint())
+
+
+    def attach(self, name, cmd, priority=1, rate=None, loop=False):
+        '''Attach a command string to the turtle name, to run concurrently.
+
+         Attached programs are stepped round robin by the Scheduler from the
+        event loop (or runTimer()), priority operations per round and at most
+        rate operations per second. With loop the program runs until stopped.
+        '''
+        program = self.compile(cmd)
+        self.scheduler.attach(
+            name,
+            self.turtles[name],
+            program,
+            priority,
+            rate,
+            loop,
+            verbose=self.verbose,
+            log=self.console.log,
+            profile=self.profiler.record if self.profiler.enabled else None,
+        )
+
+
+    def buildTab(self, key):
+        '''Add the real layout to a lazy tab.'''
+        layout = self.lazyTabs.pop(key, None)
+
+        if layout is not None:
+            self.window.extend_layout(self.window.Element(key), layout)
+            configureSpins(
+                element for row in layout for element in row
+            )
+
+
+    def call(self, command, *args):
+        '''Run a command on the selected turtle, recording it in the journal.'''
+        result = getattr(self.turtle, command)(*args)
+
+        if not isinstance(self.turtle, Swarm):
+            self.record('call', self.turtleName, command, *args)
+
+        return result
+
+
+    def checkBudget(self):
+        '''Flatten drawings once the canvas holds more than canvasBudget points.
+
+         The turtles with the most points are flattened (see PathTurtle.flatten)
+        until the canvas is down to half the budget, so this doesn't happen
+        every frame. Their layers are kept to the canvas (and the part of it
+        in view) and between them to layerPixels pixels. Returns the number of
+        items flattened.
+        '''
+        if self.canvasBudget is None:
+            return 0
+
+        turtles = [t for t in self.turtles.values() if isinstance(t, PathTurtle)]
+        points = sum(t.weight() for t in turtles)
+
+        if points <= self.canvasBudget:
+            return 0
+
+        flattened = 0
+        view = self.viewBox()
+        width, height = self.screen.canvwidth, self.screen.canvheight
+        region = FlatLayer.bounds([], view, (-width / 2, -height / 2, width, height))
+        used = sum(len(t.layer.pixels) // 4 for t in turtles if t.layer is not None)
+
+        for t in sorted(turtles, key=PathTurtle.weight, reverse=True):
+
+            if points <= self.canvasBudget // 2:
+                break
+
+            before = t.weight()
+            pixels = len(t.layer.pixels) // 4 if t.layer is not None else 0
+            flattened += t.flatten(view, region, self.layerPixels - used + pixels)
+            points -= before - t.weight()
+            used += (len(t.layer.pixels) // 4 if t.layer is not None else 0) - pixels
+
+        self.console.trace(f'Flattened {flattened} canvas items.')
+        return flattened
+
+
+    def checkInt(self, arg):
+        '''Check if string is an integer and do conversion'''
+        return checkInt(arg)
+
+
+    def checkpoint(self):
+        '''Return a snapshot of the turtles and what they drew.
+
+         Swarms are left out. Stamps are kept as plain items of the turtle.
+        Items drawn before the last checkpoint share its state without being
+        read again, unless the view was zoomed, the turtle undid something
+        since or was still drawing them, so checkpoints only cost what was
+        drawn in between. Procedures are kept as their source.
+        '''
+        self.screen.update()
+        cv = self.screen.cv
+        scale = (self.screen.xscale, self.screen.yscale)
+        turtles = {}
+        previous = self._itemStates
+        self._itemStates = {}
+
+        for name, t in self.turtles.items():
+
+            if isinstance(t, Swarm):
+                continue
+
+            items = []
+            stamps = [
+                item for stamp in t.stampItems
+                for item in (stamp if isinstance(stamp, tuple) else (stamp,))
+            ]
+
+            drawing = {
+                t.currentLineItem,
+                getattr(t, '_runItem', None),
+                t._fillitem if t.filling() else None,
+            }
+            key = (scale, getattr(t, 'undone', 0))
+            last = previous.get(name)
+            known = last[2] if last is not None and last[0] == key else {}
+            reread = drawing | last[1] if known else drawing
+            states = {}
+
+            for item in sorted(t.items + stamps):
+
+                if item in known and item not in reread:
+                    state = known[item]
+
+                else:
+                    state = itemState(cv, item)
+
+                states[item] = state
+
+                if state is not None:
+                    items.append(state)
+
+            self._itemStates[name] = (key, drawing, states)
+
+            turtles[name] = {
+                'pen': t.pen(),
+                'shape': t.shape(),
+                'position': tuple(t._position),
+                'orient': tuple(t._orient),
+                'items': items,
+                'layer': t.layer.state() if t.layer is not None else None,
+            }
+
+        return {
+            'turtles': turtles,
+            'selected': self.turtleName,
+            'size': (cv.cget('width'), cv.cget('height')),
+            'scale': (self.screen.xscale, self.screen.yscale),
+            'procedures': {
+                name: program.source for name, program in self.procedures.items()
+            },
+        }
+
+
+    def click(self, x, y):
+        '''Select the turtle or drawn segment at x, y, in turtle coordinates.
+
+         Turtles within clickRadius pixels win over segments. The turtle found
+        (or the one that drew the segment) is selected and shown in the status
+        bar. Returns (distance, segment, name), segment being None for a
+        turtle, or None if nothing is there.
+        '''
+        radius = self.clickRadius / self.screen.xscale
+        hit = None
+
+        for name, t in self.turtles.items():
+
+            if isinstance(t, Swarm) or not t.isvisible():
+                continue
+
+            distance = abs(t.pos() - (x, y))
+
+            if distance <= radius and (hit is None or distance < hit[0]):
+                hit = (distance, None, name)
+
+        if hit is None and self.segments is not None:
+            hit = self.segments.nearest(x, y, radius)
+
+        if hit is None or hit[2] not in self.turtles:
+            self.status.set(selected=None)
+            return None
+
+        distance, segment, name = hit
+
+        if name != self.turtleName:
+            self.selectTurtle(name)
+            self.record('select', name)
+            self.updateTurtles()
+
+        if segment is None:
+            self.status.set(selected=f'Selected {name}')
+
+        else:
+            (x0, y0), (x1, y1) = self.segments.segment(segment)
+            self.status.set(
+                selected=f'Selected {name} segment {segment} '
+                         f'({x0:.0f},{y0:.0f})-({x1:.0f},{y1:.0f})',
+            )
+
+        return hit
+
+
+    def close(self):
+        '''Cancel everything running, and close the window, control server,
+        L-system pool and log file.
+        '''
+        self.stop()
+        self.stopRecording()
+
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+        if self.server is not None:
+            self.server.close()
+
+        self.console.close()
+
+        if self.window is not None:
+            self.window.close()
+
+
+    def compile(self, cmd):
+        '''Compile a command string, reusing the cached result if any.'''
+        if not self.profiler.enabled:
+            return self._compile(cmd.strip())
+
+        started = perf_counter()
+        program = self._compile(cmd.strip())
+        self.profiler.record(('parse', 'compile'), perf_counter() - started)
+        return program
+
+
+    def _compileCmdline(self, cmd):
+        '''Compile a command string with the procedures defined so far.
+
+         Defining a procedure can change how other command strings compile,
+        so the cache is cleared whenever one is (re)defined.
+        '''
+        defined = dict(self.procedures)
+        program = compileCmdline(cmd, self.procedures)
+
+        if self.procedures != defined:
+            self._compile.cache_clear()
+
+        return program
+
+
+    def config(self, element, **kwargs):
+        '''Change a GUI Element's configuration.'''
+        self.window.Element(element).config(**kwargs)
+
+
+    def cmdline(self, cmd, verbose=None, history=True):
+        '''Basic command string interpreter.
+
+         This could be replaced with something more robust, but for now it does
+        basic shorthand of turtle commands. The command string is compiled
+        once and cached, pass verbose (or set self.verbose) to trace each call.
+        Returns the number of operations run.'''
+        if verbose is None:
+            verbose = self.verbose
+
+        program = self.compile(cmd)
+
+        if verbose:
+            self.console.trace(f'Running command list:\n{program.ops}')
+
+        ops = runCompiled(
+            self.turtle,
+            program,
+            verbose,
+            self.ticker(),
+            self.console.log,
+            self.profiler.record if self.profiler.enabled else None,
+        )
+        self.status.count(ops)
+
+        if not isinstance(self.turtle, Swarm):
+            self.record('cmdline', self.turtleName, cmd)
+
+        if program.rest and history:
+            self.cmdlineHistory.append(program.rest)
+
+        return ops
+
+
+    def _apply(self, opcode, args):
+        '''Apply a journal entry.'''
+        if opcode == 'call':
+            getattr(self.turtles[args[0]], args[1])(*args[2:])
+
+        elif opcode == 'cmdline':
+            # Queued cmdlines end with how many operations ran, -1 for all.
+            limit = args[2] if len(args) > 2 and args[2] >= 0 else None
+
+            if limit != 0:
+                runCompiled(
+                    self.turtles[args[0]],
+                    self.compile(args[1]),
+                    log=self.console.log,
+                    limit=limit,
+                )
+
+        elif opcode == 'newTurtle':
+            self.newTurtle(args[0], **dict(args[1:]))
+
+        elif opcode == 'select':
+            self.selectTurtle(args[0])
+
+        elif opcode == 'resize':
+            self.resize(args[0], args[1])
+
+        elif opcode == 'shape':
+            self.registerShape(args[0], args[1])
+
+
+    def _dragStart(self, event):
+        self._dragFrom = (event.x, event.y)
+
+
+    def _dragMove(self, event):
+        '''Pan the view along with the mouse while dragging.'''
+        if self._dragFrom is not None:
+            x, y = self._dragFrom
+            self._dragFrom = (event.x, event.y)
+            self.pan(x - event.x, y - event.y)
+
+
+    def _wheel(self, event):
+        '''Zoom around the mouse pointer, one step per click of the wheel.
+
+         Clicks that come in before the canvas is redrawn are added up and
+        done as one zoom.
+        '''
+        if event.num == 5 or getattr(event, 'delta', 0) < 0:
+            factor = 1 / self.zoomStep
+
+        else:
+            factor = self.zoomStep
+
+        x = self.canvas.canvasx(event.x) / self.screen.xscale
+        y = -self.canvas.canvasy(event.y) / self.screen.yscale
+
+        if self._zooming is None:
+            self._zooming = [1.0, x, y]
+            self.canvas.after_idle(self._zoomPending)
+
+        self._zooming[0] *= factor
+        self._zooming[1:] = x, y
+
+
+    def _zoomPending(self):
+        factor, x, y = self._zooming
+        self._zooming = None
+        self.zoom(factor, x, y)
+
+
+    def detach(self, name):
+        '''Stop running the program attached to the turtle name.'''
+        self.scheduler.detach(name)
+
+
+    def dumpProfile(self, path):
+        '''Save the profile() report as JSON.'''
+        with open(path, 'w') as f:
+            self.profiler.dump(f)
+
+
+    def eventLoop(self):
+        '''Call to read window events with the default event handler.
+
+        Use this call if you want a truely simple turtle GUI.
+        '''
+        self.console.info('PGST initialized.')
+
+        self.window.Element('_cmdline_').Widget.bind('<Key-Return>', self.run)
+        self.window.Element('_cmdline_').bind('<KeyRelease>', 'Key_')
+        self.window.Element('_cmdline_').update(
+            values=self.cmdlineHistory.recent(self.historyVisible),
+        )
+
+        # Send stdout and stderr through the console too.
+        stdout, stderr = sys.stdout, sys.stderr
+
+        if '_console_' in self.window.AllKeysDict:
+            sys.stdout = ConsoleStream(self.console, 'info')
+            sys.stderr = ConsoleStream(self.console, 'error')
+
+        try:
+
+            while True:
+                profiling = self.profiler.enabled
+
+                if self.turbo:
+                    self.flush()
+
+                else:
+                    self.renderSwarms()
+                    self.checkBudget()
+
+                if '_console_' in self.window.AllKeysDict:
+                    started = perf_counter()
+                    self.console.show(self.window.Element('_console_'))
+
+                    if profiling:
+                        self.profiler.record(
+                            ('tk', 'console'),
+                            perf_counter() - started,
+                        )
+
+                self.turtleStatus(self.turtle)
+                # Don't block while there are queued commands to run.
+                event, values = self.window.read(timeout=self.idleTimeout())
+                started = perf_counter()
+
+                if event == sg.WIN_CLOSED:
+                    break
+
+                elif event == sg.TIMEOUT_KEY:
+                    pass
+
+                elif event == 'Run':
+                    self.run()
+
+                elif event == 'Stop':
+                    self.stop()
+
+                elif event in [
+                    'Forward', 
+                    'Back', 
+                    'Left', 
+                    'Right',
+                ]:
+                    self.move(event[0])
+
+                elif event in [
+                    'Pen Up', 
+                    'Pen Down', 
+                    'Hide', 
+                    'Show',
+                ]:
+                    if event.startswith('Pen'):
+                        cmd = ''.join(event.split(' ')).casefold()
+
+                    else:
+                        cmd = f'{event.casefold()}turtle'
+
+                    self.call(cmd)
+
+                elif event[0] == '_' and event[-1] == '_':
+                    self.widgetEvent(event, values)
+
+                elif event in ['Clear', 'Home',]:
+                    self.call(event.casefold())
+
+                elif event == 'Undo':
+                    self.undo()
+
+                elif event == 'Redo':
+                    self.redo()
+
+                if profiling and event != sg.TIMEOUT_KEY:
+                    self.profiler.record(('event', event), perf_counter() - started)
+
+                self.pollServer()
+
+                if self.queue or self.scripts or self.scheduler:
+                    self.step(self.sliceTime)
+
+                self.queueStatus()
+
+        finally:
+            sys.stdout, sys.stderr = stdout, stderr
+            self.close()
+
+
+    def enqueue(self, cmd, t=None, history=True):
+        '''Compile a command string and queue it to run on turtle t.
+
+         Queued commands are run a slice at a time by step(), so the window
+        stays responsive while they run. t defaults to the selected turtle.
+        Unless history is False, the part of a command that failed to compile
+        is added to the history to be fixed.
+        '''
+        program = self.compile(cmd)
+        t = t or self.turtle
+
+        if program.rest and history:
+            self.cmdlineHistory.append(program.rest)
+
+        job = CommandJob(
+            t,
+            program,
+            self.verbose,
+            self.console.log,
+            self.profiler.record if self.profiler.enabled else None,
+        )
+
+        # Recorded as running in full (-1) until stop() says how much did.
+        if (self.turtles.get(getattr(t, 'owner', None)) is t
+                and self.record('cmdline', t.owner, cmd, -1)):
+            self.queuedEntries[job] = self.journal.position - 1 + self.journal.trimmed
+
+        self.queue.append(job)
+        self.queueDepth += len(program)
+
+
+    def feed(self, lines, done=None):
+        '''Queue a script to run from the event loop, a line at a time.
+
+         lines can be any iterable of command strings, such as scriptLines()
+        of an open file. Lines are only read as the queue runs dry, and done
+        (if given) is called once the script has finished.
+        '''
+        self.scripts.append((iter(lines), done))
+
+
+    def flush(self):
+        '''Redraw the canvas now, showing everything drawn since the last frame.
+        '''
+        started = perf_counter()
+        self.renderSwarms()
+        self.screen.update()
+        self.checkBudget()
+        self._frameCount = 0
+        self._frameTime = perf_counter()
+
+        if self.profiler.enabled:
+            self.profiler.record(('tk', 'flush'), self._frameTime - started)
+
+
+    def frame(self, ops=1):
+        '''Count ops drawn in turbo mode and flush once the frame budget is hit.
+        '''
+        self._frameCount += ops
+
+        if self.recorder is not None and self.recorder.count(ops):
+            self.recordFrame()
+
+        elif self.turbo and (
+                self._frameCount >= self.frameOps
+                or (perf_counter() - self._frameTime) * 1000 >= self.frameInterval):
+            self.flush()
+
+
+    def idleTimeout(self):
+        '''Return how long the event loop can wait for events, in ms.
+
+         Don't block while there are queued commands or attached programs
+        that can run, and wake up when a throttled one can run again.
+        '''
+        if self.queue or self.scripts:
+            return 0
+
+        if self.server is not None and not self.server.inbox.empty():
+            return 0
+
+        due = self.scheduler.due()
+
+        if due is None:
+            return self.pollInterval
+
+        return min(int(due * 1000), self.pollInterval)
+
+
+    def itemCount(self):
+        '''Report how many canvas items there are, in total and per turtle.'''
+        return {
+            'canvas': len(self.canvas.find_all()),
+            'turtles': {
+                name: len(t.items) + len(t.stampItems)
+                for name, t in self.turtles.items()
+            },
+        }
+
+
+    def move(self, cmd):
+        '''Move the selected turtle.'''
+        cmd = cmd.casefold()
+        started = perf_counter()
+
+        if cmd == 'f':
+            name = 'forward'
+            self.call(name, self.distance)
+
+        elif cmd == 'b':
+            name = 'backward'
+            self.call(name, self.distance)
+
+        elif cmd in ['r', 'l']:
+            name = f'{cmd}t'
+            self.call(name, self.rotation)
+
+        else:
+            return
+
+        if self.profiler.enabled:
+            self.profiler.record(('turtle', name), perf_counter() - started)
+
+        self.status.count()
+
+        if self.ticker():
+            self.frame()
+
+
+    def newTurtle(self, name, **kwargs):
+        '''Create a new turtle.'''
+        defaults = {
+            'anglemode': 'deg',
+            #'fillcolor': 'Gray',
+            #'mode': 'logo',
+            'pendown': False,
+            'pencolor': 'Black',
+            'shape': 'classic',
+            'pensize': 1,
+            'speed': 10,
+        }
+
+        self.turtles[name] = PathTurtle(
+            self.screen,
+            undobuffersize=self.undoBufferSize,
+        )
+        self.turtles[name].segments = self.segments
+        self.turtles[name].owner = name
+        self.turtles[name].shapes = self.shapes
+
+        for setting in defaults:
+
+            if setting in kwargs:
+                defaults[setting] = kwargs[setting]
+            
+            if setting == 'anglemode':
+            
+                if 'degrees'.startswith(defaults['anglemode']):
+                    self.turtles[name].degrees()
+            
+                elif 'radians'.startswith(defaults['anglemode']):
+                    self.turtles[name].radians()
+            
+            elif setting == 'pendown':
+
+                if defaults['pendown']:
+                    self.turtles[name].pendown()
+
+                else:
+                    self.turtles[name].penup()
+
+            else:
+                setTurtle = getattr(self.turtles[name], setting)
+                setTurtle(defaults[setting])
+
+        self.selectTurtle(name)
+        self.record('newTurtle', name, *sorted(kwargs.items()))
+        self.updateTurtles()
+
+
+    def newSwarm(self, name, count, **kwargs):
+        '''Create a Swarm of count agents, selectable like a turtle.
+
+         kwargs are passed on to Swarm (color, size, spread and seed). Swarms
+        need NumPy.
+        '''
+        self.turtles[name] = Swarm(self.screen, count, **kwargs)
+        self.selectTurtle(name)
+        self.updateTurtles()
+        return self.turtles[name]
+
+
+    def pan(self, dx, dy):
+        '''Move the view by dx, dy pixels (right and down).'''
+        x, y = self.view
+        self.setView(x + dx, y + dy)
+
+
+    def memory(self):
+        '''Report what the session keeps in memory, by turtle and subsystem.
+
+         Sizes are estimated in KB from the buffers involved, points are
+        PathTurtle.weight().
+        '''
+        turtles = {}
+
+        for name, t in self.turtles.items():
+
+            if isinstance(t, Swarm):
+                turtles[name] = {
+                    'agents': len(t),
+                    'kb': (t.trails.nbytes + t.frame.nbytes) / 1024,
+                }
+                continue
+
+            turtles[name] = {
+                'items': len(t.items) + len(t.stampItems),
+                'points': t.weight(),
+                'undo': t.undobuffer.nr_of_items() if t.undobuffer else 0,
+                'segments': len(self.segments.drawn.get(name, ()))
+                            if self.segments is not None else 0,
+                'layer_kb': len(t.layer.pixels) / 1024 if t.layer else 0,
+            }
+
+        journal = self.journal
+        return {
+            'turtles': turtles,
+            'canvas': {
+                'items': len(self.canvas.find_all()),
+                'points': sum(t.get('points', 0) for t in turtles.values()),
+                'budget': self.canvasBudget,
+                'layer_pixels': sum(
+                    len(t.layer.pixels) // 4 for t in self.turtles.values()
+                    if getattr(t, 'layer', None) is not None
+                ),
+                'layer_budget': self.layerPixels,
+            },
+            'journal': {
+                'entries': len(journal),
+                'kb': journal.nbytes() / 1024,
+                'checkpoints': len(journal.checkpoints),
+                'trimmed': journal.trimmed,
+                'size': journal.size,
+            },
+            'segments': {
+                'segments': len(self.segments) if self.segments else 0,
+                'kb': self.segments.nbytes() / 1024 if self.segments else 0,
+            },
+            'console': {
+                'lines': len(self.console.lines),
+                'size': self.console.size,
+            },
+            'history': {
+                'commands': len(self.cmdlineHistory),
+                'size': self.cmdlineHistory.size,
+            },
+        }
+
+
+    def memoryText(self):
+        '''Format the memory() report as a table.'''
+        report = self.memory()
+        lines = [f'{"turtle":<20}{"items":>8}{"points":>10}{"undo":>7}'
+                 f'{"segments":>10}{"layer KB":>10}']
+
+        for name, t in report.pop('turtles').items():
+
+            if 'agents' in t:
+                lines.append(f'{name:<20}{t["agents"]:>8} agents{t["kb"]:>29.0f}')
+
+            else:
+                lines.append(
+                    f'{name:<20}{t["items"]:>8}{t["points"]:>10}{t["undo"]:>7}'
+                    f'{t["segments"]:>10}{t["layer_kb"]:>10.0f}'
+                )
+
+        for subsystem, fields in report.items():
+            lines.append(f'{subsystem:<10}' + '  '.join(
+                f'{field} {value:.0f}' if isinstance(value, float)
+                else f'{field} {value}'
+                for field, value in fields.items()
+            ))
+
+        return '\n'.join(lines)
+
+
+    def perfText(self):
+        '''Format the profile, memory use, and throughput of attached programs
+        if any.
+        '''
+        text = f'{self.profiler.text()}\n\n{self.memoryText()}'
+
+        if not self.scheduler.tasks:
+            return text
+
+        return f'{text}\n\n{self.scheduler.text()}'
+
+
+    def profile(self):
+        '''Return timing stats for events and turtle commands.
+
+         Profiling is opt-in, pass profile=True or enable it with setProfile()
+        or the Perf tab. See Profiler.report() for the format.
+        '''
+        return self.profiler.report()
+
+
+    def pollServer(self, timeout=0, limit=100):
+        '''Queue the commands that came in through the control server.
+
+         Waits up to timeout seconds for the first batch and handles at most
+        limit batches. Each line of a batch is compiled and queued, then the
+        batch is acknowledged with the number of lines and operations queued
+        and any compile errors. Returns the number of batches handled.
+        '''
+        if self.server is None:
+            return 0
+
+        handled = 0
+
+        while handled < limit:
+            item = self.server.get(timeout if not handled else 0)
+
+            if item is None:
+                break
+
+            batch, reply = item
+            result = {'lines': len(batch), 'ops': 0, 'errors': []}
+
+            for line in batch:
+
+                if not line.strip():
+                    continue
+
+                depth = self.queueDepth
+                self.enqueue(line, history=False)
+                result['ops'] += self.queueDepth - depth
+                error = self.queue[-1].program.error
+
+                if error:
+                    result['errors'].append(error)
+
+            reply(result)
+            handled += 1
+
+        return handled
+
+
+    def queueStatus(self):
+        '''Show the number of queued operations if it changed.'''
+        text = f'Queue: {self.queueDepth}'
+
+        if text != self._queueText:
+            self._queueText = text
+            self.window.Element('_queue_').Update(text)
+
+
+    def readEvent(self):
+        '''Call to read window events for a custom event handler loop.
+
+        Use this call if you want to handle your own events and just use this
+        class to handle your GUI and Turtle creation.
+        '''
+        return self.window.read()
+
+
+    def record(self, opcode, *args):
+        '''Add an action to the journal, taking a checkpoint when one is due.
+
+         Checkpoints wait until the queue is empty, so they never include
+        commands that haven't run yet. Returns whether it was recorded.
+        '''
+        recorded = self.journal.record(opcode, *args)
+
+        if recorded:
+            self.recordCheckpoint()
+
+        return recorded
+
+
+    def recordCheckpoint(self):
+        '''Take a journal checkpoint if one is due and nothing is queued.'''
+        if self.queue or self.scripts or self.journal.paused:
+            return
+
+        if self.journal.checkpointDue():
+            self.journal.addCheckpoint(self.checkpoint())
+
+
+    def recordFrame(self):
+        '''Flush the canvas and pass a frame on to the recorder.'''
+        self.flush()
+        self.recorder.capture(
+            self.turtles,
+            (self.screen.xscale, self.screen.yscale),
+            self.viewBox(),
+            self.screen.bgcolor(),
+        )
+
+
+    def registerShape(self, name, parts):
+        '''Register a custom shape for every turtle, see ShapeRegistry.
+
+         parts is a list of (polygon, fill, outline) for a compound shape, or
+        a polygon of (x, y) points for one drawn in the turtle's colors.
+        '''
+        if parts and isinstance(parts[0][0], (int, float)):
+            parts = tuple(tuple(point) for point in parts)
+
+        else:
+            # Outlines are spelt out, so the journal has no None to keep.
+            parts = tuple(
+                (tuple(tuple(point) for point in polygon), fill,
+                 outline[0] if outline and outline[0] is not None else fill)
+                for polygon, fill, *outline in parts
+            )
+
+        self.shapes.register(name, parts)
+        self.record('shape', name, parts)
+
+        if self.window is not None and '_shape_' in self.window.AllKeysDict:
+            self.window.Element('_shape_').update(
+                value=self.turtle.shape(),
+                values=sorted(self.screen.getshapes()),
+            )
+
+
+    def redo(self, steps=1):
+        '''Redo up to steps undone actions, returning whether any were.'''
+        journal = self.journal
+        target = min(journal.position + steps, len(journal))
+
+        if target == journal.position:
+            return False
+
+        self.replay(journal.position, target)
+        return True
+
+
+    def removeTurtle(self, name):
+        '''Remove a turtle or swarm, along with everything it drew.'''
+        t = self.turtles.pop(name)
+        t.clear()
+        t.hideturtle()
+
+        if isinstance(t, Swarm):
+
+            for item in t.items:
+                self.canvas.delete(item)
+
+        else:
+            # clear() leaves a fresh line item behind, and the turtle module
+            # keeps one more for animating lines.
+            shape = t.turtle._item
+
+            for item in (t.items + [t.drawingLineItem]
+                         + (shape if isinstance(shape, list) else [shape])):
+                self.canvas.delete(item)
+
+            if t in self.screen._turtles:
+                self.screen._turtles.remove(t)
+
+
+    def replay(self, start=0, end=None):
+        '''Apply journal entries start to end at full speed.
+
+         Animation is turned off while replaying, and checkpoints are taken
+        along the way where they are due.
+        '''
+        journal = self.journal
+        end = len(journal) if end is None else end
+        paused = journal.paused
+        journal.paused = True
+        self.screen.tracer(0)
+
+        try:
+
+            for index in range(start, end):
+                self._apply(*journal.entry(index))
+                journal.position = index + 1
+
+                if not paused and journal.checkpointDue():
+                    journal.addCheckpoint(self.checkpoint())
+
+        finally:
+            journal.paused = paused
+            self.setTurbo(self.turbo)
+            self.flush()
+
+
+    def reset(self):
+        '''Start the session over, as if the SimpleTurtle had just been made.
+
+         Queued commands and attached programs are cancelled, every turtle
+        and swarm is removed with what it drew, procedures are forgotten, the
+        canvas and view go back to how they started and the journal starts
+        over with a new default turtle. This is a lot cheaper than making a
+        new SimpleTurtle, which is why batch workers reset theirs between
+        scripts.
+        '''
+        self.stop()
+        self.stopRecording()
+        journal = self.journal
+        paused = journal.paused
+        journal.paused = True
+
+        for name in list(self.turtles):
+            self.removeTurtle(name)
+
+        self.procedures.clear()
+        self._compile.cache_clear()
+
+        if self.segments is not None:
+            self.segments.clear()
+
+        self.resize(*self._startSize)
+        self.resetView()
+        self.journal = Journal(
+            journal.checkpointEvery,
+            journal.maxCheckpoints,
+            journal.size,
+        )
+        self.journal.paused = True
+        self.newTurtle('default')
+        self.flush()
+        self.journal.paused = paused
+        self.journal.addCheckpoint(self.checkpoint())
+
+
+    def resetView(self):
+        '''Go back to the original zoom, centred on the origin.'''
+        self.zoom(1 / self.zoomLevel)
+        self.setView(0, 0)
+
+
+    def resize(self, width, height, delay=0):
+        '''Resize the canvas, keeping the view centred where it was.
+
+         With a delay (in ms) the resize waits until no other one has been
+        asked for in that time, so holding down a spinner resizes once. The
+        resize is recorded in the journal when it's done.
+        '''
+        if self._resizing is not None:
+            self.canvas.after_cancel(self._resizing)
+            self._resizing = None
+
+        if delay:
+            self._resizing = self.canvas.after(delay, self.resize, width, height)
+            return
+
+        self.canvas.config(width=width, height=height)
+        self.setView()
+        self.record('resize', width, height)
+
+
+    def restore(self, state):
+        '''Put the turtles back the way a checkpoint() found them.
+
+         Turtles created since are removed, and swarms are left alone.
+        Procedures go back to the ones defined then.
+        '''
+        paused = self.journal.paused
+        self.journal.paused = True
+        screen = self.screen
+        cv = screen.cv
+        xscale, yscale = state['scale']
+        create = {
+            'line': cv.create_line,
+            'polygon': cv.create_polygon,
+            'text': cv.create_text,
+        }
+
+        for name in list(self.turtles):
+
+            if name not in state['turtles'] and not isinstance(self.turtles[name], Swarm):
+                self.removeTurtle(name)
+
+        for name, saved in state['turtles'].items():
+
+            if name not in self.turtles:
+                self.newTurtle(name)
+
+            t = self.turtles[name]
+            t.clear()
+            items = [
+                create[kind](*coords, **options)
+                for kind, coords, options in saved['items']
+            ]
+
+            if (xscale, yscale) != (screen.xscale, screen.yscale):
+
+                for item in items:
+                    cv.scale(
+                        item, 0, 0,
+                        screen.xscale / xscale,
+                        screen.yscale / yscale,
+                    )
+
+            t.items[:0] = items
+            t.pen(saved['pen'])
+            t.shape(saved['shape'])
+            t._position = turtle.Vec2D(*saved['position'])
+            t._orient = turtle.Vec2D(*saved['orient'])
+            t.currentLine = [t._position] if t._drawing else []
+
+            if saved.get('layer'):
+                t.layer = FlatLayer(cv, *saved['layer'])
+                t.layer.show()
+
+            if self.segments is not None:
+
+                for kind, coords, options in saved['items']:
+
+                    if kind == 'line':
+                        self.segments.addPath(
+                            zip(
+                                [x / xscale for x in coords[0::2]],
+                                [-y / yscale for y in coords[1::2]],
+                            ),
+                            name,
+                        )
+
+            t._update()
+
+        self.procedures.clear()
+
+        for source in state.get('procedures', {}).values():
+            compileCmdline(source, self.procedures)
+
+        self._compile.cache_clear()
+        width, height = state['size']
+        self.canvas.config(width=width, height=height)
+        self.setView()
+
+        if state['selected'] in self.turtles:
+            self.selectTurtle(state['selected'])
+
+        self.updateTurtles()
+        self.journal.paused = paused
+
+
+    def renderSwarms(self):
+        '''Redraw the swarms that changed since they were last drawn.'''
+        for t in self.turtles.values():
+
+            if isinstance(t, Swarm):
+                t.render()
+
+
+    def run(self, *args):
+        '''Queue the command in the command line to run.'''
+        cmd = self.window.Element('_cmdline_').Get()
+
+        # Return is bound twice, the second call finds the line empty.
+        if not cmd.strip():
+            return
+
+        self.cmdlineHistory.append(cmd)
+        self.enqueue(cmd)
+        self.window.Element('_cmdline_').update(
+            value='', 
+            values=self.cmdlineHistory.recent(self.historyVisible),
+        )
+
+
+    def runScript(self, lines, verbose=None):
+        '''Run a script right away, a line at a time, and flush the canvas.
+
+         lines can be any iterable of command strings, such as scriptLines()
+        of an open file, and is consumed lazily. Returns the number of
+        operations run.
+        '''
+        ops = 0
+
+        for line in lines:
+            ops += self.cmdline(line, verbose, history=False)
+
+        self.flush()
+        return ops
+
+
+    def save(self, path):
+        '''Save the drawing to a file, in a format chosen by its extension.
+
+         Drawings can be saved as .svg, or .ps or .eps PostScript, of the part
+        in view. Both are written straight from the canvas items, which is a
+        lot faster than Tk's postscript() on big drawings. Swarms are left
+        out, and so are flattened drawings from PostScript. Headless drawings
+        can also be saved as a .json DisplayList.
+
+         .png images are drawn from the items like flattened drawings are,
+        without Tk, so they can be saved headless too. They leave out text
+        and swarms.
+        '''
+        self.flush()
+        extension = path.rsplit('.', 1)[-1].casefold()
+
+        if extension == 'json' and self.headless:
+
+            with open(path, 'w') as f:
+                self.canvas.dump(f)
+
+        elif extension in ['svg', 'ps', 'eps']:
+            export = CanvasExport(self.canvas)
+            items = export.items()
+            box = self.viewBox()
+            bg = self.screen.bgcolor()
+
+            with open(path, 'w') as f:
+
+                if extension == 'svg':
+                    export.writeSVG(f, items, box, bg, [
+                        t.layer.state() for t in self.turtles.values()
+                        if getattr(t, 'layer', None) is not None
+                    ])
+
+                else:
+                    export.writePostScript(f, items, box, bg)
+
+        elif extension == 'png':
+            image = FlatLayer(self.canvas, self.viewBox())
+            image.pixels[:] = image._rgba(self.screen.bgcolor()) * (
+                image.box[2] * image.box[3]
+            )
+
+            for t in self.turtles.values():
+
+                if getattr(t, 'layer', None) is not None:
+                    image.paste(t.layer)
+
+            image.draw(CanvasExport(self.canvas).items())
+
+            with open(path, 'wb') as f:
+                f.write(base64.b64decode(image.data()))
+
+        else:
+            raise ValueError(f'Can\'t save {"headless " * self.headless}'
+                             f'drawings as .{extension}')
+
+
+    def lsystem(self, axiom, rules, angle, depth, t=None, **kwargs):
+        '''Queue an L-system to be computed in parallel and drawn by turtle t.
+
+         The L-system is expanded and walked into paths in a process pool and
+        the paths are drawn from the event loop as they arrive, starting from
+        the turtle's position and heading. kwargs are passed on to LSystem
+        (step, draw and move). t defaults to the selected turtle.
+        '''
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(self.workers)
+
+        job = LSystemJob(
+            t or self.turtle,
+            LSystem(axiom, rules, angle, depth, **kwargs),
+            self.pool,
+            self.console.log,
+            self.profiler.record if self.profiler.enabled else None,
+        )
+        self.queue.append(job)
+        self.queueDepth += len(job)
+        return job
+
+
+    def runTimer(self, interval=16):
+        '''Step the queue and attached programs on screen timers.
+
+         For custom event loops built on readEvent(), which don't call step()
+        themselves. Each timer runs a slice of sliceTime and the timers stop
+        once there is nothing left to run.
+        '''
+        def tick():
+            self.step(self.sliceTime)
 
-         If you pass a layout parameter, that will be the layout for the GUI of
-        the main window, and all the default UI elements will be ignored.
+            if self.queue or self.scripts or self.scheduler:
+                self.screen.ontimer(tick, interval)
 
-         If you merely want to configure various individual elements of the GUI
-        try passing "elementArgs" which will be passed as additional arguments 
-        to the individual UI elements. For example to configure the canvas in 
-        the default UI layout, just pass a dict containing arguments as 
-        canvasArgs.
+        self.screen.ontimer(tick, interval)
 
-         If however you want to remove or re-arrange rows of the default GUI
-        layout while still using others, pass a rows argument as a list of the
-        default layout rows you want to use in the order you want them shown.
 
-         Furthermore if you want to customize the layout of individual rows,
-        the following arguments are customizable portions of the default GUI:
+    def serve(self, path=None, port=0, host='127.0.0.1', **kwargs):
+        '''Start a ControlServer feeding commands into the queue.
 
-            menubar     the pulldown menu bar at the top of the window.
-            toolbar     the toolbar which is a customizable column.
-            controls    the turtle controls which is a second such column.
-            windowmenu  the right-click context menu shown on right click.
+         Listens on the Unix socket path if given, otherwise on TCP host:port
+        (port 0 picks a free one). kwargs are passed on to ControlServer.
+        The event loop (or serveForever() headless) handles the commands.
+        Returns the address being listened on.
+        '''
+        if self.window is not None:
+            kwargs.setdefault(
+                'notify',
+                lambda: self.window.write_event_value('_server_', None),
+            )
 
-        You may also pass title and icon arguments to customize the titlebar.
+        self.server = ControlServer(path, host, port, **kwargs)
+        address = self.server.start()
+        self.console.info(f'Listening on {address}')
+        return address
+
+
+    def serveForever(self):
+        '''Handle control server commands without a window until interrupted.'''
+        try:
+
+            while True:
+                self.pollServer(self.idleTimeout() / 1000)
+
+                if self.queue or self.scripts or self.scheduler:
+                    self.step(self.sliceTime)
+
+                if self.turbo:
+                    self.flush()
+
+        except KeyboardInterrupt:
+            pass
+
+        finally:
+            self.server.close()
+
+
+    def saveJournal(self, path):
+        '''Save the journal, up to the current position, as JSON.'''
+        journal = self.journal
+        journal.truncate(journal.position)
+
+        with open(path, 'w') as f:
+            journal.dump(f)
+
+
+    def loadJournal(self, path, replay=True):
+        '''Load a journal saved by saveJournal() and (by default) replay it.
+
+         Replaying rebuilds the saved session, so it should be done on a new
+        SimpleTurtle.
         '''
-        if not 'layout' in kwargs:
-            # Control tabs:
-            ctrlTabs = {
-                'Movement': {
-                    'element_justification': 'center',
-                    'k': '_Movement_',
-                    'layout': [
-                        [
-                            sg.Button('Left'),
-                            sg.Button('Forward'),
-                            sg.Button('Right'),
-                            sg.Button('Back'),
-                        ],
-                        [
-                            sg.Text('Distance:'),
-                            sg.Spin(
-                                list(range(1,1001)),
-                                auto_size_text=True,
-                                enable_events = True,
-                                initial_value=10,
-                                k='_distance_',
-                            ),
-                            sg.Text('Rotation:'),
-                            sg.Spin(
-                                list(range(1,91)),
-                                auto_size_text=True,
-                                enable_events = True,
-                                initial_value=45,
-                                k='_rotation_',
-                            ),
-                            sg.Text('Speed:'),
-                            sg.Spin(
-                                list(range(1,101)),
-                                auto_size_text=True,
-                                enable_events = True,
-                                initial_value=10,
-                                k='_speed_',
-                            ),
-                        ],
-                    ],
-                },                
-                'Pen': {
-                    'element_justification': 'center',
-                    'k': '_Pen_',
-                    'layout': [
-                        [
-                            sg.Button('Pen Up'),
-                            sg.Button('Pen Down'),
-                            sg.Text('Color:'),
-                            sg.Combo(
-                                ['Black', 'Blue', 'Red', 'Green', 'Pink', 
-                                'Yellow', 'Purple', 'Orange', 'Brown', 'Gray',
-                                'Brown', 'White'],
-                                auto_size_text=True,
-                                default_value='Black',
-                                enable_events=True,
-                                k='_pencolor_',
-                            ),
-                            sg.Text('Fill:'),
-                            sg.Combo(
-                                ['Black', 'Blue', 'Red', 'Green', 'Pink', 
-                                'Yellow', 'Purple', 'Orange', 'Brown', 'Gray',
-                                'Brown', 'White'],
-                                auto_size_text=True,
-                                default_value='Gray',
-                                enable_events=True,
-                                k='_fillcolor_',
-                            ),
-                           sg.Text('Size:'),
-                            sg.Spin(
-                                list(range(1,11)),
-                                auto_size_text=True,
-                                enable_events = True,
-                                initial_value=1,
-                                k='_pensize_',
-                            ),
-                        ],
-                    ],
-                },
-                'Turtle': {
-                    'element_justification': 'center',
-                    'k': '_Turtle_',
-                    'layout': [
-                        [
-                            sg.Button('Hide'),
-                            sg.Button('Show'),
-                            sg.Text('Shape:'),
-                            sg.Combo(
-                                ['arrow', 'circle', 'classic', 
-                                'square', 'triangle', 'turtle'],
-                                auto_size_text=True,
-                                default_value='classic',
-                                enable_events=True,
-                                k='_shape_',
-                            ),
-                            sg.Text('Turtle:'),
-                            sg.Combo(
-                                ['default'],
-                                auto_size_text=True,
-                                default_value='default',
-                                enable_events=True,
-                                k='_turtle_',
-                            ),
-                        ],
-                    ],
-                },
-            }
+        journal = self.journal
 
-            # Deafult arguments.
-            args = {
-                'window': {
-                    'element_justification': 'center',
-                    'finalize': True,
-                    'resizable': True,
-                    'title': 'Python Turtle SimpleGUI',
-                },
-                'banner': {
-                    'auto_size_text': True,
-                    'border_width': 1,
-                    'justification': 'center',
-                    'k': '_banner_',
-                    'size': (90,1),
-                    'text': 'Python Turtle SimpleGUI Demonstration',
-                },
-                'toolbar': {
-                    'element_justification': 'center',
-                    'expand_x': True,
-                    'k': '_toolbar_',
-                    'layout': [
-                        [
-                            sg.Text('Canvas'),
-                            sg.Spin(
-                                list(range(640,1360)),
-                                auto_size_text=True,
-                                enable_events = True,
-                                initial_value=640,
-                                k='_canvasWidth_',
-                            ),
-                            sg.Text('x'),
-                            sg.Spin(
-                                list(range(480,1024)),
-                                auto_size_text=True,
-                                enable_events = True,
-                                initial_value=480,
-                                k='_canvasHeight_',
-                            ),
-                            sg.Button('Clear'),
-                            sg.Button('Home'),
-                        ],
-                   ],
-                },
-                'header': {
-                    'auto_size_text': True,
-                    'border_width': 2,
-                    'justification': 'center',
-                    'size': (90,1),
-                    'k': '_header_',
-                    'text': 'Turtle screen',
-                },
-                'canvas': {
-                    'k': '_canvas_',
-                    'size': (640, 480),    
-                },
-                'footer': {
-                    'auto_size_text': True,
-                    'border_width': 2,
-                    'justification': 'center',
-                    'k': '_footer_',
-                    'size': (90,1),
-                    'text': '',
-                },
-                'controls': {
-                    'element_justification': 'center',
-                    'expand_x': True,
-                    'k': '_controls_',
-                    'layout': [
-                        [
-                            sg.TabGroup(
-                                [
-                                    [
-                                    sg.Tab(
-                                        'Movement',
-                                        layout=ctrlTabs['Movement']['layout'],
-                                        element_justification='center',
-                                    ),
-                                    sg.Tab(
-                                        'Pen',
-                                        layout=ctrlTabs['Pen']['layout'],
-                                        element_justification='center',
-                                    ),
-                                    sg.Tab(
-                                        'Turtle',
-                                        layout=ctrlTabs['Turtle']['layout'],
-                                        element_justification='center',
-                                    ),
-                                    ]
-                                ],
-                                tab_location='top',
-                            ),
-                        ],
-                    ],
-                },
-                'cmdline': {
-                    'default_value': '',
-                    'enable_events': True,
-                    'k': '_cmdline_',
-                    'size': (80,1),
-                },
-                'console': {
-                    'autoscroll': True,
-                    'disabled': True,
-                    'echo_stdout_stderr': True,
-                    'k': '_console_',
-                    'reroute_stderr': True,
-                    'reroute_stdout': True,
-                    'size': (90, 6),
-                },
-                'status': {
-                    'auto_size_text': True,
-                    'border_width': 2,
-                    'justification': 'center',
-                    'k': '_status_',
-                    'relief': sg.RELIEF_SUNKEN,
-                    'size': (90, 1)
-                },
+        with open(path) as f:
+            self.journal = Journal.load(
+                f,
+                checkpointEvery=journal.checkpointEvery,
+                maxCheckpoints=journal.maxCheckpoints,
+                size=journal.size,
+            )
+
+        self.journal.paused = journal.paused
+
+        # A trimmed journal starts from its base rather than a new session.
+        if 0 in self.journal.checkpoints:
+            self.restore(self.journal.checkpoints[0])
+
+        else:
+            self.journal.checkpoints = {
+                0: journal.checkpoints.get(0) or self.checkpoint(),
             }
+            self.journal.last = 0
 
-            # Check for "elementArgs" and override default arguments.
-            for row in args:
+        if replay:
+            self.replay()
 
-                if f'{row}Args' in kwargs:
 
-                    for arg in kwargs[f'{row}Args']:
-                        args[row][arg] = kwargs[f'{row}Args'][arg]
-    
-            # Default row layouts.
-            banner =    [sg.Text(**args['banner'])]
+    def selectTurtle(self, name):
+        '''Select active turtle by name'''
+        self.turtle = self.turtles[name]
+        self.turtleName = name
+
+
+    def setView(self, x=None, y=None):
+        '''Centre the window on x, y in canvas pixels, or where it was.
+
+         Only the scroll region is moved, the items stay as they are.
+        '''
+        if x is not None:
+            self.view = (x, y)
+
+        x, y, width, height = self.viewBox()
+        self.canvas.config(scrollregion=(x, y, x + width, y + height))
+
+
+    def setProfile(self, enabled=True):
+        '''Turn profiling on or off.'''
+        self.profiler.enabled = bool(enabled)
+
+
+    def setTurbo(self, turbo=True):
+        '''Turn turbo mode on or off.
+
+         In turbo mode tracing is disabled on the TurtleScreen so turtles draw
+        without animation, and the canvas is refreshed by frame() and flush().
+        '''
+        self.turbo = bool(turbo)
 
-            if not 'toolbar' in kwargs:
-                toolbar = [sg.Column(**args['toolbar'])]
+        if self.turbo:
+            self.screen.tracer(0)
 
-            header = [sg.Text(**args['header'])]
-            canvas = [sg.Canvas(**args['canvas'])]
-            footer = [sg.Text(**args['footer'])]
+        else:
+            self.screen.tracer(1)
 
-            if not 'controls' in kwargs:
-                controls = [sg.Column(**args['controls'])]
+        self.flush()
 
-            cmdline = [
-                #sg.Input(**args['cmdline']),
-                sg.Combo(
-                    [],
-                    **args['cmdline'],
-                ),
-                sg.Button('Run', bind_return_key=True)
-            ]
 
-            console = [sg.Multiline(**args['console'])]
-            status = [sg.Text(**args['status'])]
+    def step(self, budget=None):
+        '''Run queued commands for up to budget milliseconds.
 
-            if not 'rows' in kwargs:
-                # Default layout.
-                layout = [
-                    banner,
-                    toolbar,
-                    header,
-                    canvas,
-                    footer,
-                    controls,
-                    cmdline,
-                    console,
-                    status,
-                ]
+         Without a budget the whole queue is run. Attached programs run in
+        whatever is left of the budget, without one for a single round, as
+        looping programs never finish. Returns the number of operations run.
+        '''
+        deadline = None
 
-            else: # Load custom layout from rows argument.
-                layout = []
-                # Get local vars (for the default rows).
-                local = locals()
+        if budget is not None:
+            deadline = perf_counter() + budget / 1000
 
-                for row in rows:
+        tick = self.ticker()
+        ran = 0
 
-                    # Load builtin default rows by name from strings.
-                    if type(row) == str:
-                        layout.append(local[row])
+        while self.queue or self.scripts:
 
-                    # Load custom row from a list into the layout.
-                    elif type(row) == list:
-                        layout.append(row)
+            if not self.queue:
+                lines, done = self.scripts[0]
+                line = next(lines, None)
 
-        # Create the main window.
-        self.window = sg.Window(layout=layout, **args['window'])
-        # Create pointer to the actual canvas.
-        self.canvas = self.window['_canvas_'].TKCanvas
+                if line is None:
+                    self.scripts.popleft()
 
-        # Turtles and settings.
-        self.turtles = {}
+                    if done is not None:
+                        done()
 
-        # Create the default turtle.
-        self.newTurtle('default')
-    
-        # Set default distance, rotation.
-        self.distance = self.window.Element('_distance_').Get()
-        self.rotation = self.window.Element('_rotation_').Get()
+                else:
+                    self.enqueue(line, history=False)
 
+                continue
 
-    def checkInt(self, arg):
-        '''Check if string is an integer and do conversion'''
-        if arg[0] in ['+', '-'] and arg[1:].isdigit() or arg.isdigit():
-            return int(arg)
+            job = self.queue[0]
+            ran += job.run(deadline, tick)
 
-        return arg
+            if not len(job):
+                self.queue.popleft()
+                self.queuedEntries.pop(job, None)
 
+            if deadline is not None and perf_counter() >= deadline:
+                break
 
-    def config(self, element, **kwargs):
-        '''Change a GUI Element's configuration.'''
-        self.window.Element(element).config(**kwargs)
+        self.queueDepth = max(self.queueDepth - ran, 0) if self.queue else 0
 
+        if not self.queue:
+            self.recordCheckpoint()
 
-    def cmdline(self, cmd):
-        '''Basic command string interpreter.
+        # Attached programs get the rest of the slice.
+        if self.scheduler and (deadline is None or perf_counter() < deadline):
+            ran += self.scheduler.run(deadline, tick, 1 if deadline is None else None)
 
-         This could be replaced with something more robust, but for now it does
-        basic shorthand of turtle commands.'''
-        tokens = cmd.strip().split(' ')
-        print(f'Running command list:\n{tokens}')
+        self.status.count(ran)
+        return ran
 
-        while len(tokens):
-            token = tokens.pop(0)
-            print(f'Processing token: {token}')
 
-            if token in turtle.__all__:
-                turtleCmd = getattr(self.turtle, token)
-                takesArgs = len(signature(turtleCmd).parameters)
+    def stamps(self, points, headings=None):
+        '''Stamp the selected turtle's shape at every (x, y) of points, in
+        one go, see PathTurtle.stamps().
+        '''
+        points = tuple((x, y) for x, y in points)
 
-                if not takesArgs:
-                    print(f'Calling turtle.{token}()')
+        if headings is None:
+            return self.call('stamps', points)
 
-                    try:
-                        ret = turtleCmd()
-                    except Exception as e:
-                        print(e)
+        return self.call('stamps', points, tuple(headings))
 
-                    if ret:
-                        print(f'{token}: {ret}')
 
-                else:
-                    args = []
-                    for arg in range(takesArgs):
-                        try:
-                            arg = tokens.pop(0)
-                        except IndexError:
-                            print(
-                                f'turtle.{token} takes {takesArgs} '
-                                f'arguments but {len(args)} were given.'
-                            )
-                            self.cmdlineHistory.append(' '.join(tokens))
-                        if arg in turtle.__all__:
-                            print(
-                                f'turtle.{token} takes {takesArgs} '
-                                f'arguments but {len(args)-1} were given.'
-                            )
-                            tokens.append(arg)
-                            self.cmdlineHistory.append(' '.join(tokens))
-                        if ',' in arg:
-                            splitArgs = arg.split(',')
-                            tupleArgs = []
-
-                            for arg in splitArgs:
-                                tupleArgs.append(self.checkInt(arg))
-
-                            arg = tuple(arg.split(','))
-
-                        else:
-                            arg = self.checkInt(arg)
-                        args.append(arg)
-
-                    print(f'Calling turtle.{token}() and passing {args}')
-
-                    try:
-                        turtleCmd(*args)
-                    except Exception as e:
-                        print(e)
+    def startRecording(self, directory, every=100):
+        '''Save a frame of the drawing every so many operations.
 
-            else:
-                print(f'{token} is not a valid turtle command, suspending.')
-                break
+         Frames are written to directory as SVG files by a FrameRecorder, in
+        the background. Returns the recorder.
+        '''
+        self.stopRecording()
+        self.recorder = FrameRecorder(self.canvas, directory, every)
+        return self.recorder
 
 
-    def eventLoop(self):
-        '''Call to read window events with the default event handler.
+    def stopRecording(self):
+        '''Save the last frame, and wait until all the frames are written.
 
-        Use this call if you want a truely simple turtle GUI.
+         Returns the number of frames saved.
         '''
-        print('PGST initialized.')
+        recorder = self.recorder
 
-        self.cmdlineHistory = []
-        self.window.Element('_cmdline_').Widget.bind('<Key-Return>', self.run)
+        if recorder is None:
+            return 0
 
-        while True:
-            self.turtleStatus(self.turtle)
-            event, values = self.window.read()
+        if recorder.ops:
+            self.recordFrame()
 
-            if event == sg.WIN_CLOSED:
-                break
+        self.recorder = None
+        recorder.stop()
 
-            elif event == 'Run':
-                self.run()
-
-            elif event in [
-                'Forward', 
-                'Back', 
-                'Left', 
-                'Right',
-            ]:
-                self.move(event[0])
-
-            elif event in [
-                'Pen Up', 
-                'Pen Down', 
-                'Hide', 
-                'Show',
-            ]:
-                if event.startswith('Pen'):
-                    cmd = ''.join(event.split(' ')).casefold()
+        if recorder.error is not None:
+            self.console.error(f'Saving frames failed: {recorder.error}')
 
-                else:
-                    cmd = f'{event.casefold()}turtle'
+        return recorder.frames
 
-                turtleCmd = getattr(self.turtle, cmd)
-                turtleCmd()
 
-            elif event[0] == '_' and event[-1] == '_':
-                self.widgetEvent(event, values)
+    def stop(self):
+        '''Cancel all queued commands and scripts, and attached programs.'''
+        if self.queue or self.scripts:
+            self.console.info(f'Stopped, {self.queueDepth} operations cancelled.')
 
-            elif event in ['Clear', 'Home',]:
-                turtleCmd = getattr(self.turtle, event.casefold())
-                turtleCmd()
+        for job in self.queue:
 
+            if isinstance(job, LSystemJob):
+                job.cancel()
 
-        self.window.close()
-        return
+        # Only the part of a cancelled cmdline that ran stays in the journal,
+        # and the ones at the end that never started are dropped.
+        journal = self.journal
 
+        for job, index in sorted(self.queuedEntries.items(),
+                                 key=lambda item: -item[1]):
+            index -= journal.trimmed
 
-    def move(self, cmd):
-        '''Move the selected turtle.'''
-        cmd = cmd.casefold()
+            if not 0 <= index < len(journal):
+                continue
 
-        if cmd == 'f':
-            self.turtle.forward(self.distance)
+            if not job.ran and index == len(journal) - 1 == journal.position - 1:
+                journal.truncate(index)
+                journal.position = index
 
-        elif cmd == 'b':
-            self.turtle.backward(self.distance)
+            else:
+                journal.amend(index, job.ran)
 
-        elif cmd in ['r', 'l']:
-            turtleCmd = getattr(self.turtle, f'{cmd}t')
-            turtleCmd(self.rotation)
+        self.queuedEntries.clear()
+        self.queue.clear()
+        self.scripts.clear()
+        self.scheduler.stop()
+        self.queueDepth = 0
 
 
-    def newTurtle(self, name, **kwargs):
-        '''Create a new turtle.'''
-        defaults = {
-            'anglemode': 'deg',
-            #'fillcolor': 'Gray',
-            #'mode': 'logo',
-            'pendown': False,
-            'pencolor': 'Black',
-            'shape': 'classic',
-            'pensize': 1,
-            'speed': 10,
-        }
+    def startupProfile(self):
+        '''Return the startup time breakdown as printable text.'''
+        lines = ['Startup profile:']
 
-        self.turtles[name] = turtle.RawTurtle(self.canvas)
+        for phase, seconds in self.startupTimes.items():
+            lines.append(f'  {phase:<14}{seconds * 1000:>9.1f} ms')
 
-        for setting in defaults:
+        total = sum(self.startupTimes.values())
+        lines.append(f'  {"total":<14}{total * 1000:>9.1f} ms')
+        return '\n'.join(lines)
 
-            if setting in kwargs:
-                defaults[setting] = kwargs[setting]
-            
-            if setting == 'anglemode':
-            
-                if 'degrees'.startswith(defaults['anglemode']):
-                    self.turtles[name].degrees()
-            
-                elif 'radians'.startswith(defaults['anglemode']):
-                    self.turtles[name].radians()
-            
-            elif setting == 'pendown':
 
-                if defaults['pendown']:
-                    self.turtles[name].pendown()
+    def tabLayout(self, tab, lazy=False):
+        '''Return the layout for a control tab, or a placeholder if lazy.
 
-                else:
-                    self.turtles[name].penup()
+         A lazy tab's real layout is added by buildTab once it is selected.
+        '''
+        if not lazy:
+            return tab['layout']
 
-            else:
-                setTurtle = getattr(self.turtles[name], setting)
-                setTurtle(defaults[setting])
+        self.lazyTabs[tab['k']] = tab['layout']
+        return [[]]
 
-        self.selectTurtle(name)
 
+    def ticker(self):
+        '''Return what to call for every operation run, if anything.'''
+        if self.turbo or self.recorder is not None:
+            return self.frame
 
-    def readEvent(self):
-        '''Call to read window events for a custom event handler loop.
+        return None
 
-        Use this call if you want to handle your own events and just use this
-        class to handle your GUI and Turtle creation.
-        '''
-        return self.window.read()
 
+    def throughput(self):
+        '''Return per turtle stats of attached programs, see Scheduler.stats().'''
+        return self.scheduler.stats()
 
-    def run(self, *args):
-        cmd = self.window.Element('_cmdline_').Get()
-        self.cmdlineHistory.append(cmd)
-        self.cmdline(cmd)
-        self.window.Element('_cmdline_').update(
-            value='', 
-            values=self.cmdlineHistory,
+
+    def turtleStatus(self, t):
+        '''Track the state of turtle t, updating the status bar when due.'''
+        self.status.set(
+            turtle=self.turtleName if t is self.turtle else None,
+            pen='Down' if t.isdown() else 'Up',
+            pos=t.pos(),
+            heading=t.heading(),
+            queue=self.queueDepth,
         )
 
+        if self.status.due():
+            self.window.Element('_status_').Update(self.status.text())
 
-    def selectTurtle(self, name):
-        '''Select active turtle by name'''
-        self.turtle = self.turtles[name]
 
+    def undo(self, steps=1):
+        '''Undo the last steps actions across all turtles.
+
+         Queued commands are stopped, then the session is restored from the
+        nearest checkpoint and the actions after it replayed. Returns whether
+        there was anything to undo.
+        '''
+        journal = self.journal
+        target = max(journal.position - steps, 0)
+
+        if target == journal.position:
+            return False
+
+        self.stop()
+        index, state = journal.nearest(target)
+        self.restore(state)
+        journal.position = index
+        self.replay(index, target)
+        return True
 
-    def turtleStatus(self, t):
-        pen = 'Up'
 
-        if t.isdown():
-            pen = 'Down'
+    def updateTurtles(self):
+        '''List the turtles and swarms in the Turtle tab's combo.'''
+        if self.window is not None and '_turtle_' in self.window.AllKeysDict:
+            self.window.Element('_turtle_').update(
+                value=self.turtleName,
+                values=list(self.turtles),
+            )
+
+
+    def viewport(self):
+        '''Return the part of the drawing in view as (x0, y0, x1, y1), in
+        turtle coordinates.
+        '''
+        x, y, width, height = self.viewBox()
+        xscale, yscale = self.screen.xscale, self.screen.yscale
+        return (
+            x / xscale,
+            -(y + height) / yscale,
+            (x + width) / xscale,
+            -y / yscale,
+        )
 
-        pos = t.pos()
-        deg = t.heading()
 
-        self.window.Element('_status_').Update(f'[Pen {pen}] @{pos}:{deg}')
+    def viewBox(self):
+        '''Return the part of the canvas in view as (x, y, width, height),
+        in canvas coordinates.
+        '''
+        x, y = self.view
+        width = float(self.canvas.cget('width'))
+        height = float(self.canvas.cget('height'))
+        return (x - width / 2, y - height / 2, width, height)
 
 
     def widgetEvent(self, event, values):
@@ -583,25 +6360,550 @@ class SimpleTurtle():
 
         # Turtle values that get set in the class.
         if event in ['distance', 'rotation']:
-            value = values[f'_{event}_']
+            value = checkInt(str(values[f'_{event}_']))
             setattr(self, event, value)
 
+        # Spinners are read back as strings.
+        elif event in ['pensize', 'speed']:
+            self.call(event, checkInt(str(values[f'_{event}_'])))
+
         # Trutle values that get set in the turtle.
-        elif event in ['fillcolor', 'pencolor', 'pensize', 'speed', 'shape']:
-            turtleCmd = getattr(self.turtle, event)
-            turtleCmd(values[f'_{event}_'])
+        elif event in ['fillcolor', 'pencolor', 'shape']:
+            self.call(event, values[f'_{event}_'])
+
+        elif event == 'ctrlTabs':
+            self.buildTab(values['_ctrlTabs_'])
+            self.updateTurtles()
+
+            if values['_ctrlTabs_'] == '_Perf_':
+                self.window.Element('_perf_').update(self.perfText())
+
+        elif event == 'profile':
+            self.setProfile(values['_profile_'])
+
+        elif event == 'perfRefresh':
+            self.window.Element('_perf_').update(self.perfText())
+
+        elif event == 'perfReset':
+            self.profiler.reset()
+            self.window.Element('_perf_').update(self.perfText())
+
+        elif event == 'export':
+            path = sg.popup_get_file(
+                'Export drawing as',
+                default_extension='.svg',
+                file_types=(
+                    ('SVG', '*.svg'),
+                    ('PostScript', '*.ps *.eps'),
+                ),
+                save_as=True,
+            )
+
+            if path:
+                started = perf_counter()
+                self.save(path)
+                self.console.info(
+                    f'Exported {path} in {perf_counter() - started:.2f}s'
+                )
+
+        elif event == 'perfSave':
+            path = sg.popup_get_file(
+                'Save profile as',
+                default_extension='.json',
+                save_as=True,
+            )
+
+            if path:
+                self.dumpProfile(path)
+
+        elif event == 'turbo':
+            self.setTurbo(values['_turbo_'])
+
+        elif event == 'turtle':
+            self.selectTurtle(values['_turtle_'])
+            self.record('select', values['_turtle_'])
+
+        elif event == 'server':
+            self.pollServer()
 
         elif event in ['canvasWidth', 'canvasHeight']:
-            self.canvas.config(
-                width=values['_canvasWidth_'], 
-                height=values['_canvasHeight_']
+            self.resize(
+                values['_canvasWidth_'],
+                values['_canvasHeight_'],
+                self.resizeDelay,
             )
 
+        elif event == 'cmdline_Key':
+            # Autocomplete from the history.
+            text = values['_cmdline_']
+
+            if text != self._completing:
+                self._completing = text
+                self.window.Element('_cmdline_').update(
+                    value=text,
+                    values=self.cmdlineHistory.search(
+                        text,
+                        self.historyVisible,
+                    ),
+                )
+
         elif event == 'Return':
-            print(event)
+            self.console.trace(event)
         
 
 
+    def zoom(self, factor, x=None, y=None):
+        '''Zoom in by factor (out if less than 1) around x, y.
+
+         x, y are turtle coordinates and default to the centre of the view,
+        the point stays where it is in the window. The drawn items are scaled
+        on the canvas in one go instead of being drawn again, and the screen
+        scale changes with them so the turtles keep drawing in place. The
+        zoom level is kept within zoomLimits and returned.
+        '''
+        low, high = self.zoomLimits
+        level = min(max(self.zoomLevel * factor, low), high)
+        factor = level / self.zoomLevel
+
+        if factor == 1:
+            return self.zoomLevel
+
+        screen = self.screen
+        cx, cy = self.view
+
+        if x is None:
+            px, py = cx, cy
+
+        else:
+            px, py = x * screen.xscale, -y * screen.yscale
+
+        self.flush()
+        screen.cv.scale('all', 0, 0, factor, factor)
+        screen.xscale *= factor
+        screen.yscale *= factor
+        self.zoomLevel = level
+        self.setView(cx + px * (factor - 1), cy + py * (factor - 1))
+
+        # Turtle shapes keep their size.
+        screen.update()
+        self.status.set(zoom=round(level * 100))
+        return level
+
+
+# The SimpleTurtle a batch worker reuses for every script it renders.
+_batchTurtle = None
+
+
+def _batchInit(kwargs):
+    '''Make the headless SimpleTurtle for a batch worker process.'''
+    global _batchTurtle
+    _batchTurtle = SimpleTurtle(headless=True, **kwargs)
+    _batchTurtle.console.echo = None
+
+
+def _batchRender(script, output, timeout=None):
+    '''Render a script to output with the worker's SimpleTurtle.
+
+     Returns a dict of how it went: the operations run, the seconds taken,
+    the errors logged, and the result (ok, timeout or failed). A script that
+    logged errors still has its image saved, but counts as failed.
+    '''
+    st = _batchTurtle
+    started = perf_counter()
+    result = {
+        'script': script,
+        'output': output,
+        'ops': 0,
+        'result': 'ok',
+        'errors': [],
+        'worker': os.getpid(),
+    }
+
+    try:
+        st.reset()
+        st.console.lines.clear()
+        deadline = None if not timeout else started + timeout
+
+        with open(script) as f:
+            st.feed(scriptLines(f))
+
+            while st.queue or st.scripts:
+                result['ops'] += st.step(100)
+
+                if deadline is not None and perf_counter() >= deadline:
+                    st.stop()
+                    result['result'] = 'timeout'
+                    break
+
+        if result['result'] == 'ok':
+            st.save(output)
+
+            if st.console.lines:
+                result['result'] = 'failed'
+
+    except Exception as e:
+        result['result'] = 'failed'
+        st.console.error(f'{type(e).__name__}: {e}')
+
+    result['errors'] = list(st.console.lines)
+    result['seconds'] = perf_counter() - started
+    return result
+
+
+class BatchRenderer():
+    '''Render a directory of scripts, each to an image, in worker processes.
+
+     Every worker makes one headless SimpleTurtle (kwargs are passed on to
+    it) and reset()s it between scripts. Scripts are handed out biggest
+    first, so the slow ones don't hold up the end of the batch, and a
+    script still running after timeout seconds is stopped and counted as
+    timed out.
+    '''
+    FORMATS = SAVE_FORMATS
+
+    def __init__(self, workers=None, timeout=60, **kwargs):
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        kwargs.setdefault('logLevel', 'error')
+        kwargs.setdefault('journal', False)
+        kwargs.setdefault('segmentIndex', False)
+        kwargs.setdefault('undoBufferSize', 0)
+        self.kwargs = kwargs
+        self.results = []
+        self.seconds = 0
+
+
+    def jobs(self, directory, output, format='svg', pattern='*'):
+        '''Return (script, image) pairs for the scripts in directory.
+
+         Hidden files, subdirectories and images (files with one of FORMATS
+        as extension, such as the last batch's) are skipped. Images are named
+        after their scripts, in the output directory, and scripts that would
+        share one (a.txt and a.logo) are named in full (a.txt.svg).
+        '''
+        names = []
+
+        for name in sorted(os.listdir(directory)):
+            stem, extension = os.path.splitext(name)
+
+            if (name.startswith('.')
+                    or extension[1:].casefold() in self.FORMATS
+                    or not os.path.isfile(os.path.join(directory, name))
+                    or not fnmatch.fnmatch(name, pattern)):
+                continue
+
+            names.append((name, stem.casefold()))
+
+        stems = Counter(stem for _, stem in names)
+        return [
+            (
+                os.path.join(directory, name),
+                os.path.join(
+                    output,
+                    (name if stems[stem] > 1 else os.path.splitext(name)[0])
+                    + '.' + format,
+                ),
+            )
+            for name, stem in names
+        ]
+
+
+    def run(self, jobs, progress=None):
+        '''Render (script, image) pairs, returning their results.
+
+         progress, if given, is called as progress(result, done, total) as
+        each script finishes. Results are kept in self.results, in the order
+        the scripts finished.
+        '''
+        started = perf_counter()
+        self.results = []
+        jobs = sorted(jobs, key=lambda job: -os.path.getsize(job[0]))
+
+        with ProcessPoolExecutor(
+                max_workers=min(self.workers, len(jobs)) or 1,
+                initializer=_batchInit,
+                initargs=(self.kwargs,),
+            ) as pool:
+            futures = {
+                pool.submit(_batchRender, script, image, self.timeout): script
+                for script, image in jobs
+            }
+
+            for future in as_completed(futures):
+
+                try:
+                    result = future.result()
+
+                except Exception as e:
+                    result = {
+                        'script': futures[future],
+                        'ops': 0,
+                        'result': 'failed',
+                        'errors': [f'{type(e).__name__}: {e}'],
+                        'seconds': 0,
+                    }
+
+                self.results.append(result)
+
+                if progress is not None:
+                    progress(result, len(self.results), len(jobs))
+
+        self.seconds = perf_counter() - started
+        return self.results
+
+
+    @staticmethod
+    def progressText(result, done, total):
+        '''Return a line of progress for a finished script.'''
+        text = (f'[{done:>{len(str(total))}}/{total}] '
+                f'{os.path.basename(result["script"])} '
+                f'{result["seconds"]:.2f}s {result["result"]}')
+
+        if result['errors']:
+            text += f', {len(result["errors"])} errors: {result["errors"][0]}'
+
+        return text
+
+
+    def summary(self):
+        '''Return the per-script timings of the last run as text, slowest
+        first.
+        '''
+        results = sorted(self.results, key=lambda result: -result['seconds'])
+        work = sum(result['seconds'] for result in results)
+        ok = sum(result['result'] == 'ok' for result in results)
+        width = max([len(os.path.basename(result['script'])) for result in results] + [6])
+        lines = [
+            f'{"script":<{width}}  {"seconds":>8}  {"ops":>10}  result',
+        ]
+
+        for result in results:
+            lines.append(
+                f'{os.path.basename(result["script"]):<{width}}  '
+                f'{result["seconds"]:>8.2f}  {result["ops"]:>10}  '
+                f'{result["result"]}'
+                + (f' ({len(result["errors"])} errors)' * bool(result['errors']))
+            )
+
+        lines.append(
+            f'Rendered {ok} of {len(results)} scripts in {self.seconds:.2f}s '
+            f'with {self.workers} workers, {work:.2f}s of work '
+            f'({work / self.seconds if self.seconds else 0:.1f}x).'
+        )
+        return '\n'.join(lines)
+
+
+def main(argv=None):
+    '''Run ptsg from the command line.
+
+     Without a script this opens the demonstration GUI. With one, the script
+    is streamed through the cmdline interpreter a line at a time, in the GUI
+    or (with --headless) without a window, and the drawing can be saved.
+    With --batch, a directory of scripts is rendered by a BatchRenderer.
+    '''
+    parser = argparse.ArgumentParser(
+        description='Python Turtle SimpleGUI',
+    )
+    parser.add_argument(
+        'script',
+        nargs='?',
+        help='script of turtle commands to run, - for stdin',
+    )
+    parser.add_argument(
+        '--headless',
+        action='store_true',
+        help='run the script without a window',
+    )
+    parser.add_argument(
+        '--turbo',
+        action='store_true',
+        help='turn tracing (turtle animation) off',
+    )
+    parser.add_argument(
+        '-o',
+        '--output',
+        help='save the drawing to this file once the script is done',
+    )
+    parser.add_argument(
+        '-v',
+        '--verbose',
+        action='store_true',
+        help='trace every turtle command run',
+    )
+    parser.add_argument(
+        '--frames',
+        help='save a frame of the drawing as it builds into this directory',
+    )
+    parser.add_argument(
+        '--every',
+        type=int,
+        default=100,
+        help='operations between frames (default 100)',
+    )
+    parser.add_argument(
+        '--batch',
+        metavar='DIRECTORY',
+        help='render every script in this directory, in worker processes',
+    )
+    parser.add_argument(
+        '--batch-output',
+        metavar='DIRECTORY',
+        help='where --batch saves the images (default: DIRECTORY/rendered)',
+    )
+    parser.add_argument(
+        '--format',
+        choices=BatchRenderer.FORMATS,
+        default='svg',
+        help='image format for --batch (default svg)',
+    )
+    parser.add_argument(
+        '--pattern',
+        default='*',
+        help='only render the scripts --batch finds matching this (default *)',
+    )
+    parser.add_argument(
+        '--jobs',
+        type=int,
+        help='worker processes for --batch (default: one per core)',
+    )
+    parser.add_argument(
+        '--timeout',
+        type=float,
+        default=60,
+        help='seconds --batch gives each script, 0 for no limit (default 60)',
+    )
+    parser.add_argument(
+        '--replay',
+        help='rebuild a session from a journal saved by saveJournal()',
+    )
+    parser.add_argument(
+        '--socket',
+        help='take commands on this Unix socket',
+    )
+    parser.add_argument(
+        '--port',
+        type=int,
+        help='take commands on this localhost TCP port',
+    )
+    parser.add_argument(
+        '--startup-profile',
+        action='store_true',
+        help='print how long each phase of startup took',
+    )
+    parser.add_argument(
+        '--memory-report',
+        action='store_true',
+        help='print what the session keeps in memory once the script (or '
+             'headless server) is done',
+    )
+    options = parser.parse_args(argv)
+
+    serving = options.socket or options.port is not None
+
+    if options.batch:
+
+        if options.script or serving or options.replay or options.frames:
+            parser.error('--batch renders scripts on its own')
+
+        output = options.batch_output or os.path.join(options.batch, 'rendered')
+        os.makedirs(output, exist_ok=True)
+        batch = BatchRenderer(options.jobs, options.timeout)
+        jobs = batch.jobs(options.batch, output, options.format, options.pattern)
+
+        if not jobs:
+            parser.error(f'no scripts in {options.batch}')
+
+        batch.run(
+            jobs,
+            lambda *args: print(BatchRenderer.progressText(*args), flush=True),
+        )
+        print(batch.summary())
+        return 0 if all(result['result'] == 'ok' for result in batch.results) else 1
+
+    if options.headless and not (options.script or serving):
+        parser.error('--headless needs a script to run or --socket/--port')
+
+    if options.output:
+        extension = options.output.rsplit('.', 1)[-1].casefold()
+        formats = [f for f in SAVE_FORMATS if f != 'json' or options.headless]
+
+        if extension not in formats:
+            parser.error(f'--output must be a .{", .".join(formats)} file')
+
+    started = perf_counter()
+    # Scripts run unattended, and are streamed rather than kept in a journal.
+    demo = SimpleTurtle(
+        headless=options.headless,
+        turbo=options.turbo or options.headless,
+        verbose=options.verbose,
+        journal=not (options.script or options.headless),
+    )
+
+    if options.startup_profile:
+        print(demo.startupProfile())
+        print(f'  {"first frame":<14}{(perf_counter() - started) * 1000:>9.1f} ms')
+
+    if options.frames:
+        demo.startRecording(options.frames, options.every)
+
+    if options.replay:
+        demo.loadJournal(options.replay)
+
+    if serving:
+        demo.serve(options.socket, options.port or 0)
+
+    if not options.script:
+
+        if options.headless:
+            demo.serveForever()
+            demo.stopRecording()
+
+            if options.output:
+                demo.save(options.output)
+
+            if options.memory_report:
+                print(demo.memoryText())
+
+            demo.close()
+
+        else:
+            demo.eventLoop()
+
+        return
+
+    if options.script == '-':
+        script = sys.stdin
+
+    else:
+        script = open(options.script)
+
+    def done():
+        # Leave stdin open for the rest of the process.
+        if script is not sys.stdin:
+            script.close()
+
+        if options.output:
+            demo.save(options.output)
+            demo.console.info(f'Saved {options.output}')
+
+        if options.memory_report:
+            print(demo.memoryText())
+
+    if options.headless:
+        demo.runScript(scriptLines(script))
+
+        if serving:
+            demo.serveForever()
+
+        demo.stopRecording()
+        done()
+        demo.close()
+
+    else:
+        demo.feed(scriptLines(script), done)
+        demo.eventLoop()
+
+
 if __name__ == '__main__':
     '''Demonstration Mode.
 
@@ -611,5 +6913,4 @@ if __name__ == '__main__':
      Below is the minimal code required to use this module once you have
     imported the SimpleTurtle class into your module.
     '''
-    demo = SimpleTurtle()
-    demo.eventLoop()
+    sys.exit(main())
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+#
+#   PTSG - cmdline compiler and scheduling tests
+#
+'''Check the cmdline compiler, CommandJob limits, the Scheduler and the
+ControlServer's line handling.'''
+import json
+import os
+import socket
+import sys
+import threading
+import unittest
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ptsg
+
+
+class Recorder():
+    '''Stands in for a turtle, keeping the commands called on it.'''
+    def __init__(self):
+        self.calls = []
+
+
+    def forward(self, distance):
+        self.calls.append(('forward', distance))
+
+
+    def left(self, angle):
+        self.calls.append(('left', angle))
+
+
+class Compiler(unittest.TestCase):
+
+    def testStopsAtInvalidToken(self):
+        program = ptsg.compileCmdline('forward 10 bogus 3 left 2')
+        self.assertEqual(program.ops, (('forward', (10,)),))
+        self.assertEqual(program.rest, 'bogus 3 left 2')
+        self.assertIn('bogus', program.error)
+
+
+    def testRepeatIsNotUnrolled(self):
+        program = ptsg.compileCmdline('repeat 3 [ repeat 4 [ forward 1 left 90 ] ]')
+        self.assertEqual(len(program.ops), 1)
+        self.assertEqual(len(program), 24)
+
+
+    def testRepeatErrors(self):
+        self.assertIn('[', ptsg.compileCmdline('repeat 3 forward 1').error)
+        self.assertIn('missing', ptsg.compileCmdline('repeat 3 [ forward 1').error)
+        self.assertIn('count', ptsg.compileCmdline('repeat -1 [ forward 1 ]').error)
+
+
+    def testProcedures(self):
+        procedures = {}
+        program = ptsg.compileCmdline('to sq repeat 4 [ forward 1 ] end sq sq', procedures)
+        self.assertEqual(program.ops, (('call', ('sq',)), ('call', ('sq',))))
+        self.assertEqual(len(program), 8)
+        self.assertEqual(procedures['sq'].source, 'to sq repeat 4 [ forward 1 ] end')
+
+        # Procedures stay defined for the command strings after.
+        self.assertEqual(len(ptsg.compileCmdline('sq', procedures)), 4)
+
+
+class Jobs(unittest.TestCase):
+
+    def testRunsEverything(self):
+        t = Recorder()
+        job = ptsg.CommandJob(t, ptsg.compileCmdline('repeat 2 [ forward 5 left 90 ]'))
+        # The repeat counts as an operation too.
+        self.assertEqual(job.run(), 5)
+        self.assertEqual(len(job), 0)
+        self.assertEqual(t.calls, [('forward', 5), ('left', 90)] * 2)
+
+
+    def testLimit(self):
+        t = Recorder()
+        job = ptsg.CommandJob(t, ptsg.compileCmdline('forward 1 ' * 10))
+        self.assertEqual(job.run(limit=3), 3)
+        self.assertEqual(len(t.calls), 3)
+        self.assertEqual(job.run(), 7)
+        self.assertEqual(len(t.calls), 10)
+
+
+    def testLoopsCountTowardLimit(self):
+        # Never reaches a turtle command, but still has to stop.
+        job = ptsg.CommandJob(
+            Recorder(),
+            ptsg.compileCmdline('repeat 100000 [ repeat 1 [ repeat 0 [ forward 1 ] ] ]'),
+        )
+        self.assertEqual(job.run(limit=10), 10)
+        self.assertTrue(len(job))
+
+
+    def testCallsCountTowardDeadline(self):
+        procedures = {}
+        ptsg.compileCmdline('to nothing repeat 0 [ forward 1 ] end', procedures)
+        job = ptsg.CommandJob(
+            Recorder(),
+            ptsg.compileCmdline('repeat 1000000 [ nothing ]', procedures),
+        )
+        started = perf_counter()
+        job.run(deadline=started + 0.01)
+        self.assertLess(perf_counter() - started, 0.5)
+        self.assertTrue(len(job))
+
+
+class Scheduling(unittest.TestCase):
+
+    def testRoundsBoundLoopingTasks(self):
+        scheduler = ptsg.Scheduler()
+        t = Recorder()
+        program = ptsg.compileCmdline('left 1 ' * 5)
+        scheduler.attach('spin', t, program, priority=3, loop=True)
+        deadline = perf_counter() + 1
+        self.assertEqual(scheduler.run(deadline, rounds=1), 3)
+        # A round ends where the program does, before it starts over.
+        self.assertEqual(scheduler.run(deadline, rounds=2), 5)
+        self.assertEqual(len(t.calls), 8)
+
+
+    def testStepReturnsWithLoopingTask(self):
+        st = ptsg.SimpleTurtle(headless=True, logLevel='error')
+        st.console.echo = None
+        st.attach('default', 'left 1', loop=True)
+        ran = []
+        # Run it on a thread, so the test fails rather than hangs.
+        stepper = threading.Thread(target=lambda: ran.append(st.step()), daemon=True)
+        stepper.start()
+        stepper.join(5)
+        self.assertFalse(stepper.is_alive())
+        self.assertGreater(ran[0], 0)
+
+
+class Server(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ptsg.ControlServer(port=0)
+        self.address = self.server.start()
+
+
+    def tearDown(self):
+        self.server.close()
+
+
+    def send(self, data):
+        '''Send data, answer every batch that comes in and return the lines
+        and the replies.
+        '''
+        lines = []
+        replies = []
+
+        with socket.create_connection(self.address[:2], timeout=5) as client:
+            client.sendall(data)
+            client.shutdown(socket.SHUT_WR)
+            reader = client.makefile('rb')
+
+            while True:
+                received = self.server.get(timeout=5)
+
+                if received is None:
+                    break
+
+                batch, reply = received
+                lines += batch
+                reply({'lines': len(batch)})
+                replies.append(json.loads(reader.readline()))
+
+                if sum(r['lines'] for r in replies) >= data.count(b'\n') + 1:
+                    break
+
+        return lines, replies
+
+
+    def testLastLineWithoutNewline(self):
+        lines, replies = self.send(b'forward 10\nleft 90')
+        self.assertEqual(lines, ['forward 10', 'left 90'])
+        self.assertEqual(sum(r['lines'] for r in replies), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+#
+#   PTSG - session journal tests
+#
+'''Check that undo and redo put headless sessions back where they were.'''
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ptsg
+
+
+class StopThenUndo(unittest.TestCase):
+
+    def setUp(self):
+        self.st = ptsg.SimpleTurtle(headless=True, logLevel='error', journal=True)
+        self.st.console.echo = None
+        self.st.cmdline('pendown')
+
+
+    def testUndoKeepsWhatRanBeforeStop(self):
+        st = self.st
+        st.enqueue('repeat 1000 [ forward 1 left 1 ]')
+        st.queue[0].run(limit=10)
+        st.enqueue('forward 100')
+        st.stop()
+        stopped = st.turtle.pos()
+
+        st.cmdline('penup')
+        st.undo()
+        self.assertEqual(st.turtle.pos(), stopped)
+        self.assertTrue(st.turtle.isdown())
+
+        st.undo()
+        self.assertEqual(st.turtle.pos(), (0, 0))
+
+        st.redo(2)
+        self.assertEqual(st.turtle.pos(), stopped)
+        self.assertFalse(st.turtle.isdown())
+
+
+    def testUndoDuringQueuedCommand(self):
+        st = self.st
+        st.enqueue('repeat 1000 [ forward 1 left 1 ]')
+        st.queue[0].run(limit=10)
+        stopped = st.turtle.pos()
+        st.undo()
+        self.assertEqual(st.turtle.pos(), (0, 0))
+        st.redo()
+        self.assertEqual(st.turtle.pos(), stopped)
+
+
+class UndoProcedures(unittest.TestCase):
+
+    def testUndoPastDefinition(self):
+        st = ptsg.SimpleTurtle(headless=True, logLevel='error', journal=True)
+        st.console.echo = None
+        st.journal.checkpointEvery = 2
+        st.cmdline('to step forward 10 end')
+
+        for _ in range(5):
+            st.cmdline('step')
+
+        st.cmdline('to step forward 20 end')
+        st.undo()
+        st.cmdline('step')
+        self.assertEqual(st.turtle.pos(), (60, 0))
+
+        st.undo(7)
+        self.assertEqual(list(st.procedures), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+#
+#   PTSG - streamed script tests
+#
+'''Check that scripts run from the command line are streamed, not kept.'''
+import os
+import sys
+import tempfile
+import tracemalloc
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ptsg
+
+
+class StreamedScript(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+
+    def peak(self, lines):
+        '''Return the peak memory, in bytes, of running a script of lines
+        (each one different) with --headless.
+        '''
+        path = os.path.join(self.directory.name, f'{lines}.txt')
+
+        with open(path, 'w') as f:
+
+            for i in range(lines):
+                f.write(f'penup forward {i} left {i % 360} backward {i}\n')
+
+        tracemalloc.start()
+
+        try:
+            ptsg.main(['--headless', path])
+            return tracemalloc.get_traced_memory()[1]
+
+        finally:
+            tracemalloc.stop()
+
+
+    def testMemoryDoesntGrowWithScript(self):
+        self.peak(1000)
+        small = self.peak(5000)
+        large = self.peak(20000)
+        # The large script is 600 KB bigger.
+        self.assertLess(large - small, 128 * 1024)
+
+
+if __name__ == '__main__':
+    unittest.main()